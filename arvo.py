@@ -8,55 +8,1998 @@ import sys
 import os
 import json
 import requests
+from requests.adapters import HTTPAdapter
 import zipfile
 import tempfile
 import subprocess
 import shutil
+import shlex
 import re
-from typing import Dict, List, Optional, Tuple
+import io
+import copy
+import tarfile
+import fnmatch
+import hashlib
+import time
+import random
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
 from datetime import datetime
 from pathlib import Path
 import yaml
 import logging
+import threading
+import fcntl
+import ast
+import posixpath
+import xml.etree.ElementTree as ET
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from types import MappingProxyType
+
+try:
+    import zstandard
+except ImportError:  # Optional: only needed for .tar.zst repository bundles
+    zstandard = None
+
+
+# Bump whenever detection logic changes so cached analysis results are invalidated
+ANALYZER_VERSION = '11'
+
+
+# Manifest files that mark the root of a service, in order of language preference
+SERVICE_MANIFESTS = {
+    'python': ['requirements.txt', 'setup.py', 'pyproject.toml', 'Pipfile'],
+    'nodejs': ['package.json'],
+    'java': ['pom.xml', 'build.gradle', 'build.gradle.kts', 'settings.gradle', 'settings.gradle.kts',
+             'gradle.properties'],
+    'php': ['composer.json', 'composer.lock', 'wp-config.php'],
+}
+
+
+# Files each language analyzer reads itself, as globs relative to the service root ('*' also
+# crosses '/'); the framework rule table adds the indicator files it probes. A service is only
+# re-analyzed when one of its inputs changes.
+DETECTOR_INPUTS = {
+    'python': ['requirements.txt', 'app/requirements.txt', 'src/requirements.txt',
+               'server/requirements.txt', 'backend/requirements.txt'],
+    'nodejs': ['package.json', 'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock'],
+    'java': ['pom.xml', '*/pom.xml', 'build.gradle', '*/build.gradle', 'build.gradle.kts', '*/build.gradle.kts',
+             'settings.gradle', 'settings.gradle.kts', 'gradle.properties', 'mvnw', 'gradlew'],
+    'php': ['composer.json'],
+}
+
+
+# Framework detection rules, in order of precedence. A rule matches when the service depends on
+# one of its dependencies, failing that when its signatures (regexes, no capturing groups) show up
+# in the sources, and failing that when one of its files sits in a search directory.
+# Commands run from the directory the match was made in; unset fields fall back to LANGUAGE_DEFAULTS.
+# app_constructors name the calls that build the application object, which is served by gunicorn
+# (server 'wsgi') or uvicorn ('asgi') once entrypoint discovery has found it.
+FRAMEWORK_RULES = [
+    {'name': 'flask', 'language': 'python', 'dependencies': ['flask'], 'files': ['app.py', 'main.py', 'wsgi.py'],
+     'signatures': [r'^\s*(?:from|import)\s+flask\b', r'^\s*[\w.]+\s*=\s*(?:\w+\.)?Flask\s*\('],
+     'app_constructors': ['Flask'], 'server': 'wsgi',
+     'start_commands': ['python app.py', 'flask run'], 'port': 5000},
+    {'name': 'django', 'language': 'python', 'dependencies': ['django'], 'files': ['manage.py', 'settings.py'],
+     'signatures': [r'^\s*(?:from|import)\s+django\b'],
+     'app_constructors': ['get_wsgi_application'], 'server': 'wsgi',
+     'start_commands': ['python manage.py runserver 0.0.0.0:8000'], 'port': 8000},
+    {'name': 'fastapi', 'language': 'python', 'dependencies': ['fastapi'], 'files': ['main.py', 'app.py'],
+     'signatures': [r'^\s*(?:from|import)\s+fastapi\b', r'^\s*[\w.]+\s*=\s*(?:\w+\.)?FastAPI\s*\('],
+     'app_constructors': ['FastAPI'], 'server': 'asgi',
+     'start_commands': ['uvicorn main:app --host 0.0.0.0 --port 8000'], 'port': 8000},
+    {'name': 'bottle', 'language': 'python', 'dependencies': ['bottle'], 'files': ['app.py', 'main.py'],
+     'signatures': [r'^\s*(?:from|import)\s+bottle\b', r'^\s*[\w.]+\s*=\s*(?:\w+\.)?Bottle\s*\('],
+     'app_constructors': ['Bottle'], 'server': 'wsgi'},
+    {'name': 'express', 'language': 'nodejs', 'dependencies': ['express'],
+     'signatures': [r'''require\(\s*['"]express['"]\s*\)''', r'''^\s*import\s.*\bfrom\s+['"]express['"]''']},
+    {'name': 'nextjs', 'language': 'nodejs', 'dependencies': ['next'],
+     'signatures': [r'''\bfrom\s+['"]next(?:/[\w/-]+)?['"]''', r'''require\(\s*['"]next['"]\s*\)''']},
+    {'name': 'react', 'language': 'nodejs', 'dependencies': ['react'],
+     'signatures': [r'''\bfrom\s+['"]react(?:-dom)?(?:/client)?['"]''']},
+    {'name': 'vue', 'language': 'nodejs', 'dependencies': ['vue'],
+     'signatures': [r'''\bfrom\s+['"]vue['"]''', r'\bcreateApp\s*\(']},
+    {'name': 'spring', 'language': 'java', 'port': 8080,
+     'dependencies': ['org.springframework.boot:spring-boot-starter-web',
+                      'org.springframework.boot:spring-boot-starter-webflux',
+                      'org.springframework.boot:spring-boot-starter']},
+    {'name': 'maven', 'language': 'java', 'files': ['pom.xml'],
+     'build_commands': ['mvn clean install'], 'start_commands': ['java -jar target/*.jar']},
+    {'name': 'gradle', 'language': 'java', 'files': ['build.gradle', 'build.gradle.kts'],
+     'build_commands': ['./gradlew build'], 'start_commands': ['java -jar build/libs/*.jar']},
+    {'name': 'laravel', 'language': 'php', 'dependencies': ['laravel/laravel'], 'files': ['artisan']},
+    {'name': 'symfony', 'language': 'php', 'dependencies': ['symfony/symfony']},
+    {'name': 'wordpress', 'language': 'php', 'files': ['wp-config.php']},
+]
+
+
+# Per-language fallbacks, the directories (relative to the service root) searched for rule files
+# and the source files scanned for rule signatures
+LANGUAGE_DEFAULTS = {
+    'python': {'search_dirs': ['', 'app', 'src', 'server', 'backend'], 'source_extensions': ['.py'],
+               'start_commands': ['python app.py'], 'port': 5000},
+    'nodejs': {'search_dirs': [''], 'source_extensions': ['.js', '.jsx', '.mjs', '.cjs', '.ts', '.tsx'],
+               'port': 3000},
+    'java': {'search_dirs': [''], 'port': 8080},
+    'php': {'search_dirs': [''], 'start_commands': ['php -S 0.0.0.0:8000'], 'port': 8000},
+}
+
+
+# Where a service spells out the port it listens on. Each match votes for its port with the rule's
+# weight: explicit listen calls and server config outrank a .env PORT, which outranks the default
+# of a PORT lookup, which outranks a Dockerfile EXPOSE. Patterns are bytes regexes with one group.
+PORT_RULES = [
+    {'languages': ['python'], 'files': ['*.py'], 'weight': 4,
+     'pattern': rb'\.run(?:_app)?\([^)\n]*\bport\s*=\s*(\d{2,5})\b'},
+    {'languages': ['nodejs'], 'files': ['*.js', '*.mjs', '*.cjs', '*.ts'], 'weight': 4,
+     'pattern': rb'\.listen\(\s*(\d{2,5})\b'},
+    {'languages': ['java'], 'files': ['*application.properties'], 'weight': 4,
+     'pattern': rb'(?m)^\s*server\.port\s*[=:]\s*(\d{2,5})\b'},
+    {'languages': ['java'], 'files': ['*application.yml', '*application.yaml'], 'weight': 4,
+     'pattern': rb'(?m)^server:[ \t]*\r?\n(?:[ \t]+.*\r?\n)*?[ \t]+port:[ \t]*(\d{2,5})\b'},
+    {'languages': None, 'files': ['.env', '*/.env'], 'weight': 3,
+     'pattern': rb'(?m)^\s*(?:export\s+)?PORT\s*=\s*[\'"]?(\d{2,5})\b'},
+    {'languages': ['python'], 'files': ['*.py'], 'weight': 2,
+     'pattern': rb'(?:environ\.get|getenv)\(\s*[\'"]PORT[\'"]\s*,\s*[\'"]?(\d{2,5})\b'},
+    {'languages': ['nodejs'], 'files': ['*.js', '*.mjs', '*.cjs', '*.ts'], 'weight': 2,
+     'pattern': rb'process\.env\.PORT\s*(?:\|\||\?\?)\s*[\'"]?(\d{2,5})\b'},
+    {'languages': None, 'files': ['Dockerfile', '*/Dockerfile'], 'weight': 1,
+     'pattern': rb'(?m)^\s*EXPOSE\s+(\d{2,5})\b'},
+]
+
+
+# Vendored, generated and VCS directories that no detector or code rewrite needs to look inside
+DEFAULT_PRUNE_DIRS = ['.git', '.hg', '.svn', 'node_modules', 'bower_components', 'venv', '.venv',
+                      '__pycache__', '.mypy_cache', '.pytest_cache', '.tox', 'dist', 'build',
+                      '*.egg-info']
+
+
+# Installed on the instance for Gradle builds that do not ship a ./gradlew wrapper
+GRADLE_DISTRIBUTION_URL = 'https://services.gradle.org/distributions/gradle-8.5-bin.zip'
+
+# Installed for Maven builds without ./mvnw; Amazon Linux 2's own maven package (3.0.5) is too old
+# for Spring Boot, which needs 3.6.3 or later
+MAVEN_DISTRIBUTION_URL = 'https://archive.apache.org/dist/maven/maven-3/3.9.6/binaries/apache-maven-3.9.6-bin.tar.gz'
+
+# JDK package for a Java major version on the instance image (Amazon Linux 2 ships Corretto, not OpenJDK)
+JDK_PACKAGE = 'java-{version}-amazon-corretto-devel'
+
+
+def load_config(config_path: Optional[str] = None) -> Dict:
+    """Load ArvoAI settings from config.yaml (empty dict if missing)"""
+    if config_path is None:
+        config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.yaml')
+    
+    if not os.path.exists(config_path):
+        return {}
+    
+    with open(config_path, 'r') as f:
+        return yaml.safe_load(f) or {}
+
+
+def _archive_format(source: str) -> Optional[str]:
+    """Classify a repository path or URL by archive suffix"""
+    path = source.split('?', 1)[0].lower()
+    if path.endswith('.zip'):
+        return 'zip'
+    if path.endswith(('.tar.gz', '.tgz')):
+        return 'tar.gz'
+    if path.endswith(('.tar.zst', '.tzst')):
+        return 'tar.zst'
+    if path.endswith('.tar'):
+        return 'tar'
+    return None
+
+
+def _is_bare_git_repo(path: str) -> bool:
+    """A bare repository has HEAD, objects/ and refs/ at its top level"""
+    return os.path.isfile(os.path.join(path, 'HEAD')) and \
+        os.path.isdir(os.path.join(path, 'objects')) and os.path.isdir(os.path.join(path, 'refs'))
+
+
+def _zip_member_target(dest_dir: str, member_name: str) -> str:
+    """Where ZipFile.extract writes a member: drive letters and '', '.', '..' parts are dropped"""
+    arcname = member_name.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    parts = [part for part in arcname.split(os.path.sep) if part not in ('', os.path.curdir, os.path.pardir)]
+    return os.path.join(dest_dir, *parts)
+
+
+def _file_sha256(path: str) -> str:
+    """Hash a file in chunks without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Hold an exclusive flock on path, removing the lock file again on release"""
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # The previous holder may have unlinked the file while we waited; lock the new one instead
+            try:
+                if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+        except BaseException:
+            os.close(fd)
+            raise
+        os.close(fd)
+    
+    try:
+        yield
+    finally:
+        os.unlink(path)
+        os.close(fd)
+
+
+def _shell_glob(path: str) -> str:
+    """Quote path for a shell command, leaving its '*' wildcards free to expand"""
+    return '*'.join(shlex.quote(part) if part else '' for part in path.split('*'))
+
+
+def _path_matches(path: str, pattern: str) -> bool:
+    """Match a glob against a '/'-separated path or any of its trailing sub-paths
+    
+    'node_modules/*' therefore matches 'repo-main/web/node_modules/react/index.js'.
+    """
+    parts = path.strip('/').split('/')
+    return any(fnmatch.fnmatch('/'.join(parts[i:]), pattern) for i in range(len(parts)))
+
+
+def _dir_pruner(patterns: List[str]) -> Callable[[str], bool]:
+    """Compile directory-name patterns into a predicate; plain names are a set lookup, globs use fnmatch"""
+    names = frozenset(p for p in patterns if not any(c in p for c in '*?['))
+    globs = [p for p in patterns if p not in names]
+    return lambda name: name in names or any(fnmatch.fnmatchcase(name, g) for g in globs)
+
+
+def _is_test_path(path: str) -> bool:
+    """Whether a relative path lives in a test directory or is a test module"""
+    return any(part in ('test', 'tests') or part.startswith('test_') for part in path.split('/'))
+
+
+def _compile_globs(patterns: List[str]) -> Tuple[frozenset, Optional[re.Pattern]]:
+    """Split path globs into a set of literal paths and one combined regex for the wildcard ones"""
+    literal = frozenset(p for p in patterns if not any(c in p for c in '*?['))
+    wildcards = [fnmatch.translate(p) for p in patterns if p not in literal]
+    return literal, (re.compile('|'.join(wildcards)) if wildcards else None)
+
+
+def _parse_app_objects(job: Tuple[bytes, Tuple[str, ...]]) -> List[Tuple[str, str]]:
+    """Find module-level application objects in Python source: [(attribute, constructor)]
+    
+    Matches 'app = Flask(...)'-style assignments and module-level factory functions that build
+    and return one, reported as 'create_app()'. Runs in worker processes, so it only takes and
+    returns plain data.
+    """
+    source, constructors = job
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        # Deeply nested expressions exhaust the parser well below the file size cap
+        return []
+    
+    def constructor(node) -> Optional[str]:
+        if isinstance(node, ast.Call):
+            func = node.func
+            name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+            if name in constructors:
+                return name
+        return None
+    
+    found = []
+    for node in tree.body:
+        if isinstance(node, (ast.Assign, ast.AnnAssign)) and constructor(node.value):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            found += [(target.id, constructor(node.value)) for target in targets if isinstance(target, ast.Name)]
+        elif isinstance(node, ast.FunctionDef) and not node.args.args:
+            built = [constructor(child) for child in ast.walk(node) if constructor(child)]
+            if built and any(isinstance(child, ast.Return) for child in ast.walk(node)):
+                found.append((f"{node.name}()", built[0]))
+    return found
+
+
+# One JSON token, optionally preceded by whitespace: a string (group 1), a number, a literal or punctuation
+_JSON_TOKEN = re.compile(r'\s*(?:"((?:[^"\\]|\\.)*)"|(-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)|(true|false|null)|([{}\[\]:,]))',
+                         re.S)
+_JSON_SPACE = re.compile(r'\s*')
+_JSON_LITERALS = {'true': True, 'false': False, 'null': None}
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _json_events(stream: io.TextIOBase, chunk_size: int = 64 * 1024,
+                 whole: Optional[Callable[[List], bool]] = None) -> Iterator[Tuple[List, str, object]]:
+    """Stream (path, event, value) from a JSON text stream without building the document
+    
+    Events are start_map, map_key, end_map, start_array, end_array, string, number, boolean and
+    null. path holds the keys leading to the value ('item' inside arrays); it is the parser's own
+    list and changes as parsing goes on, so copy it to keep it.
+    
+    Values at paths for which whole(path) is true are decoded in one piece by the json module's
+    C decoder and yielded as a single 'value' event: callers that need small records out of a huge
+    document get them fast, while memory stays at one chunk plus the largest such record.
+    """
+    buffer, pos, eof, need_more = '', 0, False, False
+    path = []
+    containers = []  # 'map' or 'array' per open container
+    expect_key, expect_value = False, True
+    while True:
+        if need_more:
+            if eof:
+                raise Exception(f"Invalid JSON near: {buffer[pos:pos + 40]!r}")
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer, pos, need_more = buffer[pos:] + chunk, 0, False
+        
+        if expect_value and whole is not None and whole(path):
+            start = _JSON_SPACE.match(buffer, pos).end()
+            if start == len(buffer) or buffer[start] != ']':
+                try:
+                    value, end = _JSON_DECODER.raw_decode(buffer, start)
+                except json.JSONDecodeError:
+                    need_more = True
+                    continue
+                # A number at the end of the buffer may continue in the next chunk
+                if end + 3 > len(buffer) and not eof:
+                    need_more = True
+                    continue
+                pos, expect_value = end, False
+                yield path, 'value', value
+                continue
+        
+        match = _JSON_TOKEN.match(buffer, pos)
+        # A token near the end of the buffer may be cut short: a number can lose up to two trailing
+        # characters ('1.' + '5', '1e+' + '3') and still match, so keep a margin of three
+        if (match is None or match.end() + 3 > len(buffer)) and not eof:
+            need_more = True
+            continue
+        if match is None:
+            if buffer[pos:].strip() or containers:
+                raise Exception(f"Invalid JSON near: {buffer[pos:pos + 40]!r}")
+            return
+        pos = match.end()
+        string, number, literal, punct = match.groups()
+        
+        if punct is None:
+            if string is not None:
+                value = json.loads(f'"{string}"') if '\\' in string else string
+                if expect_key:
+                    path[-1] = value
+                    yield path, 'map_key', value
+                    continue
+                event = 'string'
+            elif number is not None:
+                value = float(number) if any(c in number for c in '.eE') else int(number)
+                event = 'number'
+            else:
+                value = _JSON_LITERALS[literal]
+                event = 'null' if value is None else 'boolean'
+            expect_value = False
+            yield path, event, value
+        elif punct == '{':
+            yield path, 'start_map', None
+            containers.append('map')
+            path.append(None)
+            expect_key, expect_value = True, False
+        elif punct == '[':
+            yield path, 'start_array', None
+            containers.append('array')
+            path.append('item')
+            expect_value = True
+        elif punct in '}]':
+            if not containers or containers.pop() != ('map' if punct == '}' else 'array'):
+                raise Exception(f"Invalid JSON: unbalanced {punct!r}")
+            path.pop()
+            expect_key, expect_value = False, False
+            yield path, 'end_map' if punct == '}' else 'end_array', None
+        elif punct == ',':
+            expect_key = bool(containers) and containers[-1] == 'map'
+            expect_value = not expect_key
+        else:  # ':'
+            expect_key, expect_value = False, True
+
+
+def _package_lock_closure(stream: io.TextIOBase) -> List[str]:
+    """Production packages ('name@version') of an npm package-lock.json / npm-shrinkwrap.json
+    
+    Lockfile v2/v3 lists every installed package under "packages" with dev flags already resolved;
+    v1 nests them under "dependencies". Each package record is decoded on its own and reduced to
+    name and version before the next one is read.
+    """
+    version = 1
+    closure = set()
+    legacy = set()
+    records = _json_events(stream, whole=lambda path: len(path) == 2 and path[0] in ('packages', 'dependencies'))
+    for path, event, value in records:
+        if path == ['lockfileVersion'] and event == 'number':
+            version = value
+        elif event != 'value' or not isinstance(value, dict):
+            continue
+        elif path[0] == 'packages':
+            if 'node_modules/' in path[1] and 'version' in value \
+                    and not (value.get('dev') or value.get('devOptional') or value.get('link')):
+                closure.add(f"{path[1].rpartition('node_modules/')[2]}@{value['version']}")
+        elif version < 2:
+            pending = [(path[1], value)]
+            while pending:
+                name, fields = pending.pop()
+                if isinstance(fields, dict) and not fields.get('dev'):
+                    if 'version' in fields:
+                        legacy.add(f"{name}@{fields['version']}")
+                    pending.extend(fields.get('dependencies', {}).items())
+    return sorted(closure if version >= 2 else legacy)
+
+
+def _yarn_lock_closure(stream: io.TextIOBase, roots: Dict[str, str]) -> List[str]:
+    """Production packages ('name@version') of a yarn.lock reachable from roots ({name: range})
+    
+    Reads classic (v1) and Berry lockfiles line by line, keeping one (name, version,
+    dependencies) record per entry; yarn.lock has no dev flags, so the closure is walked from
+    the package.json production dependencies.
+    """
+    entries = []   # (name, version, {dependency: range})
+    by_spec = {}   # 'name@range' -> entry index
+    section = None
+    for line in stream:
+        line = line.rstrip('\r\n')
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        indent = len(line) - len(line.lstrip(' '))
+        text = line.strip()
+        if indent == 0:
+            specs = [spec.strip().strip('"') for spec in text.rstrip(':').split(',')]
+            name = specs[0][:specs[0].index('@', 1)] if '@' in specs[0][1:] else specs[0]
+            entries.append((name, None, {}))
+            for spec in specs:
+                by_spec[spec] = len(entries) - 1
+            section = None
+        elif not entries:
+            continue
+        elif indent == 2:
+            key, _, value = text.partition(' ')
+            key, value = key.rstrip(':').strip('"'), value.strip().strip('"')
+            section = key if key in ('dependencies', 'optionalDependencies') and not value else None
+            if key == 'version':
+                name, _, dependencies = entries[-1]
+                entries[-1] = (name, value, dependencies)
+        elif section:
+            dependency, _, spec = text.partition(' ')
+            entries[-1][2][dependency.rstrip(':').strip('"')] = spec.strip().strip('"')
+    
+    def resolve(name: str, spec: str) -> Optional[int]:
+        for key in (f"{name}@{spec}", f"{name}@npm:{spec}"):
+            if key in by_spec:
+                return by_spec[key]
+        return None
+    
+    seen = set()
+    pending = [resolve(name, spec) for name, spec in roots.items()]
+    while pending:
+        index = pending.pop()
+        if index is None or index in seen:
+            continue
+        seen.add(index)
+        pending.extend(resolve(name, spec) for name, spec in entries[index][2].items())
+    return sorted({f"{entries[i][0]}@{entries[i][1]}" for i in seen if entries[i][1]})
+
+
+def _read_pom(stream: BinaryIO) -> Dict:
+    """The parts of a pom.xml the Java analyzer needs, read with iterparse
+    
+    Elements are cleared as soon as they close, so memory stays flat however large the POM is.
+    Dependencies and plugins are 'groupId:artifactId' keys mapped to their (unresolved) versions;
+    test-scoped dependencies are left out.
+    """
+    pom = {'parent': {}, 'modules': [], 'properties': {}, 'dependencies': {}, 'managed': {},
+           'plugins': {}, 'packaging': 'jar'}
+    sections = {('dependencies', 'dependency'): 'dependencies',
+                ('dependencyManagement', 'dependencies', 'dependency'): 'managed',
+                ('build', 'plugins', 'plugin'): 'plugins',
+                ('build', 'pluginManagement', 'plugins', 'plugin'): 'managed'}
+    path = []
+    records = []  # fields of the dependencies / plugins being read, innermost last
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        tag = elem.tag.rpartition('}')[2] if isinstance(elem.tag, str) else ''
+        if event == 'start':
+            path.append(tag)
+            if tag in ('dependency', 'plugin'):
+                records.append({})
+            continue
+        
+        text = (elem.text or '').strip()
+        where = tuple(path[1:])
+        if where in (('groupId',), ('artifactId',), ('version',), ('packaging',)):
+            pom[tag] = text
+        elif where == ('build', 'finalName'):
+            pom['finalName'] = text
+        elif len(where) == 2 and where[0] == 'parent':
+            pom['parent'][tag] = text
+        elif where == ('modules', 'module'):
+            pom['modules'].append(text)
+        elif len(where) == 2 and where[0] == 'properties':
+            pom['properties'][tag] = text
+        elif tag == 'mainClass' and 'plugin' in where:
+            pom['mainClass'] = text
+        elif len(where) >= 2 and where[-2] in ('dependency', 'plugin') and records:
+            records[-1][tag] = text
+        elif tag in ('dependency', 'plugin') and records:
+            fields = records.pop()
+            if where in sections and fields.get('scope') != 'test':
+                # Plugins without a groupId are org.apache.maven.plugins ones
+                group = fields.get('groupId', 'org.apache.maven.plugins' if tag == 'plugin' else '')
+                pom[sections[where]][f"{group}:{fields.get('artifactId', '')}"] = fields.get('version')
+        
+        path.pop()
+        elem.clear()
+    return pom
+
+
+def _resolve_properties(value: Optional[str], properties: Dict[str, str]) -> Optional[str]:
+    """Expand ${name} references; unknown ones are left in place"""
+    for _ in range(10):
+        if not value or '${' not in value:
+            break
+        expanded = re.sub(r'\$\{([^}]+)\}', lambda m: properties.get(m.group(1), m.group(0)), value)
+        if expanded == value:
+            break
+        value = expanded
+    return value
+
+
+def _read_gradle_settings(text: str) -> Tuple[Optional[str], List[str]]:
+    """(rootProject.name, included project directories) from a settings.gradle(.kts)"""
+    name = re.search(r'rootProject\.name\s*=\s*[\'"]([^\'"]+)[\'"]', text)
+    projects = []
+    for include in re.finditer(r'^\s*include\b\s*\(?([^\n]*)', text, re.M):
+        for project in re.findall(r'[\'"]:?([\w.\-:]+)[\'"]', include.group(1)):
+            projects.append(project.replace(':', '/'))
+    return (name.group(1) if name else None), projects
+
+
+def _read_gradle_build(text: str) -> Dict:
+    """Plugins, Spring Boot version and dependencies ('group:name') of a build.gradle(.kts)"""
+    boot = re.search(r'[\'"]org\.springframework\.boot[\'"]\s*\)?\s*version\s*\(?\s*[\'"]([^\'"]+)[\'"]', text) \
+        or re.search(r'springBootVersion\s*=\s*[\'"]([^\'"]+)[\'"]', text) \
+        or re.search(r'org\.springframework\.boot:spring-boot-gradle-plugin:([\w.\-]+)', text)
+    # 'apply false' only declares the plugin version for subprojects
+    applies_boot = any(not re.search(r'\bapply\s*\(?\s*false', declaration) for declaration in
+                       re.findall(r'(?:id\s*\(?\s*|apply\s+plugin:\s*)[\'"]org\.springframework\.boot[\'"].*', text))
+    application = re.search(r'(?:id\s*\(?\s*|apply\s+plugin:\s*)[\'"]application[\'"]|^\s*application\s*(?:\{|\(\)|$)',
+                            text, re.M)
+    dependencies = re.findall(r'^\s*(?:implementation|api|compile|runtimeOnly|runtime)\s*\(?\s*'
+                              r'[\'"]([\w.\-]+:[\w.\-]+)(?::[^\'"]*)?[\'"]', text, re.M)
+    return {'spring_boot_version': boot.group(1) if boot else None, 'spring_boot': applies_boot,
+            'application': bool(application), 'dependencies': dependencies}
+
+
+class HttpClient:
+    """Pooled keep-alive HTTP session with timeouts and retry/backoff on transient failures"""
+    
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    
+    def __init__(self, config: Optional[Dict] = None):
+        config = config or {}
+        self.connect_timeout = config.get('connect_timeout', 10)
+        self.read_timeout = config.get('read_timeout', 60)
+        self.max_retries = config.get('max_retries', 3)
+        self.backoff_factor = config.get('backoff_factor', 0.5)
+        self.max_backoff = config.get('max_backoff', 30)
+        
+        # One session per client so connections (and TLS handshakes) are reused across fetches
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=config.get('pool_connections', 10),
+            pool_maxsize=config.get('pool_maxsize', 10)
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+    
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request, retrying connection errors, 429 and 5xx with exponential backoff"""
+        kwargs.setdefault('timeout', (self.connect_timeout, self.read_timeout))
+        
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff(attempt))
+                continue
+            
+            if response.status_code in self.RETRY_STATUSES and attempt < self.max_retries:
+                retry_after = response.headers.get('Retry-After')
+                response.close()
+                time.sleep(self.backoff(attempt, retry_after))
+                continue
+            
+            return response
+    
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+    
+    def head(self, url: str, **kwargs) -> requests.Response:
+        return self.request('HEAD', url, **kwargs)
+    
+    def close(self):
+        self.session.close()
+    
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Delay before the next attempt: Retry-After if given, else full-jitter exponential backoff"""
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+
+class Workspace:
+    """A per-deployment directory handed out by WorkspaceManager; release it when done"""
+    
+    def __init__(self, manager: 'WorkspaceManager', name: str, path: str):
+        self.manager = manager
+        self.name = name
+        self.path = path
+    
+    def mkdtemp(self, prefix: str = '') -> str:
+        """Create a scratch directory inside this workspace"""
+        return tempfile.mkdtemp(dir=self.path, prefix=prefix)
+    
+    def release(self):
+        self.manager.release(self)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class WorkspaceManager:
+    """Owns one root directory of per-deployment workspaces with reference counts, a quota and age-based GC"""
+    
+    PARTIAL_DIR = '.partial'
+    
+    def __init__(self, root: str, max_size: Optional[int] = None, max_age: float = 24 * 3600,
+                 gc_interval: float = 600):
+        self.root = root
+        self.max_size = max_size
+        self.max_age = max_age
+        self.gc_interval = gc_interval
+        self._refs = {}
+        self._lock = threading.Lock()
+        self._last_gc = 0.0
+        os.makedirs(self.root, exist_ok=True)
+    
+    def acquire(self, name: Optional[str] = None) -> Workspace:
+        """Create (or re-reference) a workspace, collecting stale ones first"""
+        if time.time() - self._last_gc >= self.gc_interval:
+            self.gc()
+        
+        if self.max_size is not None and self.usage() >= self.max_size:
+            self.gc()
+            if self.usage() >= self.max_size:
+                raise Exception(f"Workspace quota exceeded: {self.usage()} bytes used "
+                                f"(limit {self.max_size}) under {self.root}")
+        
+        with self._lock:
+            if name is None:
+                name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{random.getrandbits(32):08x}"
+            path = os.path.join(self.root, name)
+            os.makedirs(path, exist_ok=True)
+            self._refs[name] = self._refs.get(name, 0) + 1
+        
+        return Workspace(self, name, path)
+    
+    def release(self, workspace: Workspace):
+        """Drop one reference; the directory is removed when the last one goes"""
+        with self._lock:
+            count = self._refs.get(workspace.name, 0) - 1
+            if count > 0:
+                self._refs[workspace.name] = count
+                return
+            self._refs.pop(workspace.name, None)
+        shutil.rmtree(workspace.path, ignore_errors=True)
+    
+    def partial_path(self, key: str) -> str:
+        """Path for a partial download that outlives the workspace that started it"""
+        partial_dir = os.path.join(self.root, self.PARTIAL_DIR)
+        os.makedirs(partial_dir, exist_ok=True)
+        return os.path.join(partial_dir, key)
+    
+    def gc(self, max_age: Optional[float] = None) -> int:
+        """Remove unreferenced workspaces older than max_age seconds, returning how many went"""
+        max_age = self.max_age if max_age is None else max_age
+        cutoff = time.time() - max_age
+        removed = 0
+        
+        with self._lock:
+            self._last_gc = time.time()
+            referenced = set(self._refs)
+        
+        # Partial downloads age individually; a download still being written keeps its mtime fresh,
+        # and one whose lock is held (a stalled transfer) is never collected from under its owner
+        partial_dir = os.path.join(self.root, self.PARTIAL_DIR)
+        if os.path.isdir(partial_dir):
+            for name in os.listdir(partial_dir):
+                if name.endswith('.lock'):
+                    # _file_lock removes its own lock files on release
+                    continue
+                path = os.path.join(partial_dir, name)
+                try:
+                    if os.path.getmtime(path) <= cutoff and not self._partial_in_use(path):
+                        os.remove(path)
+                except OSError:
+                    pass
+        
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name in referenced or name == self.PARTIAL_DIR or not os.path.isdir(path):
+                continue
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        
+        return removed
+    
+    @staticmethod
+    def _partial_in_use(path: str) -> bool:
+        """Whether another download holds the lock of this partial (or its metadata) right now"""
+        lock_path = (path[:-len('.json')] if path.endswith('.json') else path) + '.lock'
+        try:
+            fd = os.open(lock_path, os.O_RDWR)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        finally:
+            os.close(fd)
+        return False
+    
+    def usage(self) -> int:
+        """Total bytes currently stored under the workspace root"""
+        total = 0
+        for root, dirs, files in os.walk(self.root):
+            for file in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, file))
+                except OSError:
+                    pass
+        return total
+
+
+class ArchiveCache:
+    """Content-addressed on-disk cache of downloaded archives and their lazily extracted trees"""
+    
+    def __init__(self, cache_dir: str, max_size: int = 2 * 1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+    
+    @staticmethod
+    def make_key(repo_url: str, ref: str, digest: str) -> str:
+        """Build a cache key from repository URL, resolved ref and commit SHA or archive digest"""
+        return hashlib.sha256(f"{repo_url}\n{ref}\n{digest}".encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return the cache entry directory for key, or None on a miss"""
+        entry_dir = os.path.join(self.cache_dir, key)
+        meta = self._read_meta(entry_dir)
+        
+        if meta is None or not self._verify(entry_dir, meta):
+            if meta is not None:
+                # Corrupted entry - drop it so it gets rebuilt
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            self.misses += 1
+            return None
+        
+        meta['last_used'] = time.time()
+        self._write_meta(entry_dir, meta)
+        self.hits += 1
+        return entry_dir
+    
+    def put(self, key: str, archive_path: str) -> Optional[str]:
+        """Store an archive under key, returning the cache entry directory
+        
+        Returns None without caching when the archive alone would not fit in max_size.
+        """
+        if os.path.getsize(archive_path) > self.max_size:
+            return None
+        
+        entry_dir = os.path.join(self.cache_dir, key)
+        staging_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix='.staging-')
+        
+        try:
+            cached_archive = os.path.join(staging_dir, 'archive.zip')
+            shutil.copyfile(archive_path, cached_archive)
+            now = time.time()
+            self._write_meta(staging_dir, {
+                'archive_sha256': _file_sha256(cached_archive),
+                'archive_size': os.path.getsize(cached_archive),
+                'created': now,
+                'last_used': now
+            })
+            
+            # Publish atomically; a concurrent writer may have beaten us to it
+            if os.path.exists(entry_dir):
+                shutil.rmtree(staging_dir)
+            else:
+                os.rename(staging_dir, entry_dir)
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        
+        self._evict(keep=entry_dir)
+        return entry_dir
+    
+    def extract(self, entry_dir: str, extract_fn: Callable[[str, str], None], variant: str = '') -> str:
+        """Return the entry's extracted tree, running extract_fn(archive, dest) the first time
+        
+        variant identifies the extraction settings; a tree built with different ones is rebuilt.
+        """
+        tree_dir = os.path.join(entry_dir, 'tree')
+        meta = self._read_meta(entry_dir) or {}
+        if os.path.isdir(tree_dir):
+            if meta.get('tree_variant', '') == variant:
+                return tree_dir
+            shutil.rmtree(tree_dir, ignore_errors=True)
+        
+        staging_dir = tempfile.mkdtemp(dir=entry_dir, prefix='.tree-')
+        try:
+            extract_fn(self.archive_path(entry_dir), staging_dir)
+            
+            # Record the tree before publishing it so readers can always verify it
+            meta['file_count'], meta['tree_size'] = self._tree_stats(staging_dir)
+            meta['tree_variant'] = variant
+            self._write_meta(entry_dir, meta)
+            
+            if os.path.exists(tree_dir):
+                shutil.rmtree(staging_dir)
+            else:
+                os.rename(staging_dir, tree_dir)
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        
+        self._evict(keep=entry_dir)
+        return tree_dir
+    
+    def get_validators(self, url: str) -> Optional[Dict]:
+        """Return the stored ETag/Last-Modified and cache key for the last download of url"""
+        try:
+            with open(self._validators_path(url), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def set_validators(self, url: str, key: str, etag: Optional[str], last_modified: Optional[str]):
+        """Remember the HTTP validators of url's response and which entry holds its body"""
+        os.makedirs(os.path.join(self.cache_dir, '.validators'), exist_ok=True)
+        path = self._validators_path(url)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'url': url, 'key': key, 'etag': etag, 'last_modified': last_modified}, f)
+        os.replace(path + '.tmp', path)
+    
+    def _validators_path(self, url: str) -> str:
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json'
+        return os.path.join(self.cache_dir, '.validators', name)
+    
+    @staticmethod
+    def archive_path(entry_dir: str) -> str:
+        return os.path.join(entry_dir, 'archive.zip')
+    
+    def entry_for(self, archive_path: str) -> Optional[str]:
+        """Return the entry directory holding archive_path if it lives in this cache"""
+        entry_dir = os.path.dirname(os.path.abspath(archive_path))
+        if os.path.dirname(entry_dir) == os.path.abspath(self.cache_dir):
+            return entry_dir
+        return None
+    
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current cache size"""
+        entries = self._entries()
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(entries),
+            'size': sum(self._entry_size(meta) for _, meta in entries)
+        }
+    
+    def _verify(self, entry_dir: str, meta: Dict) -> bool:
+        """Check the cached archive digest and extracted tree against the stored metadata"""
+        archive = self.archive_path(entry_dir)
+        if not os.path.isfile(archive) or os.path.getsize(archive) != meta.get('archive_size'):
+            return False
+        
+        tree = os.path.join(entry_dir, 'tree')
+        if os.path.isdir(tree) and self._tree_stats(tree) != (meta.get('file_count'), meta.get('tree_size')):
+            return False
+        return _file_sha256(archive) == meta.get('archive_sha256')
+    
+    def _evict(self, keep: Optional[str] = None):
+        """Remove least recently used entries until the cache fits in max_size
+        
+        keep names an entry that was just handed out and must survive this pass.
+        """
+        entries = sorted(self._entries(), key=lambda item: item[1].get('last_used', 0))
+        total = sum(self._entry_size(meta) for _, meta in entries)
+        candidates = [(entry_dir, meta) for entry_dir, meta in entries if entry_dir != keep]
+        
+        while candidates and total > self.max_size:
+            entry_dir, meta = candidates.pop(0)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= self._entry_size(meta)
+    
+    def _entries(self) -> List[Tuple[str, Dict]]:
+        """List (entry_dir, meta) for every complete cache entry"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith('.'):
+                continue
+            entry_dir = os.path.join(self.cache_dir, name)
+            meta = self._read_meta(entry_dir)
+            if meta is not None:
+                entries.append((entry_dir, meta))
+        return entries
+    
+    @staticmethod
+    def _entry_size(meta: Dict) -> int:
+        return meta.get('archive_size', 0) + meta.get('tree_size', 0)
+    
+    @staticmethod
+    def _tree_stats(tree_dir: str) -> Tuple[int, int]:
+        file_count = 0
+        tree_size = 0
+        for root, dirs, files in os.walk(tree_dir):
+            for file in files:
+                file_count += 1
+                tree_size += os.path.getsize(os.path.join(root, file))
+        return file_count, tree_size
+    
+    @staticmethod
+    def _read_meta(entry_dir: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(entry_dir, 'meta.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def _write_meta(entry_dir: str, meta: Dict):
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+
+class AnalysisCache:
+    """On-disk cache of analysis results keyed by repository fingerprint, one directory per analyzer version"""
+    
+    def __init__(self, cache_dir: str, version: str, max_entries: int = 1000):
+        self.cache_dir = cache_dir
+        self.version_dir = os.path.join(cache_dir, f"v{version}")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.version_dir, exist_ok=True)
+        
+        # Results from other analyzer versions can never be hit again
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if path != self.version_dir and name.startswith('v') and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+    
+    @staticmethod
+    def make_key(fingerprint: str, settings: Dict) -> str:
+        """Build a cache key from the tree fingerprint and the settings that shape the analysis"""
+        return hashlib.sha256(f"{fingerprint}\n{json.dumps(settings, sort_keys=True)}".encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the stored entry for key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+            # The file's mtime doubles as its last-used time for eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            entry = None
+        
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+    
+    def put(self, key: str, entry: Dict):
+        """Store an entry (the analysis plus whatever produced it) under key"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.version_dir, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._evict()
+    
+    def get_previous_run(self, source: str, settings: Dict) -> Optional[Dict]:
+        """Return the per-service detector runs recorded by the last analysis of source"""
+        try:
+            with open(self._previous_path(source, settings), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def set_previous_run(self, source: str, settings: Dict, services: List[Dict]):
+        """Remember each service's detector inputs and result so the next analysis can diff against them"""
+        path = self._previous_path(source, settings)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'source': source, 'services': services}, f)
+        os.replace(tmp_path, path)
+    
+    def _previous_path(self, source: str, settings: Dict) -> str:
+        return os.path.join(self.version_dir, 'sources', self.make_key(source, settings) + '.json')
+    
+    def stats(self) -> Dict:
+        """Return hit/miss counters and the number of stored results"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self._entries())
+        }
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.version_dir, key + '.json')
+    
+    def _entries(self) -> List[str]:
+        return [os.path.join(self.version_dir, name) for name in os.listdir(self.version_dir)
+                if name.endswith('.json') and not name.startswith('.')]
+    
+    def _evict(self):
+        """Remove least recently used results beyond max_entries"""
+        entries = self._entries()
+        if len(entries) <= self.max_entries:
+            return
+        
+        def last_used(path: str) -> float:
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return 0.0
+        
+        for path in sorted(entries, key=last_used)[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class ArchiveLimitError(Exception):
+    """Raised when an archive member trips one of the extraction limits"""
+    
+    def __init__(self, message: str, member: str):
+        super().__init__(message)
+        self.member = member
+
+
+class ExtractionGuard:
+    """Tracks uncompressed bytes, entry count and compression ratio while an archive is extracted"""
+    
+    # Tiny, highly compressible files are normal; only judge the ratio past this many bytes
+    RATIO_MIN_BYTES = 1024 * 1024
+    
+    def __init__(self, max_total_size: Optional[int] = None, max_entries: Optional[int] = None,
+                 max_ratio: Optional[float] = None):
+        self.max_total_size = max_total_size
+        self.max_entries = max_entries
+        self.max_ratio = max_ratio
+        self.total_bytes = 0
+        self.entries = 0
+        self.tripped = None
+        self._lock = threading.Lock()
+    
+    def start_member(self, member: str):
+        with self._lock:
+            self._raise_if_tripped()
+            self.entries += 1
+            if self.max_entries is not None and self.entries > self.max_entries:
+                self._trip(member, f"more than {self.max_entries} entries")
+    
+    def consume(self, member: str, nbytes: int, uncompressed: int, compressed: Optional[int]):
+        """Account for nbytes just written; uncompressed/compressed give the ratio being tracked"""
+        with self._lock:
+            self._raise_if_tripped()
+            self.total_bytes += nbytes
+            if self.max_total_size is not None and self.total_bytes > self.max_total_size:
+                self._trip(member, f"total uncompressed size exceeds {self.max_total_size} bytes")
+            if self.max_ratio is not None and compressed and uncompressed >= self.RATIO_MIN_BYTES \
+                    and uncompressed / compressed > self.max_ratio:
+                self._trip(member, f"compression ratio {uncompressed / compressed:.0f}:1 "
+                                   f"exceeds {self.max_ratio:.0f}:1")
+    
+    def check_listing(self, members: List[Tuple[str, int]]):
+        """Refuse an archive up front when its (name, declared size) listing already breaks a limit"""
+        declared = 0
+        for count, (member, size) in enumerate(members, 1):
+            declared += size
+            if self.max_entries is not None and count > self.max_entries:
+                self._trip(member, f"more than {self.max_entries} entries")
+            if self.max_total_size is not None and declared > self.max_total_size:
+                self._trip(member, f"total uncompressed size exceeds {self.max_total_size} bytes")
+    
+    def stats(self) -> Dict:
+        return {'entries': self.entries, 'bytes': self.total_bytes, 'tripped': self.tripped}
+    
+    def _trip(self, member: str, reason: str):
+        self.tripped = member
+        raise ArchiveLimitError(f"Extraction aborted at member '{member}': {reason}", member)
+    
+    def _raise_if_tripped(self):
+        # Lets the other workers of a parallel extraction stop as soon as one hits a limit
+        if self.tripped is not None:
+            raise ArchiveLimitError(f"Extraction aborted at member '{self.tripped}'", self.tripped)
+
+
+class AnalysisBudgetExceeded(Exception):
+    """Raised when repository analysis runs past one of its limits"""
+    
+    def __init__(self, message: str, limit: str):
+        super().__init__(message)
+        self.limit = limit
+
+
+class AnalysisBudget:
+    """Wall time, files visited and bytes read allowed for one repository analysis
+    
+    Indexing and every detector charge the budget as they go. Past the time or byte limit every
+    later check raises too, so detectors running side by side stop together and the analyzer can
+    put together a partial result. The file limit only stops indexing: detectors still run over
+    what was indexed.
+    """
+    
+    def __init__(self, max_seconds: Optional[float] = None, max_files: Optional[int] = None,
+                 max_bytes: Optional[int] = None):
+        self.max_seconds = max_seconds
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.started = time.monotonic()
+        self.files = 0
+        self.bytes = 0
+        self.exceeded = None
+        self.files_exhausted = False
+        self._lock = threading.Lock()
+    
+    def visit(self) -> bool:
+        """Count one file visited; False once max_files have been (the scan stops there)"""
+        self.check()
+        with self._lock:
+            if self.max_files is not None and self.files >= self.max_files:
+                self.files_exhausted = True
+                return False
+            self.files += 1
+        return True
+    
+    def charge(self, nbytes: int):
+        """Account for bytes read, raising once the budget is spent"""
+        with self._lock:
+            self.bytes += nbytes
+        self.check()
+    
+    def check(self):
+        """Raise if the budget is spent; cheap enough to call from inner loops"""
+        if self.exceeded is not None:
+            raise AnalysisBudgetExceeded(f"Analysis budget exceeded: {self.exceeded}", self.exceeded)
+        if self.max_seconds is not None and time.monotonic() - self.started > self.max_seconds:
+            self._exceed('max_seconds', f"ran longer than {self.max_seconds}s")
+        if self.max_bytes is not None and self.bytes > self.max_bytes:
+            self._exceed('max_bytes', f"read more than {self.max_bytes} bytes")
+    
+    def stats(self) -> Dict:
+        return {'elapsed_seconds': round(time.monotonic() - self.started, 3), 'files': self.files,
+                'bytes': self.bytes, 'exceeded': self.exceeded or ('max_files' if self.files_exhausted else None)}
+    
+    def _exceed(self, limit: str, reason: str):
+        with self._lock:
+            self.exceeded = self.exceeded or limit
+        raise AnalysisBudgetExceeded(f"Analysis budget exceeded: {reason}", limit)
+
+
+class _BudgetedReader(io.RawIOBase):
+    """Read-only stream charging every byte read to an AnalysisBudget"""
+    
+    def __init__(self, raw: BinaryIO, budget: AnalysisBudget):
+        self.raw = raw
+        self.budget = budget
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        n = self.raw.readinto(buffer)
+        if n:
+            self.budget.charge(n)
+        return n
+    
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+        super().close()
+
+
+class _LimitedReader:
+    """File-like wrapper counting the bytes read, failing once more than limit have been read"""
+    
+    def __init__(self, raw: BinaryIO, limit: Optional[int], source: str):
+        self.raw = raw
+        self.limit = limit
+        self.source = source
+        self.bytes_read = 0
+    
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.bytes_read += len(data)
+        if self.limit is not None and self.bytes_read > self.limit:
+            raise Exception(f"Archive exceeded size limit of {self.limit} bytes while downloading {self.source}")
+        return data
+
+
+class FrameworkRules:
+    """Framework rule table compiled into per-language dependency and filename lookup maps"""
+    
+    def __init__(self, rules: List[Dict], languages: Dict[str, Dict]):
+        self.rules = rules
+        self.languages = languages
+        
+        # name -> position of the most preferred rule claiming it, so a lookup needs no scan
+        self._by_dependency = {language: {} for language in languages}
+        self._by_filename = {language: {} for language in languages}
+        signatures = {language: [] for language in languages}
+        for position, rule in enumerate(rules):
+            if rule['language'] not in languages:
+                raise Exception(f"Framework rule '{rule['name']}' has unknown language '{rule['language']}'")
+            for dependency in rule.get('dependencies', []):
+                self._by_dependency[rule['language']].setdefault(dependency.lower(), position)
+            for filename in rule.get('files', []):
+                self._by_filename[rule['language']].setdefault(filename, position)
+            if rule.get('signatures'):
+                alternatives = '|'.join(f"(?:{signature})" for signature in rule['signatures'])
+                signatures[rule['language']].append(f"(?P<r{position}>{alternatives})")
+        
+        # All signatures of a language in one regex; the named group that matched identifies the rule
+        self._signatures = {language: re.compile('|'.join(patterns), re.MULTILINE)
+                            for language, patterns in signatures.items() if patterns}
+    
+    @classmethod
+    def from_config(cls, custom_rules: Optional[List[Dict]] = None) -> 'FrameworkRules':
+        """Built-in rules with custom ones first; a custom rule replaces the built-in of the same name"""
+        custom_rules = custom_rules or []
+        custom_names = {rule['name'] for rule in custom_rules}
+        return cls(custom_rules + [rule for rule in FRAMEWORK_RULES if rule['name'] not in custom_names],
+                   LANGUAGE_DEFAULTS)
+    
+    def search_dirs(self, language: str) -> List[str]:
+        return self.languages[language].get('search_dirs', [''])
+    
+    def indicator_files(self, language: str) -> List[str]:
+        """Every path the file rules of a language can probe, relative to the service root"""
+        names = list(self._by_filename[language])
+        return [f"{directory}/{name}" if directory else name
+                for directory in self.search_dirs(language) for name in names]
+    
+    def source_patterns(self, language: str) -> List[str]:
+        """Globs for the sources match_sources reads (empty when the language has no signatures)"""
+        if language not in self._signatures:
+            return []
+        return ['*' + extension for extension in self.languages[language].get('source_extensions', [])]
+    
+    def match_sources(self, language: str, repo: 'RepositoryIndex', workers: int = 1,
+                      max_bytes: int = 64 * 1024, confidence: int = 3) -> Optional[Tuple[Dict, str]]:
+        """Vote for rules by scanning source files for their signatures
+        
+        Only the first max_bytes of each file are read (imports and app construction sit near the
+        top). Likely entry points are scanned first, and scanning stops once a rule has been seen
+        in `confidence` files. Returns the winning rule and the directory of the first file that
+        voted for it.
+        """
+        regex = self._signatures.get(language)
+        extensions = self.languages[language].get('source_extensions', [])
+        if regex is None or not extensions:
+            return None
+        
+        # Files named like a rule's indicator in a search directory, then everything else shallow-first
+        entry_points = set(self.indicator_files(language))
+        sources = sorted(repo.files_with_extension(*extensions),
+                         key=lambda path: (path not in entry_points, path.count('/'), path))
+        
+        def scan(path: str) -> set:
+            try:
+                with repo.open(path) as f:
+                    text = f.read(max_bytes).decode('utf-8', errors='replace')
+            except OSError:
+                return set()
+            return {int(name[1:]) for match in regex.finditer(text)
+                    for name, value in match.groupdict().items() if value is not None}
+        
+        votes = {}
+        first_file = {}
+        # In parallel, files are handed out in batches and the vote is checked between batches
+        executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 and len(sources) > workers * 8 else None
+        batch_size = workers * 8 if executor else 1
+        try:
+            for start in range(0, len(sources), batch_size):
+                batch = sources[start:start + batch_size]
+                results = executor.map(scan, batch) if executor else map(scan, batch)
+                for path, positions in zip(batch, results):
+                    for position in positions:
+                        votes[position] = votes.get(position, 0) + 1
+                        first_file.setdefault(position, path)
+                if votes and max(votes.values()) >= confidence:
+                    break
+        finally:
+            if executor:
+                executor.shutdown()
+        
+        if not votes:
+            return None
+        # Most votes wins; ties go to the more preferred rule
+        position = min(votes, key=lambda p: (-votes[p], p))
+        return self.rules[position], first_file[position].rpartition('/')[0]
+    
+    def match_dependencies(self, language: str, dependencies: List[str]) -> Optional[Dict]:
+        """Most preferred rule claiming any of the dependencies"""
+        lookup = self._by_dependency[language]
+        positions = [lookup[name.lower()] for name in dependencies if name.lower() in lookup]
+        return self.rules[min(positions)] if positions else None
+    
+    def match_files(self, language: str, repo: 'RepositoryIndex') -> Optional[Tuple[Dict, str]]:
+        """Most preferred (rule, directory) whose indicator file is present, in one pass over the listings"""
+        lookup = self._by_filename[language]
+        best = None
+        for order, directory in enumerate(self.search_dirs(language)):
+            if not repo.isdir(directory):
+                continue
+            for name in repo.listdir(directory):
+                position = lookup.get(name)
+                if position is not None and repo.isfile(f"{directory}/{name}" if directory else name) \
+                        and (best is None or (position, order) < best[:2]):
+                    best = (position, order, directory)
+        return (self.rules[best[0]], best[2]) if best else None
+    
+    def apply(self, analysis: Dict, language: str, rule: Optional[Dict], app_dir: str = '') -> Dict:
+        """Fill framework, port and commands from the rule and language defaults, run from app_dir"""
+        defaults = self.languages[language]
+        analysis['framework'] = rule['name'] if rule else None
+        analysis['port'] = (rule or {}).get('port', defaults.get('port'))
+        for key in ('start_commands', 'build_commands'):
+            commands = (rule or {}).get(key, defaults.get(key))
+            if commands and not analysis.get(key):
+                analysis[key] = [f"cd {shlex.quote(app_dir)} && {command}" if app_dir else command for command in commands]
+        return analysis
+
+
+class LocalFileSystem:
+    """Read-only view of a repository directory on disk"""
+    
+    def __init__(self, root: str):
+        self.root = root
+    
+    def _path(self, rel_path: str) -> str:
+        return os.path.join(self.root, *[part for part in rel_path.split('/') if part])
+    
+    def exists(self, rel_path: str) -> bool:
+        return os.path.exists(self._path(rel_path))
+    
+    def isdir(self, rel_path: str) -> bool:
+        return os.path.isdir(self._path(rel_path))
+    
+    def listdir(self, rel_path: str = '') -> List[str]:
+        return sorted(os.listdir(self._path(rel_path)))
+    
+    def open(self, rel_path: str) -> BinaryIO:
+        return open(self._path(rel_path), 'rb')
+    
+    def read_text(self, rel_path: str) -> str:
+        with open(self._path(rel_path), 'r') as f:
+            return f.read()
+    
+    def walk(self) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """Like os.walk, but yields '/'-separated directories relative to the root"""
+        for root, dirs, files in os.walk(self.root):
+            rel_dir = os.path.relpath(root, self.root).replace(os.sep, '/')
+            yield ('' if rel_dir == '.' else rel_dir), dirs, files
+    
+    def scan(self, prune: Optional[Callable[[str], bool]] = None) -> Iterator[Tuple[str, Optional[int]]]:
+        """Yield ('/'-separated path, size) for every regular file using one scandir pass per directory
+        
+        Directories whose name satisfies prune are not entered; they are yielded with a size of None.
+        """
+        pending = ['']
+        while pending:
+            rel_dir = pending.pop()
+            try:
+                with os.scandir(self._path(rel_dir)) as entries:
+                    for entry in entries:
+                        rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                        # d_type from readdir answers these without a stat call; symlinks are not followed
+                        if entry.is_dir(follow_symlinks=False):
+                            if prune and prune(entry.name):
+                                yield rel_path, None
+                            else:
+                                pending.append(rel_path)
+                        elif entry.is_file(follow_symlinks=False):
+                            yield rel_path, entry.stat(follow_symlinks=False).st_size
+            except (PermissionError, FileNotFoundError):
+                continue
+    
+    def digest(self, rel_path: str) -> str:
+        """Content hash of one file"""
+        return _file_sha256(self._path(rel_path))
+    
+    def subtree(self, rel_path: str) -> 'LocalFileSystem':
+        return LocalFileSystem(self._path(rel_path))
+    
+    def close(self):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _ListedFileSystem:
+    """Directory structure for read-only views built from a flat list of file paths"""
+    
+    def __init__(self, prefix: str, files: Dict, dirs: Dict[str, set]):
+        self.prefix = prefix
+        self._files = files
+        self._dirs = dirs
+    
+    @staticmethod
+    def _build_dirs(names: List[str]) -> Dict[str, set]:
+        """Map every directory (including implied parents) to the names it contains"""
+        dirs = {'': set()}
+        for name in names:
+            parts = name.split('/')
+            for depth in range(len(parts)):
+                dirs.setdefault('/'.join(parts[:depth]), set()).add(parts[depth])
+        return dirs
+    
+    def _name(self, rel_path: str) -> str:
+        return '/'.join(part for part in (self.prefix + '/' + rel_path).split('/') if part)
+    
+    def exists(self, rel_path: str) -> bool:
+        name = self._name(rel_path)
+        return name in self._files or name in self._dirs
+    
+    def isdir(self, rel_path: str) -> bool:
+        return self._name(rel_path) in self._dirs
+    
+    def listdir(self, rel_path: str = '') -> List[str]:
+        name = self._name(rel_path)
+        if name not in self._dirs:
+            raise FileNotFoundError(f"No such directory: {rel_path}")
+        return sorted(self._dirs[name])
+    
+    def read_text(self, rel_path: str) -> str:
+        with self.open(rel_path) as f:
+            return f.read().decode('utf-8')
+    
+    def walk(self) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """Top-down walk mirroring os.walk with '/'-separated relative paths"""
+        pending = ['']
+        while pending:
+            rel_dir = pending.pop()
+            name = self._name(rel_dir)
+            children = sorted(self._dirs.get(name, ()))
+            dirs = [child for child in children if self._name(rel_dir + '/' + child) in self._dirs]
+            files = [child for child in children if child not in dirs]
+            yield rel_dir, dirs, files
+            
+            # Honour in-place pruning of dirs, like os.walk
+            pending.extend(reversed([f"{rel_dir}/{d}" if rel_dir else d for d in dirs]))
+    
+    def scan(self, prune: Optional[Callable[[str], bool]] = None) -> Iterator[Tuple[str, Optional[int]]]:
+        """Yield (path relative to this view, size) for every file, straight from the listing
+        
+        Files below a directory whose name satisfies prune are dropped; each such directory
+        is yielded once with a size of None.
+        """
+        base = self.prefix + '/' if self.prefix else ''
+        pruned = set()
+        for name, entry in self._files.items():
+            if not name.startswith(base):
+                continue
+            rel_path = name[len(base):]
+            parts = rel_path.split('/')
+            for depth, part in enumerate(parts[:-1]):
+                if prune and prune(part):
+                    pruned_dir = '/'.join(parts[:depth + 1])
+                    if pruned_dir not in pruned:
+                        pruned.add(pruned_dir)
+                        yield pruned_dir, None
+                    break
+            else:
+                yield rel_path, self._file_size(entry)
+    
+    def subtree(self, rel_path: str):
+        view = copy.copy(self)
+        view.prefix = self._name(rel_path)
+        return view
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ZipFileSystem(_ListedFileSystem):
+    """Read-only view of a repository served straight from a zip archive's central directory"""
+    
+    def __init__(self, zip_path: str):
+        self.zip_path = zip_path
+        self._zip = zipfile.ZipFile(zip_path, 'r')
+        
+        files = {}
+        explicit_dirs = []
+        for info in self._zip.infolist():
+            name = info.filename.strip('/')
+            if not name:
+                continue
+            if info.is_dir():
+                explicit_dirs.append(name)
+            else:
+                files[name] = info
+        
+        dirs = self._build_dirs(list(files) + explicit_dirs)
+        for name in explicit_dirs:
+            dirs.setdefault(name, set())
+        super().__init__('', files, dirs)
+    
+    def open(self, rel_path: str) -> BinaryIO:
+        name = self._name(rel_path)
+        if name not in self._files:
+            raise FileNotFoundError(f"No such file in archive: {rel_path}")
+        return self._zip.open(self._files[name])
+    
+    @staticmethod
+    def _file_size(info: zipfile.ZipInfo) -> int:
+        return info.file_size
+    
+    def digest(self, rel_path: str) -> str:
+        """Content hash of one member, taken from the central directory without decompressing it"""
+        info = self._files[self._name(rel_path)]
+        return f"crc32:{info.CRC:08x}:{info.file_size}"
+    
+    def close(self):
+        self._zip.close()
+
+
+class GitTreeFileSystem(_ListedFileSystem):
+    """Read-only view of one commit of a (bare) git repository, read through git without a checkout"""
+    
+    def __init__(self, git_dir: str, ref: str = 'HEAD'):
+        self.git_dir = git_dir
+        self.ref = ref
+        
+        listing = subprocess.run(['git', '--git-dir', git_dir, 'ls-tree', '-r', '-z', '--long', ref],
+                                 capture_output=True, check=True).stdout
+        files = {}
+        for record in listing.split(b'\0'):
+            if not record:
+                continue
+            meta, path = record.split(b'\t', 1)
+            mode, kind, sha, size = meta.split()
+            # Submodules (commit) and symlinks have no readable blob content
+            if kind == b'blob' and mode != b'120000':
+                files[path.decode('utf-8')] = (sha.decode('ascii'), int(size))
+        
+        super().__init__('', files, self._build_dirs(list(files)))
+    
+    def open(self, rel_path: str) -> BinaryIO:
+        name = self._name(rel_path)
+        if name not in self._files:
+            raise FileNotFoundError(f"No such file in {self.git_dir}@{self.ref}: {rel_path}")
+        blob = subprocess.run(['git', '--git-dir', self.git_dir, 'cat-file', 'blob', self._files[name][0]],
+                              capture_output=True, check=True).stdout
+        return io.BytesIO(blob)
+    
+    @staticmethod
+    def _file_size(entry: Tuple[str, int]) -> int:
+        return entry[1]
+    
+    def digest(self, rel_path: str) -> str:
+        """Content hash of one file: its git blob id"""
+        return 'git:' + self._files[self._name(rel_path)][0]
+    
+    def close(self):
+        pass
+
+
+# Any read-only repository view the analyzer can run against
+RepositoryFS = Union[LocalFileSystem, ZipFileSystem, GitTreeFileSystem]
+
+
+class RepositoryIndex:
+    """Immutable in-memory index of a repository's files, built with a single traversal
+    
+    Answers the structural queries of a RepositoryFS (exists, isdir, listdir, walk) from memory
+    and delegates content reads to the filesystem it was built from.
+    """
+    
+    def __init__(self, fs: RepositoryFS, sizes: Dict[str, int], pruned: Tuple[str, ...] = (),
+                 budget: Optional[AnalysisBudget] = None, truncated: bool = False):
+        self.fs = fs
+        # Charged by every read and checked while iterating; truncated when the scan ran out of it
+        self.budget = budget
+        self.truncated = truncated
+        
+        listings = {'': ([], [])}
+        for rel_path in sizes:
+            parent, _, name = rel_path.rpartition('/')
+            
+            # Create any directories not seen yet, then link each into its own parent
+            new_dirs = []
+            directory = parent
+            while directory not in listings:
+                listings[directory] = ([], [])
+                new_dirs.append(directory)
+                directory = directory.rpartition('/')[0]
+            for directory in new_dirs:
+                grandparent, _, dir_name = directory.rpartition('/')
+                listings[grandparent][0].append(dir_name)
+            listings[parent][1].append(name)
+        
+        by_extension = {}
+        for rel_path in sizes:
+            by_extension.setdefault(os.path.splitext(rel_path)[1].lower(), []).append(rel_path)
+        
+        # Directories that were skipped rather than indexed
+        self.pruned = tuple(sorted(pruned))
+        self._sizes = MappingProxyType(dict(sizes))
+        self._listings = MappingProxyType({rel_dir: (tuple(sorted(dirs)), tuple(sorted(files)))
+                                           for rel_dir, (dirs, files) in listings.items()})
+        self._by_extension = MappingProxyType({ext: tuple(sorted(paths)) for ext, paths in by_extension.items()})
+        self.digests = None
+        self._fingerprint = None
+    
+    @classmethod
+    def build(cls, fs: RepositoryFS, prune: Optional[Callable[[str], bool]] = None,
+              budget: Optional[AnalysisBudget] = None) -> 'RepositoryIndex':
+        """Index fs with one scan, skipping directories whose name satisfies prune
+        
+        With a budget, every entry counts as a visited file; when it runs out the index holds
+        what was scanned so far and is marked truncated.
+        """
+        sizes = {}
+        pruned = []
+        truncated = False
+        try:
+            for rel_path, size in fs.scan(prune):
+                if budget is not None and not budget.visit():
+                    truncated = True
+                    break
+                if size is None:
+                    pruned.append(rel_path)
+                else:
+                    sizes[rel_path] = size
+        except AnalysisBudgetExceeded:
+            truncated = True
+        return cls(fs, sizes, tuple(pruned), budget, truncated)
+    
+    def subtree(self, rel_path: str) -> 'RepositoryIndex':
+        """Index of one directory, re-rooted, built from this index without touching the filesystem"""
+        key = self._key(rel_path)
+        if not key:
+            return self
+        base = key + '/'
+        return RepositoryIndex(self.fs.subtree(key),
+                               {path[len(base):]: size for path, size in self._sizes.items() if path.startswith(base)},
+                               tuple(path[len(base):] for path in self.pruned if path.startswith(base)),
+                               self.budget, self.truncated)
+    
+    def fingerprint(self, workers: int = 1) -> str:
+        """Merkle hash over paths and file content hashes; equal trees give equal fingerprints
+        
+        File hashes are computed once (across a thread pool) and kept in self.digests.
+        """
+        if self._fingerprint is not None:
+            return self._fingerprint
+        
+        paths = list(self._sizes)
+        if workers > 1 and len(paths) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                digests = dict(zip(paths, executor.map(self._hash, paths)))
+        else:
+            digests = {path: self._hash(path) for path in paths}
+        
+        # Hash directories bottom-up; each one covers its files, subdirectories and pruned entries
+        pruned_by_dir = {}
+        for path in self.pruned:
+            parent, _, name = path.rpartition('/')
+            pruned_by_dir.setdefault(parent, []).append(name)
+        
+        tree_hashes = {}
+        for rel_dir in sorted(self._listings, key=lambda d: d.count('/') + bool(d), reverse=True):
+            dirs, files = self._listings[rel_dir]
+            prefix = rel_dir + '/' if rel_dir else ''
+            lines = [f"tree {name} {tree_hashes[prefix + name]}" for name in dirs]
+            lines += [f"blob {name} {digests[prefix + name]}" for name in files]
+            lines += [f"pruned {name}" for name in sorted(pruned_by_dir.get(rel_dir, ()))]
+            tree_hashes[rel_dir] = hashlib.sha256('\n'.join(sorted(lines)).encode('utf-8')).hexdigest()
+        
+        self.digests = MappingProxyType(digests)
+        self._fingerprint = tree_hashes['']
+        return self._fingerprint
+    
+    def digest(self, rel_path: str) -> str:
+        """Content hash of one file, reusing the fingerprint pass when it already ran"""
+        key = self._key(rel_path)
+        if self.digests is not None:
+            return self.digests[key]
+        return self._hash(key)
+    
+    def _hash(self, key: str) -> str:
+        if self.budget is not None:
+            self.budget.check()
+        return self.fs.digest(key)
+    
+    @staticmethod
+    def _key(rel_path: str) -> str:
+        return '/'.join(part for part in rel_path.split('/') if part)
+    
+    def __len__(self) -> int:
+        return len(self._sizes)
+    
+    def exists(self, rel_path: str) -> bool:
+        key = self._key(rel_path)
+        return key in self._sizes or key in self._listings
+    
+    def isdir(self, rel_path: str) -> bool:
+        return self._key(rel_path) in self._listings
+    
+    def isfile(self, rel_path: str) -> bool:
+        return self._key(rel_path) in self._sizes
+    
+    def listdir(self, rel_path: str = '') -> List[str]:
+        key = self._key(rel_path)
+        if key not in self._listings:
+            raise FileNotFoundError(f"No such directory: {rel_path}")
+        dirs, files = self._listings[key]
+        return sorted(dirs + files)
+    
+    def size(self, rel_path: str) -> int:
+        return self._sizes[self._key(rel_path)]
+    
+    def files_with_extension(self, *extensions: str) -> List[str]:
+        """All indexed paths ending in one of the given extensions (e.g. '.py')"""
+        return [path for ext in extensions for path in self._by_extension.get(ext.lower(), ())]
+    
+    def files(self) -> Iterator[str]:
+        if self.budget is None:
+            return iter(self._sizes)
+        return self._checked(self._sizes)
+    
+    def _checked(self, items) -> Iterator:
+        # Lets detectors looping over millions of entries notice a spent budget
+        for count, item in enumerate(items):
+            if count % 1024 == 0:
+                self.budget.check()
+            yield item
+    
+    def walk(self) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """Top-down walk over the index mirroring os.walk, honouring in-place pruning of dirs"""
+        pending = ['']
+        while pending:
+            if self.budget is not None:
+                self.budget.check()
+            rel_dir = pending.pop()
+            dirs, files = self._listings[rel_dir]
+            dirs = list(dirs)
+            yield rel_dir, dirs, list(files)
+            pending.extend(reversed([f"{rel_dir}/{d}" if rel_dir else d for d in dirs]))
+    
+    def open(self, rel_path: str) -> BinaryIO:
+        if self.budget is None:
+            return self.fs.open(rel_path)
+        self.budget.check()
+        return io.BufferedReader(_BudgetedReader(self.fs.open(rel_path), self.budget))
+    
+    def read_text(self, rel_path: str) -> str:
+        if self.budget is not None and self.isfile(rel_path):
+            self.budget.charge(self.size(rel_path))
+        return self.fs.read_text(rel_path)
 
 
 class RepositoryAnalyzer:
     """Analyzes code repositories to extract deployment information"""
     
-    def __init__(self):
-        self.supported_frameworks = {
-            'python': {
-                'flask': ['app.py', 'main.py', 'wsgi.py'],
-                'django': ['manage.py', 'settings.py'],
-                'fastapi': ['main.py', 'app.py'],
-                'bottle': ['app.py', 'main.py']
-            },
-            'nodejs': {
-                'express': ['package.json', 'app.js', 'server.js', 'index.js'],
-                'nextjs': ['package.json', 'next.config.js'],
-                'react': ['package.json', 'src/App.js'],
-                'vue': ['package.json', 'src/main.js']
-            },
-            'java': {
-                'spring': ['pom.xml', 'build.gradle'],
-                'maven': ['pom.xml'],
-                'gradle': ['build.gradle']
-            },
-            'php': {
-                'laravel': ['composer.json', 'artisan'],
-                'wordpress': ['wp-config.php'],
-                'symfony': ['composer.json']
-            }
+    def __init__(self, config: Optional[Dict] = None, http_client: Optional[HttpClient] = None):
+        self.config = config or {}
+        self.logger = logging.getLogger(__name__)
+        
+        # Shared HTTP layer for every repository fetch
+        self.http = http_client or HttpClient(self.config.get('http'))
+        
+        # Streaming download settings
+        self.download_chunk_size = self.config.get('download_chunk_size', 1024 * 1024)
+        self.max_archive_size = self.config.get('max_archive_size', 1024 * 1024 * 1024)
+        self.download_resume_attempts = self.config.get('download_resume_attempts', 5)
+        
+        # Persistent archive/extraction cache
+        cache_config = self.config.get('archive_cache', {})
+        self.archive_cache = None
+        if cache_config.get('enabled', True):
+            self.archive_cache = ArchiveCache(
+                os.path.expanduser(cache_config.get('dir', '~/.cache/arvo/archives')),
+                cache_config.get('max_size', 2 * 1024 * 1024 * 1024)
+            )
+        self.github_api_url = self.config.get('github_api_url', 'https://api.github.com')
+        
+        # Selective extraction: only materialize files later stages actually read
+        extraction = self.config.get('extraction', {})
+        self.selective_extraction = extraction.get('selective', True)
+        self.extract_include = extraction.get('include', ['*'])
+        self.extract_exclude = extraction.get('exclude', [])
+        self.max_extract_file_size = extraction.get('max_file_size')
+        self.extract_workers = extraction.get('workers', min(8, os.cpu_count() or 1))
+        self.parallel_extract_threshold = extraction.get('parallel_threshold', 200)
+        self.max_extract_total_size = extraction.get('max_total_size', 4 * 1024 * 1024 * 1024)
+        self.max_extract_entries = extraction.get('max_entries', 200000)
+        self.max_compression_ratio = extraction.get('max_compression_ratio', 200)
+        
+        # Every fetched archive, checkout and extracted tree lives in a managed workspace
+        workspace_config = self.config.get('workspace', {})
+        self.workspaces = WorkspaceManager(
+            os.path.expanduser(workspace_config.get('root', os.path.join(tempfile.gettempdir(), 'arvo-workspaces'))),
+            max_size=workspace_config.get('max_size'),
+            max_age=workspace_config.get('max_age', 24 * 3600),
+            gc_interval=workspace_config.get('gc_interval', 600)
+        )
+        self._owned_workspaces = {}
+        
+        # Git transport: bare mirrors reused across fetches, optional sparse checkout
+        git_config = self.config.get('git', {})
+        self.git_mirror_dir = os.path.expanduser(git_config.get('mirror_dir', '~/.cache/arvo/git-mirrors'))
+        self.git_sparse_paths = git_config.get('sparse_paths')
+        self._git_mirror_locks = {}
+        
+        # Directories skipped by every repository traversal (analysis and code rewriting)
+        analysis_config = self.config.get('analysis', {})
+        self.prune_dirs = analysis_config.get('prune_dirs', DEFAULT_PRUNE_DIRS)
+        self.prune_dir = _dir_pruner(self.prune_dirs)
+        self.analysis_workers = analysis_config.get('workers', min(8, os.cpu_count() or 1))
+        
+        # Framework detection rules (built-in plus analysis.frameworks from config), compiled once
+        self.framework_rules = FrameworkRules.from_config(analysis_config.get('frameworks'))
+        self._port_rules = {
+            language: [(_compile_globs(rule['files']), rule['weight'], re.compile(rule['pattern']))
+                       for rule in PORT_RULES if rule['languages'] is None or language in rule['languages']]
+            for language in DETECTOR_INPUTS
         }
+        self._detector_inputs = {
+            language: _compile_globs(patterns + self.framework_rules.indicator_files(language)
+                                     + self.framework_rules.source_patterns(language)
+                                     + [glob for rule in PORT_RULES for glob in rule['files']
+                                        if rule['languages'] is None or language in rule['languages']])
+            for language, patterns in DETECTOR_INPUTS.items()
+        }
+        
+        # Content sniffing reads at most this much of each source, stopping once a framework
+        # has been seen in `confidence` files
+        source_scan = analysis_config.get('source_scan', {})
+        self.source_scan_bytes = source_scan.get('max_bytes', 64 * 1024)
+        self.source_scan_confidence = source_scan.get('confidence', 3)
+        
+        # Entrypoint discovery: parse results per (content hash, constructors), and how many files
+        # it takes before parsing moves to a process pool
+        entrypoints = analysis_config.get('entrypoints', {})
+        self.entrypoint_process_threshold = entrypoints.get('process_threshold', 32)
+        self.entrypoint_max_file_size = entrypoints.get('max_file_size', 1024 * 1024)
+        self._entrypoint_cache = {}
+        self._entrypoint_cache_lock = threading.Lock()
+        
+        # Port inference: per-file matches cached by (content hash, language)
+        self.port_scan_max_file_size = analysis_config.get('ports', {}).get('max_file_size', 1024 * 1024)
+        self._port_cache = {}
+        self._port_cache_lock = threading.Lock()
+        
+        # Every analysis runs on a budget; past it the analyzer returns a partial, truncated result
+        budget = analysis_config.get('budget', {})
+        self.analysis_max_seconds = budget.get('max_seconds', 120)
+        self.analysis_max_files = budget.get('max_files', 1000000)
+        self.analysis_max_bytes = budget.get('max_bytes', 2 * 1024 * 1024 * 1024)
+        self.last_analysis_stats = None
+        self.detector_stats = {'run': 0, 'reused': 0}
+        self._detector_stats_lock = threading.Lock()
+        
+        # Analysis results keyed by tree fingerprint; opt-in, since a stale entry outlives code changes
+        # unless ANALYZER_VERSION is bumped with them
+        analysis_cache_config = analysis_config.get('cache', {})
+        self.analysis_cache = None
+        if analysis_cache_config.get('enabled', False):
+            self.analysis_cache = AnalysisCache(
+                os.path.expanduser(analysis_cache_config.get('dir', '~/.cache/arvo/analysis')),
+                ANALYZER_VERSION,
+                max_entries=analysis_cache_config.get('max_entries', 1000)
+            )
+        
+        # Default branch per repository URL, resolved at most once
+        self.candidate_branches = self.config.get('candidate_branches', ['main', 'master', 'develop'])
+        self._default_branches = {}
     
-    def download_repository(self, repo_url: str) -> str:
-        """Download repository from GitHub or extract from zip file"""
-        temp_dir = tempfile.mkdtemp()
+    def download_repository(self, repo_url: str, workspace: Optional[Workspace] = None) -> str:
+        """Download repository from GitHub or extract from zip file
         
-        if repo_url.endswith('.zip'):
-            # Extract zip file
-            with zipfile.ZipFile(repo_url, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
+        Without a workspace, the result lives in a fresh one; free it with release_repository().
+        """
+        if workspace is None:
+            return self._in_owned_workspace(lambda owned: self.download_repository(repo_url, owned))
+        return self.extract_repository(self.fetch_repository(repo_url, workspace), workspace)
+    
+    def fetch_repository(self, repo_url: str, workspace: Optional[Workspace] = None) -> str:
+        """Fetch a repository without extracting it, returning a local zip path or checkout directory
+        
+        Without a workspace, files go to a fresh one; free it with release_repository().
+        """
+        archive_format = _archive_format(repo_url)
+        
+        if os.path.isdir(repo_url):
+            # Local directories and bare git repositories are analyzed in place
+            return repo_url
+        elif archive_format == 'zip' and '://' not in repo_url:
+            # Local zip files are read in place
+            return repo_url
+        elif workspace is None:
+            return self._in_owned_workspace(lambda owned: self.fetch_repository(repo_url, owned))
+        elif archive_format == 'zip' and 'github.com' not in repo_url:
+            # Zip archives served from anywhere else
+            try:
+                return self._download_archive(repo_url, repo_url, '', workspace)
+            except Exception as e:
+                raise Exception(f"Failed to download repository: {e}")
+        elif archive_format in ('tar', 'tar.gz', 'tar.zst'):
+            # Tarballs have no central directory; decompress them as a stream straight into the workspace
+            try:
+                return self._fetch_tarball(repo_url, archive_format, workspace)
+            except Exception as e:
+                raise Exception(f"Failed to unpack tarball {repo_url}: {e}")
+        elif self.is_git_url(repo_url):
+            # Any git remote: shallow clone through a local bare mirror
+            remote, _, ref = repo_url[len('git+'):].partition('#') if repo_url.startswith('git+') \
+                else repo_url.partition('#')
+            try:
+                return self._fetch_git(remote, ref or None, workspace)
+            except Exception as e:
+                raise Exception(f"Failed to clone repository: {e}")
         elif 'github.com' in repo_url:
             # Download from GitHub
             if repo_url.endswith('.git'):
@@ -64,81 +2007,695 @@ class RepositoryAnalyzer:
             
             # Convert GitHub URL to zip download
             if '/archive/' not in repo_url:
-                # Try different branch names
-                branches = ['main', 'master', 'develop']
-                success = False
-                
-                for branch in branches:
+                # One API round trip: the default branch's commit, which is also the cache key
+                sha = self._resolve_commit_sha(repo_url, 'HEAD') if self.archive_cache else None
+                if sha:
                     try:
-                        zip_url = repo_url + f'/archive/{branch}.zip'
-                        response = requests.get(zip_url)
-                        response.raise_for_status()
-                        
-                        zip_path = os.path.join(temp_dir, 'repo.zip')
-                        with open(zip_path, 'wb') as f:
-                            f.write(response.content)
-                        
-                        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                            zip_ref.extractall(temp_dir)
-                        
-                        # Remove the zip file
-                        os.remove(zip_path)
-                        success = True
-                        break
-                        
+                        return self._fetch_github_archive(repo_url, 'HEAD', workspace, sha)
                     except Exception as e:
-                        continue
+                        raise Exception(f"Failed to download repository commit {sha[:12]}: {e}")
                 
-                if not success:
+                branch = self._resolve_default_branch(repo_url)
+                if not branch:
                     raise Exception(f"Failed to download repository from any branch: {repo_url}")
+                
+                try:
+                    return self._fetch_github_archive(repo_url, branch, workspace)
+                except Exception as e:
+                    raise Exception(f"Failed to download repository branch {branch}: {e}")
             else:
                 try:
-                    response = requests.get(repo_url)
-                    response.raise_for_status()
-                    
-                    zip_path = os.path.join(temp_dir, 'repo.zip')
-                    with open(zip_path, 'wb') as f:
-                        f.write(response.content)
-                    
-                    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                        zip_ref.extractall(temp_dir)
-                    
-                    # Remove the zip file
-                    os.remove(zip_path)
+                    return self._download_archive(repo_url, repo_url, '', workspace)
                     
                 except Exception as e:
                     raise Exception(f"Failed to download repository: {e}")
         else:
             raise Exception("Unsupported repository URL format")
+    
+    def release_repository(self, path: str):
+        """Release the workspace that download/fetch/extract_repository created for path"""
+        workspace = self._owned_workspaces.pop(path, None)
+        if workspace:
+            workspace.release()
+    
+    def close(self):
+        """Release every workspace still held for results returned without a caller workspace"""
+        while self._owned_workspaces:
+            self._owned_workspaces.popitem()[1].release()
+    
+    def keep_workspace(self, path: str, workspace: Workspace):
+        """Hold workspace until release_repository(path) if path lives in it, else release it now"""
+        if os.path.commonpath([os.path.abspath(path), workspace.path]) != workspace.path:
+            # The result lives elsewhere (archive cache, local input) - nothing to keep
+            workspace.release()
+        else:
+            self._owned_workspaces[path] = workspace
+    
+    def _in_owned_workspace(self, fetch: Callable[[Workspace], str]) -> str:
+        """Run fetch in a fresh workspace, keeping it only while it holds the returned path"""
+        workspace = self.workspaces.acquire()
+        try:
+            path = fetch(workspace)
+        except Exception:
+            workspace.release()
+            raise
+        
+        self.keep_workspace(path, workspace)
+        return path
+    
+    def open_repository(self, archive_path: str) -> RepositoryFS:
+        """Open a fetched archive as a read-only filesystem that analyze_repository can run on"""
+        if _is_bare_git_repo(archive_path):
+            return GitTreeFileSystem(archive_path)
+        if os.path.isdir(archive_path):
+            return LocalFileSystem(archive_path)
+        return ZipFileSystem(archive_path)
+    
+    def extract_repository(self, archive_path: str, workspace: Optional[Workspace] = None) -> str:
+        """Materialize a fetched archive on disk for stages that need real files"""
+        if workspace and os.path.isdir(archive_path) and \
+                os.path.commonpath([os.path.abspath(archive_path), workspace.path]) == workspace.path:
+            # Unpacked tarballs and git checkouts already are this deployment's private copy
+            return archive_path
+        
+        if workspace is None:
+            return self._in_owned_workspace(lambda owned: self.extract_repository(archive_path, owned))
+        temp_dir = workspace.mkdtemp(prefix='repo-')
+        
+        if _is_bare_git_repo(archive_path):
+            # Stream the commit out of git instead of creating a checkout first
+            archive = subprocess.Popen(['git', '--git-dir', archive_path, 'archive', '--format=tar', 'HEAD'],
+                                       stdout=subprocess.PIPE)
+            try:
+                self._extract_tar_stream(archive.stdout, 'tar', temp_dir)
+            finally:
+                archive.stdout.close()
+                if archive.wait() != 0:
+                    raise Exception(f"git archive failed for {archive_path}")
+            return temp_dir
+        
+        if os.path.isdir(archive_path):
+            # Checkouts are copied so later stages never modify the fetched tree
+            self._copy_tree(archive_path, temp_dir)
+            return temp_dir
+        
+        if not self.archive_cache:
+            self._extract_archive(archive_path, temp_dir)
+            return temp_dir
+        
+        entry_dir = self.archive_cache.entry_for(archive_path)
+        if entry_dir is None:
+            # Archives outside the cache (local zip files) are cached by content digest
+            key = ArchiveCache.make_key(os.path.abspath(archive_path), '', _file_sha256(archive_path))
+            entry_dir = self.archive_cache.get(key) or self.archive_cache.put(key, archive_path)
+            if entry_dir is None:
+                self._extract_archive(archive_path, temp_dir)
+                return temp_dir
         
+        cached_tree = self.archive_cache.extract(entry_dir, self._extract_archive,
+                                                 variant=self._extraction_variant())
+        shutil.copytree(cached_tree, temp_dir, dirs_exist_ok=True)
         return temp_dir
     
-    def _get_actual_repo_path(self, downloaded_path: str) -> str:
-        """Find the actual repository path within the downloaded directory"""
+    def _extract_archive(self, archive_path: str, dest_dir: str) -> Dict:
+        """Extract the members of a zip archive that pass the extraction rules into dest_dir"""
+        with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+            files = [info for info in zip_ref.infolist() if not info.is_dir()]
+        members = [info for info in files if self._should_extract(info.filename, info.file_size)]
+        guard = self._extraction_guard()
+        
+        # Refuse up front when the central directory already declares too much
+        guard.check_listing([(info.filename, info.file_size) for info in members])
+        
+        workers = min(self.extract_workers, len(members))
+        if workers > 1 and len(members) >= self.parallel_extract_threshold:
+            self._extract_parallel(archive_path, dest_dir, members, workers, guard)
+        else:
+            with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+                for info in members:
+                    self._extract_zip_member(zip_ref, info, dest_dir, guard)
+        
+        skipped = len(files) - len(members)
+        self.logger.info(f"Extracted {len(members)} files ({guard.total_bytes} bytes) "
+                         f"from {archive_path} (skipped {skipped})")
+        return {'extracted': len(members), 'skipped': skipped, 'bytes': guard.total_bytes}
+    
+    def _extract_zip_member(self, zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, dest_dir: str,
+                            guard: ExtractionGuard):
+        """Stream one member to disk, counting the bytes actually produced rather than the declared size"""
+        guard.start_member(info.filename)
+        target = _zip_member_target(dest_dir, info.filename)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        
+        written = 0
+        try:
+            with zip_ref.open(info) as src, open(target, 'wb') as dest:
+                for chunk in iter(lambda: src.read(self.download_chunk_size), b''):
+                    written += len(chunk)
+                    guard.consume(info.filename, len(chunk), written, info.compress_size)
+                    dest.write(chunk)
+        except ArchiveLimitError:
+            os.remove(target)
+            raise
+    
+    def _extraction_guard(self) -> ExtractionGuard:
+        return ExtractionGuard(self.max_extract_total_size, self.max_extract_entries,
+                               self.max_compression_ratio)
+    
+    def _fetch_tarball(self, source: str, archive_format: str, workspace: Workspace) -> str:
+        """Unpack a local or remote tarball into the workspace without an intermediate file"""
+        dest_dir = workspace.mkdtemp(prefix='repo-')
+        
+        if '://' not in source:
+            with open(source, 'rb') as f:
+                self._extract_tar_stream(f, archive_format, dest_dir)
+            return dest_dir
+        
+        with self.http.get(source, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            self._extract_tar_stream(_LimitedReader(response.raw, self.max_archive_size, source),
+                                     archive_format, dest_dir)
+        return dest_dir
+    
+    def _extract_tar_stream(self, stream: BinaryIO, archive_format: str, dest_dir: str) -> Dict:
+        """Extract regular files from a forward-only tar stream, applying the extraction rules"""
+        # Count compressed bytes so the guard can spot decompression bombs
+        compressed_stream = None
+        if archive_format != 'tar':
+            stream = compressed_stream = stream if isinstance(stream, _LimitedReader) \
+                else _LimitedReader(stream, None, 'tar stream')
+        
+        if archive_format == 'tar.zst':
+            if zstandard is None:
+                raise Exception("Reading .tar.zst archives requires the 'zstandard' package "
+                                "(pip install zstandard)")
+            stream = zstandard.ZstdDecompressor().stream_reader(stream)
+            archive_format = 'tar'
+        
+        extracted = 0
+        skipped = 0
+        mode = 'r|gz' if archive_format == 'tar.gz' else 'r|'
+        guard = self._extraction_guard()
+        
+        with tarfile.open(fileobj=stream, mode=mode) as tar:
+            for member in tar:
+                # Links and device files are never materialized
+                if not member.isfile():
+                    continue
+                if not self._should_extract(member.name, member.size):
+                    skipped += 1
+                    continue
+                
+                guard.start_member(member.name)
+                target = _zip_member_target(dest_dir, member.name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                try:
+                    with tar.extractfile(member) as src, open(target, 'wb') as dest:
+                        for chunk in iter(lambda: src.read(self.download_chunk_size), b''):
+                            # Tar compression spans the whole stream, so judge the overall ratio
+                            guard.consume(member.name, len(chunk), guard.total_bytes + len(chunk),
+                                          compressed_stream.bytes_read if compressed_stream else None)
+                            dest.write(chunk)
+                except ArchiveLimitError:
+                    os.remove(target)
+                    raise
+                extracted += 1
+        
+        self.logger.info(f"Extracted {extracted} files ({guard.total_bytes} bytes) from tar stream "
+                         f"(skipped {skipped})")
+        return {'extracted': extracted, 'skipped': skipped, 'bytes': guard.total_bytes}
+    
+    def _copy_tree(self, src_dir: str, dest_dir: str) -> Dict:
+        """Copy the files of a directory that pass the extraction rules into dest_dir"""
+        copied = 0
+        skipped = 0
+        
+        for root, dirs, files in os.walk(src_dir):
+            rel_root = os.path.relpath(root, src_dir).replace(os.sep, '/')
+            for file in files:
+                rel_path = file if rel_root == '.' else f"{rel_root}/{file}"
+                src_path = os.path.join(root, file)
+                if not self._should_extract(rel_path, os.path.getsize(src_path)):
+                    skipped += 1
+                    continue
+                dest_path = os.path.join(dest_dir, *rel_path.split('/'))
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                shutil.copy2(src_path, dest_path)
+                copied += 1
+        
+        return {'extracted': copied, 'skipped': skipped}
+    
+    def _extract_parallel(self, archive_path: str, dest_dir: str, members: List[zipfile.ZipInfo],
+                          workers: int, guard: ExtractionGuard):
+        """Decompress members across a thread pool, one ZipFile handle per worker"""
+        # Create every target directory up front so workers never race on makedirs
+        for parent in {os.path.dirname(_zip_member_target(dest_dir, info.filename)) for info in members}:
+            os.makedirs(parent, exist_ok=True)
+        
+        # Balance buckets by uncompressed size, largest members first
+        buckets = [[] for _ in range(workers)]
+        loads = [0] * workers
+        for info in sorted(members, key=lambda info: info.file_size, reverse=True):
+            lightest = loads.index(min(loads))
+            buckets[lightest].append(info)
+            loads[lightest] += info.file_size
+        
+        def extract_bucket(bucket: List[zipfile.ZipInfo]):
+            with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+                for info in bucket:
+                    self._extract_zip_member(zip_ref, info, dest_dir, guard)
+        
+        # zlib releases the GIL, so threads decompress concurrently
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(extract_bucket, bucket) for bucket in buckets]:
+                future.result()
+    
+    def _should_extract(self, member_path: str, size: int) -> bool:
+        """Apply the include/exclude globs and size threshold from the extraction config"""
+        if not self.selective_extraction:
+            return True
+        if self.max_extract_file_size and size > self.max_extract_file_size:
+            return False
+        if not any(_path_matches(member_path, pattern) for pattern in self.extract_include):
+            return False
+        return not any(_path_matches(member_path, pattern) for pattern in self.extract_exclude)
+    
+    def _extraction_variant(self) -> str:
+        """Fingerprint of the extraction settings, so cached trees follow config changes"""
+        if not self.selective_extraction:
+            return ''
+        settings = json.dumps([self.extract_include, self.extract_exclude, self.max_extract_file_size])
+        return hashlib.sha256(settings.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def is_repository_reference(word: str) -> bool:
+        """Check whether a word from user input names something fetch_repository can handle"""
+        return 'github.com' in word or _archive_format(word) is not None or \
+            RepositoryAnalyzer.is_git_url(word) or RepositoryAnalyzer.is_local_path_reference(word)
+    
+    @staticmethod
+    def is_local_path_reference(word: str) -> bool:
+        """Check whether a word is written as a path to a local directory, not just a word that happens to name one"""
+        if '://' in word or not ('/' in word or word.startswith(('./', '../', '~'))):
+            return False
+        return os.path.isdir(os.path.expanduser(word))
+    
+    @staticmethod
+    def is_git_url(repo_url: str) -> bool:
+        """Check whether a repository reference should be fetched with git rather than as an archive"""
+        if repo_url.startswith(('git+', 'file://', 'ssh://', 'git://', 'git@')):
+            return True
+        # GitHub .git URLs keep using the (cheaper) archive download
+        return repo_url.endswith('.git') and 'github.com' not in repo_url
+    
+    def _fetch_git(self, remote: str, ref: Optional[str], workspace: Workspace) -> str:
+        """Depth-1 clone of one ref, transferring only new objects into a local bare mirror first"""
+        mirror_dir = os.path.join(self.git_mirror_dir, hashlib.sha256(remote.encode('utf-8')).hexdigest())
+        local_branch = f"arvo/{re.sub(r'[^A-Za-z0-9._-]', '_', ref) if ref else 'default'}"
+        
+        with self._git_mirror_locks.setdefault(mirror_dir, threading.Lock()):
+            if not os.path.isdir(mirror_dir):
+                os.makedirs(self.git_mirror_dir, exist_ok=True)
+                self._git('init', '--quiet', '--bare', mirror_dir)
+            self._git('fetch', '--quiet', '--depth', '1', '--force', remote,
+                      f"{ref or 'HEAD'}:refs/heads/{local_branch}", cwd=mirror_dir)
+            
+            checkout_dir = workspace.mkdtemp(prefix='checkout-')
+            self._git('clone', '--quiet', '--depth', '1', '--no-checkout', '--branch', local_branch,
+                      'file://' + os.path.abspath(mirror_dir), checkout_dir)
+        
+        if self.git_sparse_paths:
+            self._git('sparse-checkout', 'set', '--no-cone', *self.git_sparse_paths, cwd=checkout_dir)
+        self._git('checkout', '--quiet', local_branch, cwd=checkout_dir)
+        
+        self.logger.info(f"Cloned {remote}@{ref or 'HEAD'} via mirror {mirror_dir}")
+        return checkout_dir
+    
+    @staticmethod
+    def _git(*args: str, cwd: Optional[str] = None) -> str:
+        """Run a git command, raising with its stderr on failure"""
+        result = subprocess.run(['git', *args], cwd=cwd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"git {args[0]} failed: {result.stderr.strip()}")
+        return result.stdout
+    
+    @staticmethod
+    def _github_repo_path(repo_url: str) -> Optional[str]:
+        """Extract 'owner/repo' from a GitHub URL"""
+        match = re.search(r'github\.com[/:]([^/]+)/([^/]+?)/?$', repo_url)
+        return f"{match.group(1)}/{match.group(2)}" if match else None
+    
+    def _resolve_default_branch(self, repo_url: str) -> Optional[str]:
+        """Find the branch to deploy, asking the GitHub API first and probing candidates otherwise"""
+        if repo_url in self._default_branches:
+            return self._default_branches[repo_url]
+        
+        branch = self._query_default_branch(repo_url) or self._probe_branches(repo_url)
+        if branch:
+            self._default_branches[repo_url] = branch
+        return branch
+    
+    def _query_default_branch(self, repo_url: str) -> Optional[str]:
+        """Read the repository's default branch from the GitHub API"""
+        repo_path = self._github_repo_path(repo_url)
+        if not repo_path:
+            return None
+        
+        try:
+            response = self.http.get(f"{self.github_api_url}/repos/{repo_path}")
+            response.raise_for_status()
+            return response.json().get('default_branch')
+        except Exception:
+            return None
+    
+    def _probe_branches(self, repo_url: str) -> Optional[str]:
+        """HEAD every candidate branch archive concurrently and keep the preferred one that exists"""
+        def probe(branch: str) -> bool:
+            try:
+                return self.http.head(repo_url + f'/archive/{branch}.zip', allow_redirects=True).ok
+            except Exception:
+                return False
+        
+        if not self.candidate_branches:
+            return None
+        
+        executor = ThreadPoolExecutor(max_workers=max(1, len(self.candidate_branches)))
+        try:
+            futures = [(branch, executor.submit(probe, branch)) for branch in self.candidate_branches]
+            
+            # All probes are in flight at once; return as soon as the most preferred one succeeds
+            for branch, future in futures:
+                if future.result():
+                    return branch
+        finally:
+            executor.shutdown(wait=False)
+        
+        return None
+    
+    def _fetch_github_archive(self, repo_url: str, ref: str, workspace: Workspace,
+                              sha: Optional[str] = None) -> str:
+        """Fetch a GitHub ref's archive, skipping the download when its commit is cached
+        
+        The commit is only looked up (one API request) when there is an archive cache to consult.
+        """
+        if sha is None and self.archive_cache:
+            sha = self._resolve_commit_sha(repo_url, ref)
+        
+        if sha and self.archive_cache:
+            entry_dir = self.archive_cache.get(ArchiveCache.make_key(repo_url, ref, sha))
+            if entry_dir:
+                self.logger.info(f"Archive cache hit for {repo_url}@{ref} ({sha[:12]})")
+                return self.archive_cache.archive_path(entry_dir)
+        
+        # Download the exact commit when we know it so the cache entry matches its key
+        zip_url = repo_url + f'/archive/{sha or ref}.zip'
+        return self._download_archive(zip_url, repo_url, ref, workspace, sha)
+    
+    def _resolve_commit_sha(self, repo_url: str, ref: str) -> Optional[str]:
+        """Ask the GitHub API which commit a ref points at (None if unavailable)"""
+        repo_path = self._github_repo_path(repo_url)
+        if not repo_path:
+            return None
+        
+        api_url = f"{self.github_api_url}/repos/{repo_path}/commits/{ref}"
+        try:
+            response = self.http.get(api_url, headers={'Accept': 'application/vnd.github.sha'})
+            response.raise_for_status()
+        except Exception:
+            return None
+        
+        sha = response.text.strip()
+        return sha if re.fullmatch(r'[0-9a-f]{40}', sha) else None
+    
+    def _download_archive(self, zip_url: str, repo_url: str, ref: str, workspace: Workspace,
+                          sha: Optional[str] = None) -> str:
+        """Stream a zip archive to disk and file it in the archive cache"""
+        temp_dir = workspace.mkdtemp(prefix='download-')
+        zip_path = os.path.join(temp_dir, 'repo.zip')
+        
+        # Revalidate a previously cached copy of this URL instead of downloading it again
+        validators = self.archive_cache.get_validators(zip_url) if self.archive_cache and not sha else None
+        conditional_headers = {}
+        if validators:
+            if validators.get('etag'):
+                conditional_headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                conditional_headers['If-Modified-Since'] = validators['last_modified']
+        
+        download = self._stream_download(zip_url, zip_path, conditional_headers)
+        if download['not_modified']:
+            entry_dir = self.archive_cache.get(validators['key'])
+            if entry_dir:
+                self.logger.info(f"{zip_url} not modified, reusing cached archive")
+                shutil.rmtree(temp_dir)
+                return self.archive_cache.archive_path(entry_dir)
+            # The entry was evicted since we stored the validators - fetch it for real
+            download = self._stream_download(zip_url, zip_path)
+        
+        if not self.archive_cache:
+            return zip_path
+        
+        try:
+            # A known SHA was already looked up (and missed) before downloading
+            key = ArchiveCache.make_key(repo_url, ref, sha or download['sha256'])
+            entry_dir = (self.archive_cache.get(key) if sha is None else None) or \
+                self.archive_cache.put(key, zip_path)
+            if entry_dir and not sha and (download['etag'] or download['last_modified']):
+                self.archive_cache.set_validators(zip_url, key, download['etag'], download['last_modified'])
+        except Exception:
+            shutil.rmtree(temp_dir)
+            raise
+        
+        if entry_dir is None:
+            # Too large to cache - hand back the downloaded archive itself
+            self.logger.info(f"{zip_url} exceeds the archive cache size, not caching it")
+            return zip_path
+        shutil.rmtree(temp_dir)
+        return self.archive_cache.archive_path(entry_dir)
+    
+    def _stream_download(self, url: str, dest_path: str, headers: Optional[Dict] = None) -> Dict:
+        """Download url to dest_path in fixed-size chunks, enforcing the archive size cap
+        
+        The body is written to a partial file under the workspace root; when the connection
+        drops mid-transfer the download resumes with a Range request instead of starting over.
+        Returns the byte count, SHA-256, HTTP validators and whether the server answered 304.
+        """
+        partial_path = self.workspaces.partial_path(hashlib.sha256(url.encode('utf-8')).hexdigest())
+        meta_path = partial_path + '.json'
+        
+        # Concurrent downloads of one URL, in this process or another, would otherwise append to the same partial file
+        with _file_lock(partial_path + '.lock'):
+            for attempt in range(self.download_resume_attempts + 1):
+                try:
+                    result = self._download_to_partial(url, partial_path, meta_path, headers)
+                    break
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                    # Keep what arrived; the next attempt (or the next deployment) picks up from there
+                    if attempt == self.download_resume_attempts:
+                        raise
+                    size = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+                    self.logger.warning(f"Download of {url} interrupted at {size} bytes ({e}), resuming")
+                    time.sleep(self.http.backoff(attempt))
+                except Exception:
+                    self._discard_partial(partial_path, meta_path)
+                    raise
+            
+            if result['not_modified']:
+                return result
+            
+            shutil.move(partial_path, dest_path)
+            self._discard_partial(partial_path, meta_path)
+        self.logger.info(f"Downloaded {result['bytes']} bytes from {url}"
+                         + (f" ({result['resumed_from']} resumed)" if result['resumed_from'] else ""))
+        return result
+    
+    def _download_to_partial(self, url: str, partial_path: str, meta_path: str,
+                             headers: Optional[Dict] = None) -> Dict:
+        """One GET of url into partial_path, continuing an earlier partial when it is still valid"""
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        validator = self._partial_validator(meta_path) if offset else None
+        request_headers = dict(headers or {})
+        if validator:
+            # If-Range makes the server send the whole (new) archive if it changed since
+            request_headers['Range'] = f"bytes={offset}-"
+            request_headers['If-Range'] = validator
+        
+        with self.http.get(url, stream=True, headers=request_headers) as response:
+            if response.status_code == 304:
+                return {'bytes': 0, 'sha256': None, 'etag': None, 'last_modified': None,
+                        'not_modified': True, 'resumed_from': 0}
+            if response.status_code == 416 and validator:
+                # Our partial no longer fits the resource - start again from scratch
+                self._discard_partial(partial_path, meta_path)
+                return self._download_to_partial(url, partial_path, meta_path, headers)
+            response.raise_for_status()
+            
+            resumed = validator is not None and response.status_code == 206 and \
+                response.headers.get('Content-Range', '').startswith(f"bytes {offset}-")
+            if not resumed:
+                offset = 0
+            
+            # Refuse early if the server already tells us the archive is too big
+            content_length = response.headers.get('Content-Length')
+            if content_length and offset + int(content_length) > self.max_archive_size:
+                raise Exception(f"Archive too large: {offset + int(content_length)} bytes "
+                                f"(limit {self.max_archive_size})")
+            
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if not resumed:
+                with open(meta_path, 'w') as f:
+                    json.dump({'etag': etag, 'last_modified': last_modified}, f)
+            
+            # The digest covers the whole archive, so a resumed download rehashes what it already has
+            digest = hashlib.sha256()
+            if resumed:
+                with open(partial_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(self.download_chunk_size), b''):
+                        digest.update(chunk)
+            
+            bytes_written = offset
+            with open(partial_path, 'ab' if resumed else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=self.download_chunk_size):
+                    if not chunk:
+                        continue
+                    bytes_written += len(chunk)
+                    if bytes_written > self.max_archive_size:
+                        raise Exception(f"Archive exceeded size limit of "
+                                        f"{self.max_archive_size} bytes while downloading {url}")
+                    f.write(chunk)
+                    digest.update(chunk)
+        
+        return {'bytes': bytes_written, 'sha256': digest.hexdigest(), 'etag': etag,
+                'last_modified': last_modified, 'not_modified': False, 'resumed_from': offset}
+    
+    @staticmethod
+    def _partial_validator(meta_path: str) -> Optional[str]:
+        """Validator for If-Range: a strong ETag, else Last-Modified (None means we cannot resume)"""
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        etag = meta.get('etag')
+        if etag and not etag.startswith('W/'):
+            return etag
+        return meta.get('last_modified')
+    
+    @staticmethod
+    def _discard_partial(partial_path: str, meta_path: str):
+        for path in (partial_path, meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def _get_actual_repo_root(self, repo: RepositoryFS) -> RepositoryFS:
+        """Find the actual repository root within the downloaded directory or archive"""
         # Sometimes GitHub downloads create a subdirectory like 'repo-main' or 'repo-master'
         # We need to find the actual root of the repository
         
         # Check if there's only one subdirectory - likely the repo
-        contents = os.listdir(downloaded_path)
-        subdirs = [item for item in contents if os.path.isdir(os.path.join(downloaded_path, item))]
+        contents = repo.listdir()
+        subdirs = [item for item in contents if repo.isdir(item)]
         
         # If there's exactly one directory, it's probably the repo
         if len(subdirs) == 1 and len(contents) == 1:
-            potential_repo_path = os.path.join(downloaded_path, subdirs[0])
             # Verify it looks like a repo by checking for common files
-            repo_contents = os.listdir(potential_repo_path)
+            repo_contents = repo.listdir(subdirs[0])
             if any(f in repo_contents for f in ['README.md', 'requirements.txt', 'package.json', '.gitignore', 'app', 'src']):
-                return potential_repo_path
+                return repo.subtree(subdirs[0])
         
         # Otherwise, use the downloaded path as-is
-        return downloaded_path
+        return repo
     
-    def analyze_repository(self, repo_path: str) -> Dict:
-        """Analyze repository to determine application type and requirements"""
-        # Get the actual repository path (in case of nested extraction)
-        actual_repo_path = self._get_actual_repo_path(repo_path)
+    def analyze_repository(self, repo: Union[str, LocalFileSystem, ZipFileSystem],
+                           source: Optional[str] = None) -> Dict:
+        """Analyze repository to determine application type and requirements
+        
+        source names the repository across deploys (usually its URL); with the analysis cache
+        enabled, a re-analysis of the same source only re-runs detectors whose inputs changed.
+        """
+        # Directories on disk and archives opened with open_repository are analyzed the same way
+        if isinstance(repo, str):
+            repo = LocalFileSystem(repo)
+        
+        # Get the actual repository root (in case of nested extraction), then index it once;
+        # every detector below queries the index instead of touching the filesystem again
+        budget = AnalysisBudget(self.analysis_max_seconds, self.analysis_max_files, self.analysis_max_bytes)
+        index = RepositoryIndex.build(self._get_actual_repo_root(repo), self.prune_dir, budget)
+        
+        previous_run = None
+        if self.analysis_cache and source:
+            previous_run = self.analysis_cache.get_previous_run(source, self._analysis_settings())
+        
+        # A byte-identical tree analyzed with the same settings reuses the stored result. With a
+        # previous run to diff against, hashing just the detector inputs is cheaper than the whole tree.
+        cache_key = None
+        if self.analysis_cache and previous_run is None and not index.truncated:
+            try:
+                cache_key = AnalysisCache.make_key(index.fingerprint(self.analysis_workers), self._analysis_settings())
+            except AnalysisBudgetExceeded:
+                self.logger.warning("Analysis budget ran out while fingerprinting; skipping the analysis cache")
+            entry = self.analysis_cache.get(cache_key) if cache_key else None
+            if entry:
+                self.logger.info(f"Analysis cache hit for tree {index.fingerprint()[:12]}")
+                if source and 'services' in entry:
+                    self.analysis_cache.set_previous_run(source, self._analysis_settings(), entry['services'])
+                self.last_analysis_stats = budget.stats()
+                return entry['analysis']
+        
+        previous = {(service['path'], service['language']): service
+                    for service in (previous_run or {}).get('services', [])}
+        services = self._discover_services(index)
+        
+        def analyze(service: Tuple[str, str]) -> Dict:
+            return self._analyze_service(index, *service, previous=previous.get(service))
+        
+        if len(services) > 1 and self.analysis_workers > 1:
+            # Services share nothing but the read-only index, so they are analyzed side by side
+            with ThreadPoolExecutor(max_workers=min(self.analysis_workers, len(services))) as executor:
+                runs = list(executor.map(analyze, services))
+        else:
+            runs = [analyze(service) for service in services]
+        
+        # Among equally shallow services, one that names a framework or a start command outranks
+        # a bare manifest (a package.json that only builds theme assets next to wp-config.php)
+        results = sorted((run['result'] for run in runs),
+                         key=lambda result: (result['path'].count('/') + bool(result['path']),
+                                             not (result.get('framework') or result.get('start_commands'))))
+        
+        # The top-level fields describe the primary service, so single-service callers see no change
+        analysis = dict(results[0]) if results else self._empty_analysis()
+        analysis.pop('name', None)
+        analysis.pop('path', None)
+        analysis['services'] = results
+        analysis['pruned_dirs'] = len(index.pruned)
         
-        analysis = {
+        # A partial result carries the budget stats explaining it, and is never remembered, so the
+        # next run starts afresh
+        self.last_analysis_stats = budget.stats()
+        truncated = index.truncated or budget.exceeded is not None
+        if truncated:
+            self.logger.warning(f"Analysis truncated: {self.last_analysis_stats}")
+            return {**analysis, 'truncated': True, 'analysis_stats': self.last_analysis_stats}
+        
+        analysis['truncated'] = False
+        if cache_key:
+            self.analysis_cache.put(cache_key, {'fingerprint': index.fingerprint(), 'analysis': analysis,
+                                                'services': runs})
+        if self.analysis_cache and source:
+            self.analysis_cache.set_previous_run(source, self._analysis_settings(), runs)
+        return analysis
+    
+    def _analysis_settings(self) -> Dict:
+        """Configuration that changes analysis results, folded into the analysis cache key"""
+        return {'prune_dirs': self.prune_dirs, 'frameworks': self.framework_rules.rules,
+                'source_scan': [self.source_scan_bytes, self.source_scan_confidence],
+                'entrypoints': self.entrypoint_max_file_size, 'ports': self.port_scan_max_file_size}
+    
+    @staticmethod
+    def _empty_analysis() -> Dict:
+        return {
             'language': None,
             'framework': None,
             'dependencies': [],
@@ -148,166 +2705,321 @@ class RepositoryAnalyzer:
             'build_commands': [],
             'files_to_modify': []
         }
+    
+    def _discover_services(self, index: RepositoryIndex) -> List[Tuple[str, str]]:
+        """Find (service root, language) pairs: the outermost directory with a manifest for each language
         
-        # Check for Python applications
-        if self._is_python_app(actual_repo_path):
-            analysis.update(self._analyze_python_app(actual_repo_path))
+        Manifests nested inside a service of the same language (module POMs, test requirements)
+        belong to that service; a different language nested inside one is a service of its own.
+        """
+        services = []
+        try:
+            for rel_dir, dirs, files in index.walk():
+                names = set(files)
+                for language, manifests in SERVICE_MANIFESTS.items():
+                    if names.isdisjoint(manifests):
+                        continue
+                    if any(other == language and (not root or rel_dir.startswith(root + '/'))
+                           for root, other in services):
+                        continue
+                    services.append((rel_dir, language))
+        except AnalysisBudgetExceeded as e:
+            # Analyze the services found so far
+            self.logger.warning(f"Stopped looking for services: {e}")
         
-        # Check for Node.js applications
-        elif self._is_nodejs_app(actual_repo_path):
-            analysis.update(self._analyze_nodejs_app(actual_repo_path))
+        if not services:
+            # No manifest anywhere (e.g. loose scripts) - fall back to whole-repository detection
+            for language in SERVICE_MANIFESTS:
+                if getattr(self, f"_is_{language}_app")(index):
+                    return [('', language)]
+            return []
         
-        # Check for Java applications
-        elif self._is_java_app(actual_repo_path):
-            analysis.update(self._analyze_java_app(actual_repo_path))
+        # Shallowest first, then by language preference; the first entry is the primary service (unless
+        # it turns out to be a bare manifest), so a helper manifest nested deeper (docs/requirements.txt)
+        # never outranks the one at the root
+        languages = list(SERVICE_MANIFESTS)
+        return sorted(services, key=lambda service: (service[0].count('/') + bool(service[0]),
+                                                     languages.index(service[1]), service[0]))
+    
+    def _analyze_service(self, index: RepositoryIndex, root: str, language: str,
+                         previous: Optional[Dict] = None) -> Dict:
+        """Run one language analyzer on a service root; commands are made relative to the repository root
         
-        # Check for PHP applications
-        elif self._is_php_app(actual_repo_path):
-            analysis.update(self._analyze_php_app(actual_repo_path))
+        Returns the service analysis with the digests of the detector's declared inputs. When a
+        previous run saw exactly the same inputs, its result is reused without running the detector.
+        """
+        service_index = index.subtree(root)
+        exact, pattern = self._detector_inputs[language]
+        analysis = self._empty_analysis()
+        inputs = None
+        try:
+            paths = [path for path in exact if service_index.isfile(path)]
+            if pattern:
+                paths += [path for path in service_index.files() if path not in exact and pattern.match(path)]
+            inputs = {path: service_index.digest(path) for path in sorted(paths)}
+            
+            if previous is not None and previous.get('inputs') == inputs:
+                with self._detector_stats_lock:
+                    self.detector_stats['reused'] += 1
+                return previous
+            
+            analysis.update(getattr(self, f"_analyze_{language}_app")(service_index))
+            with self._detector_stats_lock:
+                self.detector_stats['run'] += 1
+            
+            # The port the sources actually bind wins over the framework default
+            inferred = self._within_budget('port inference', lambda: self._infer_port(service_index, language))
+            if inferred:
+                self._set_port(analysis, inferred['port'])
+                analysis['port_source'] = inferred['source']
+        except AnalysisBudgetExceeded as e:
+            # The detector's own manifest reads ran out: fall back to the language defaults
+            self.logger.warning(f"Stopped analyzing {root or 'the repository root'}: {e}")
+            if analysis['language'] is None:
+                analysis['language'] = language
+                self.framework_rules.apply(analysis, language, None)
         
-        return analysis
+        if root:
+            for key in ('start_commands', 'build_commands'):
+                analysis[key] = [f"cd {shlex.quote(root)} && {command}" for command in analysis[key]]
+        result = {'name': root.replace('/', '-') if root else 'main', 'path': root, **analysis}
+        return {'path': root, 'language': language, 'inputs': inputs, 'result': result}
+    
+    def _infer_port(self, repo: RepositoryIndex, language: str) -> Optional[Dict]:
+        """Rank the ports named by listen calls, .env files and Dockerfiles; None when nothing names one
+        
+        Every match votes with its rule's weight. The port with the highest total wins, then the one
+        with the strongest single piece of evidence. Test code does not vote.
+        """
+        rules = self._port_rules[language]
+        votes = {}
+        for path in repo.files():
+            applicable = [index for index, ((literal, pattern), _, _) in enumerate(rules)
+                          if path in literal or (pattern and pattern.match(path))]
+            if not applicable or _is_test_path(path) or repo.size(path) > self.port_scan_max_file_size:
+                continue
+            
+            for port, weight in self._scan_ports(repo, path, language, applicable):
+                total, strongest, source = votes.get(port, (0, 0, path))
+                votes[port] = (total + weight, max(strongest, weight), source if strongest >= weight else path)
+        
+        if not votes:
+            return None
+        port, (_, _, source) = max(votes.items(), key=lambda item: (item[1][0], item[1][1], -item[0]))
+        return {'port': port, 'source': source}
+    
+    def _scan_ports(self, repo: RepositoryIndex, path: str, language: str,
+                    applicable: List[int]) -> List[Tuple[int, int]]:
+        """(port, weight) for every port rule match in one file, cached by the file's content hash"""
+        key = (repo.digest(path), language, tuple(applicable))
+        with self._port_cache_lock:
+            cached = self._port_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        with repo.open(path) as f:
+            content = f.read()
+        rules = self._port_rules[language]
+        found = [(int(match.group(1)), rules[index][1])
+                 for index in applicable for match in rules[index][2].finditer(content)
+                 if 0 < int(match.group(1)) < 65536]
+        
+        with self._port_cache_lock:
+            if len(self._port_cache) >= 10000:
+                self._port_cache.clear()
+            self._port_cache[key] = found
+        return found
     
-    def _is_python_app(self, repo_path: str) -> bool:
+    @staticmethod
+    def _set_port(analysis: Dict, port: int):
+        """Point the analysis, and any start command binding the old port, at a new port"""
+        old = analysis.get('port')
+        if old and old != port:
+            analysis['start_commands'] = [re.sub(rf'(--port[= ]|--bind[= ]\S*:|0\.0\.0\.0:){old}\b',
+                                                 rf'\g<1>{port}', command)
+                                          for command in analysis['start_commands']]
+        analysis['port'] = port
+    
+    def _is_python_app(self, repo: RepositoryIndex) -> bool:
         """Check if repository contains a Python application"""
         python_files = ['requirements.txt', 'setup.py', 'pyproject.toml', 'Pipfile']
         
         # Check in root directory
-        if any(os.path.exists(os.path.join(repo_path, f)) for f in python_files):
+        if any(repo.exists(f) for f in python_files):
             return True
             
         # Check in common subdirectories
         subdirs = ['app', 'src', 'server', 'backend']
         for subdir in subdirs:
-            subdir_path = os.path.join(repo_path, subdir)
-            if os.path.exists(subdir_path):
-                if any(os.path.exists(os.path.join(subdir_path, f)) for f in python_files):
+            if repo.isdir(subdir):
+                if any(repo.exists(f"{subdir}/{f}") for f in python_files):
                     return True
                     
-        # Check for .py files recursively
-        for root, dirs, files in os.walk(repo_path):
-            if any(f.endswith('.py') for f in files):
-                return True
-                
-        return False
+        # Check for .py files anywhere in the tree
+        return bool(repo.files_with_extension('.py'))
     
-    def _is_nodejs_app(self, repo_path: str) -> bool:
+    def _is_nodejs_app(self, repo: RepositoryIndex) -> bool:
         """Check if repository contains a Node.js application"""
-        return os.path.exists(os.path.join(repo_path, 'package.json'))
+        return repo.exists('package.json')
     
-    def _is_java_app(self, repo_path: str) -> bool:
+    def _is_java_app(self, repo: RepositoryIndex) -> bool:
         """Check if repository contains a Java application"""
-        java_files = ['pom.xml', 'build.gradle', 'gradle.properties']
-        return any(os.path.exists(os.path.join(repo_path, f)) for f in java_files)
+        return any(repo.exists(f) for f in SERVICE_MANIFESTS['java'])
     
-    def _is_php_app(self, repo_path: str) -> bool:
+    def _is_php_app(self, repo: RepositoryIndex) -> bool:
         """Check if repository contains a PHP application"""
-        php_files = ['composer.json', 'composer.lock']
-        return any(os.path.exists(os.path.join(repo_path, f)) for f in php_files)
+        php_files = ['composer.json', 'composer.lock', 'wp-config.php']
+        return any(repo.exists(f) for f in php_files)
     
-    def _analyze_python_app(self, repo_path: str) -> Dict:
+    def _analyze_python_app(self, repo: RepositoryIndex) -> Dict:
         """Analyze Python application"""
         analysis = {'language': 'python', 'framework': None}
         
-        # Find the actual application directory
-        app_dir = repo_path
-        subdirs_to_check = ['', 'app', 'src', 'server', 'backend']
+        # Find the actual application directory (relative to the repository root)
+        app_dir = ''
         
         # Check for requirements.txt and determine app directory
-        for subdir in subdirs_to_check:
-            current_dir = os.path.join(repo_path, subdir) if subdir else repo_path
-            req_file = os.path.join(current_dir, 'requirements.txt')
+        for subdir in self.framework_rules.search_dirs('python'):
+            req_file = f"{subdir}/requirements.txt" if subdir else 'requirements.txt'
             
-            if os.path.exists(req_file):
-                app_dir = current_dir
-                with open(req_file, 'r') as f:
-                    analysis['dependencies'] = [line.strip().split('==')[0].split('>=')[0].split('<=')[0] 
-                                              for line in f if line.strip() and not line.startswith('#')]
+            if repo.exists(req_file):
+                app_dir = subdir
+                lines = repo.read_text(req_file).splitlines()
+                analysis['dependencies'] = [line.strip().split('==')[0].split('>=')[0].split('<=')[0] 
+                                          for line in lines if line.strip() and not line.startswith('#')]
                 break
         
-        # Determine framework by checking for specific files
-        framework_indicators = {
-            'flask': ['app.py', 'main.py', 'wsgi.py'],
-            'django': ['manage.py', 'settings.py'],
-            'fastapi': ['main.py', 'app.py'],
-            'bottle': ['app.py', 'main.py']
-        }
+        # Check dependencies first for framework hints, then what the sources import, then indicator files
+        rule = self.framework_rules.match_dependencies('python', analysis.get('dependencies', []))
+        if rule is None:
+            match = self._match_sources('python', repo) or self.framework_rules.match_files('python', repo)
+            if match:
+                rule, directory = match
+                # Only run from directories the start commands are known to work in
+                if directory in self.framework_rules.search_dirs('python'):
+                    app_dir = directory
         
-        # Check dependencies first for framework hints
-        deps_lower = [dep.lower() for dep in analysis.get('dependencies', [])]
-        if 'flask' in deps_lower:
-            analysis['framework'] = 'flask'
-        elif 'django' in deps_lower:
-            analysis['framework'] = 'django'
-        elif 'fastapi' in deps_lower:
-            analysis['framework'] = 'fastapi'
-        elif 'bottle' in deps_lower:
-            analysis['framework'] = 'bottle'
-        
-        # If framework not detected from dependencies, check files
-        if not analysis['framework']:
-            for framework, indicators in framework_indicators.items():
-                for subdir in subdirs_to_check:
-                    current_dir = os.path.join(repo_path, subdir) if subdir else repo_path
-                    if any(os.path.exists(os.path.join(current_dir, indicator)) for indicator in indicators):
-                        analysis['framework'] = framework
-                        app_dir = current_dir
-                        break
-                if analysis['framework']:
-                    break
+        # Start command and port follow the framework, run from the application directory
+        self.framework_rules.apply(analysis, 'python', rule, app_dir)
         
-        # Determine start command based on framework and directory structure
-        relative_path = os.path.relpath(app_dir, repo_path) if app_dir != repo_path else ""
+        # Serve the application object itself with a production server when we can find it
+        entrypoint = self._within_budget('entrypoint discovery',
+                                         lambda: self._discover_entrypoint(repo, rule, app_dir)) if rule else None
+        if entrypoint:
+            analysis['entrypoint'] = entrypoint['target']
+            analysis['server'] = entrypoint['server']
+            command = entrypoint['command'].format(port=analysis['port'])
+            if entrypoint['app_dir']:
+                command = f"cd {shlex.quote(entrypoint['app_dir'])} && {command}"
+            analysis['start_commands'] = [command] + [c for c in analysis['start_commands'] if c != command]
+        return analysis
+    
+    def _discover_entrypoint(self, repo: RepositoryIndex, rule: Dict, app_dir: str) -> Optional[Dict]:
+        """Locate the framework's application object ('module:attr') by parsing candidate sources
         
-        if analysis['framework'] == 'flask':
-            if relative_path and relative_path != ".":
-                analysis['start_commands'] = [f'cd {relative_path} && python app.py', f'cd {relative_path} && flask run']
-            else:
-                analysis['start_commands'] = ['python app.py', 'flask run']
-            analysis['port'] = 5000
-        elif analysis['framework'] == 'django':
-            if relative_path and relative_path != ".":
-                analysis['start_commands'] = [f'cd {relative_path} && python manage.py runserver 0.0.0.0:8000']
-            else:
-                analysis['start_commands'] = ['python manage.py runserver 0.0.0.0:8000']
-            analysis['port'] = 8000
-        elif analysis['framework'] == 'fastapi':
-            if relative_path and relative_path != ".":
-                analysis['start_commands'] = [f'cd {relative_path} && uvicorn main:app --host 0.0.0.0 --port 8000']
-            else:
-                analysis['start_commands'] = ['uvicorn main:app --host 0.0.0.0 --port 8000']
-            analysis['port'] = 8000
+        Only files mentioning one of the rule's constructors are parsed, across a process pool when
+        there are many; parse results are cached by content hash.
+        """
+        constructors = tuple(rule.get('app_constructors', []))
+        if not constructors or rule.get('server') not in ('wsgi', 'asgi'):
+            return None
+        
+        needles = [name.encode('utf-8') for name in constructors]
+        candidates = {}
+        for path in repo.files_with_extension('.py'):
+            if repo.size(path) > self.entrypoint_max_file_size:
+                continue
+            with repo.open(path) as f:
+                source = f.read()
+            if any(needle in source for needle in needles):
+                candidates[path] = (hashlib.sha256(source).hexdigest(), source)
+        
+        found = self._parse_entrypoint_candidates(candidates, constructors)
+        
+        # Prefer objects inside the application directory, then shallow files, then non-test code
+        def rank(item):
+            path, _ = item
+            inside = not app_dir or path.startswith(app_dir + '/')
+            return (_is_test_path(path), not inside, path.count('/'), path)
+        
+        objects = [(path, attr) for path, attrs in found.items() for attr, _ in attrs]
+        if not objects:
+            return None
+        path, attr = min(objects, key=rank)
+        
+        # Run from the application directory when the module lives below it, else from the root
+        run_dir = app_dir if not app_dir or path.startswith(app_dir + '/') else ''
+        module = (path[len(run_dir) + 1:] if run_dir else path)[:-len('.py')].replace('/', '.')
+        if module.endswith('.__init__'):
+            module = module[:-len('.__init__')]
+        target = f"{module}:{attr}"
+        
+        if rule['server'] == 'wsgi':
+            command = f"gunicorn --bind 0.0.0.0:{{port}} '{target}'" if attr.endswith('()') \
+                else f"gunicorn --bind 0.0.0.0:{{port}} {target}"
         else:
-            # Default Python app
-            if relative_path and relative_path != ".":
-                analysis['start_commands'] = [f'cd {relative_path} && python app.py']
-            else:
-                analysis['start_commands'] = ['python app.py']
-            analysis['port'] = 5000
+            command = f"uvicorn {target[:-2]} --factory --host 0.0.0.0 --port {{port}}" if attr.endswith('()') \
+                else f"uvicorn {target} --host 0.0.0.0 --port {{port}}"
+        return {'target': target, 'app_dir': run_dir, 'command': command,
+                'server': 'gunicorn' if rule['server'] == 'wsgi' else 'uvicorn'}
+    
+    def _parse_entrypoint_candidates(self, candidates: Dict[str, Tuple[str, bytes]],
+                                     constructors: Tuple[str, ...]) -> Dict[str, List[Tuple[str, str]]]:
+        """Parse {path: (sha256, source)} into {path: app objects}, reusing results for known content"""
+        results = {}
+        pending = []
+        with self._entrypoint_cache_lock:
+            for path, (digest, source) in candidates.items():
+                cached = self._entrypoint_cache.get((digest, constructors))
+                if cached is None:
+                    pending.append((path, digest, source))
+                else:
+                    results[path] = cached
         
-        return analysis
+        jobs = [(source, constructors) for _, _, source in pending]
+        if self.analysis_workers > 1 and len(jobs) >= self.entrypoint_process_threshold:
+            # Parsing is CPU-bound, so it goes to processes; forkserver keeps this safe from threads
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else None)
+            with ProcessPoolExecutor(max_workers=min(self.analysis_workers, len(jobs)), mp_context=context) as executor:
+                parsed = list(executor.map(_parse_app_objects, jobs, chunksize=8))
+        else:
+            parsed = [_parse_app_objects(job) for job in jobs]
+        
+        with self._entrypoint_cache_lock:
+            if len(self._entrypoint_cache) + len(pending) > 10000:
+                self._entrypoint_cache.clear()
+            for (path, digest, _), objects in zip(pending, parsed):
+                self._entrypoint_cache[(digest, constructors)] = objects
+                results[path] = objects
+        return {path: objects for path, objects in results.items() if objects}
+    
+    def _match_sources(self, language: str, repo: RepositoryIndex) -> Optional[Tuple[Dict, str]]:
+        return self._within_budget('source scan', lambda: self.framework_rules.match_sources(
+            language, repo, self.analysis_workers, self.source_scan_bytes, self.source_scan_confidence))
+    
+    def _within_budget(self, step: str, run: Callable[[], object], default=None):
+        """Run an optional analysis step, returning default when the budget runs out during it
+        
+        What the detector worked out before the step is kept; only the step's own result is lost.
+        """
+        try:
+            return run()
+        except AnalysisBudgetExceeded as e:
+            self.logger.warning(f"Skipping {step}: {e}")
+            return default
     
-    def _analyze_nodejs_app(self, repo_path: str) -> Dict:
+    def _analyze_nodejs_app(self, repo: RepositoryIndex) -> Dict:
         """Analyze Node.js application"""
         analysis = {'language': 'nodejs', 'framework': None}
         
-        package_json = os.path.join(repo_path, 'package.json')
-        if os.path.exists(package_json):
-            with open(package_json, 'r') as f:
+        if repo.exists('package.json'):
+            with repo.open('package.json') as f:
                 package_data = json.load(f)
                 
                 # Get dependencies
                 analysis['dependencies'] = list(package_data.get('dependencies', {}).keys())
                 
-                # Determine framework
-                if 'express' in analysis['dependencies']:
-                    analysis['framework'] = 'express'
-                elif 'next' in analysis['dependencies']:
-                    analysis['framework'] = 'nextjs'
-                elif 'react' in analysis['dependencies']:
-                    analysis['framework'] = 'react'
-                elif 'vue' in analysis['dependencies']:
-                    analysis['framework'] = 'vue'
-                
                 # Get start commands
                 scripts = package_data.get('scripts', {})
                 if 'start' in scripts:
@@ -315,47 +3027,260 @@ class RepositoryAnalyzer:
                 elif 'dev' in scripts:
                     analysis['start_commands'] = [f"npm run dev"]
                 
-                analysis['port'] = 3000
+                # Determine framework, from the sources when package.json does not tell
+                rule = self.framework_rules.match_dependencies('nodejs', analysis['dependencies'])
+                if rule is None:
+                    match = self._match_sources('nodejs', repo)
+                    rule = match[0] if match else None
+                self.framework_rules.apply(analysis, 'nodejs', rule)
+            
+            # The exact production dependency closure, when a lockfile pins it
+            lockfile = next((name for name in ('npm-shrinkwrap.json', 'package-lock.json', 'yarn.lock')
+                             if repo.isfile(name)), None)
+            if lockfile:
+                roots = {**package_data.get('dependencies', {}), **package_data.get('optionalDependencies', {})}
+                try:
+                    with repo.open(lockfile) as f:
+                        text = io.TextIOWrapper(f, encoding='utf-8')
+                        closure = _yarn_lock_closure(text, roots) if lockfile == 'yarn.lock' \
+                            else _package_lock_closure(text)
+                except AnalysisBudgetExceeded as e:
+                    self.logger.warning(f"Skipping the {lockfile} dependency closure: {e}")
+                except Exception as e:
+                    # Conflict markers, truncation or a foreign encoding: the closure is optional
+                    self.logger.warning(f"Could not read {lockfile}, skipping dependency closure: {e}")
+                else:
+                    analysis['dependency_closure'] = closure
+                    analysis['lockfile'] = lockfile
         
         return analysis
     
-    def _analyze_java_app(self, repo_path: str) -> Dict:
-        """Analyze Java application"""
+    def _analyze_java_app(self, repo: RepositoryIndex) -> Dict:
+        """Analyze Java application
+        
+        Maven and Gradle builds are read module by module to find the module that ships (Spring Boot
+        or application plugin first), its Spring Boot version and a build command for just that module.
+        """
         analysis = {'language': 'java', 'framework': None}
         
-        # Check for Maven
-        if os.path.exists(os.path.join(repo_path, 'pom.xml')):
-            analysis['framework'] = 'maven'
-            analysis['build_commands'] = ['mvn clean install']
-            analysis['start_commands'] = ['java -jar target/*.jar']
-            analysis['port'] = 8080
+        if repo.isfile('pom.xml'):
+            analysis.update(self._maven_build(repo))
+        elif any(repo.isfile(name) for name in ('build.gradle', 'build.gradle.kts', 'settings.gradle',
+                                                  'settings.gradle.kts')):
+            analysis.update(self._gradle_build(repo))
         
-        # Check for Gradle
-        elif os.path.exists(os.path.join(repo_path, 'build.gradle')):
-            analysis['framework'] = 'gradle'
-            analysis['build_commands'] = ['./gradlew build']
-            analysis['start_commands'] = ['java -jar build/libs/*.jar']
-            analysis['port'] = 8080
+        # Spring by its starters (the Boot plugin implies them), else Maven or Gradle by build file
+        dependencies = analysis.get('dependencies', [])
+        if analysis.get('spring_boot'):
+            dependencies = dependencies + ['org.springframework.boot:spring-boot-starter']
+        rule = self.framework_rules.match_dependencies('java', dependencies)
+        if rule is None:
+            match = self.framework_rules.match_files('java', repo)
+            rule = match[0] if match else None
+        analysis.pop('spring_boot', None)
+        self.framework_rules.apply(analysis, 'java', rule)
         
         return analysis
     
-    def _analyze_php_app(self, repo_path: str) -> Dict:
+    def _maven_build(self, repo: RepositoryIndex) -> Dict:
+        """Module layout, runnable module and exact build target of a (multi-module) Maven project"""
+        # Walk <modules> breadth first, parsing each level's POMs in parallel
+        poms = {}
+        level = ['pom.xml']
+        while level:
+            parsed = self._parallel_map(lambda pom_path: self._read_module_pom(repo, pom_path), level)
+            next_level = []
+            for pom_path, pom in zip(level, parsed):
+                if pom is None:
+                    continue
+                poms[pom_path] = pom
+                directory = posixpath.dirname(pom_path)
+                for module in pom['modules']:
+                    child = posixpath.normpath(posixpath.join(directory, module))
+                    child = child if child.endswith('.xml') else posixpath.join(child, 'pom.xml')
+                    if not child.startswith('../') and child not in poms and child not in next_level:
+                        next_level.append(child)
+            level = next_level
+        if not poms:
+            return {'build_tool': 'maven', 'build_wrapper': repo.isfile('mvnw')}
+        
+        # Effective model: groupId, version and properties are inherited from in-repository parents
+        effective = {}
+        
+        def resolve(pom_path: str) -> Dict:
+            if pom_path in effective:
+                return effective[pom_path]
+            pom = poms[pom_path]
+            parent_path = posixpath.normpath(posixpath.join(posixpath.dirname(pom_path),
+                                                            pom['parent'].get('relativePath', '../pom.xml')))
+            if not parent_path.endswith('.xml'):
+                parent_path = posixpath.join(parent_path, 'pom.xml')
+            effective[pom_path] = {}  # guards against parent cycles
+            inherited = resolve(parent_path) if pom['parent'] and parent_path in poms else {}
+            model = {
+                'groupId': pom.get('groupId') or pom['parent'].get('groupId'),
+                'artifactId': pom.get('artifactId'),
+                'version': pom.get('version') or pom['parent'].get('version'),
+                'parents': [pom['parent']] + inherited.get('parents', []),
+                'managed': {**inherited.get('managed', {}), **pom['managed']},
+                'properties': {**inherited.get('properties', {}), **pom['properties']},
+            }
+            model['properties'].update({'project.groupId': model['groupId'] or '',
+                                        'project.artifactId': model['artifactId'] or '',
+                                        'project.version': model['version'] or '',
+                                        'project.parent.version': pom['parent'].get('version', '')})
+            effective[pom_path] = model
+            return model
+        
+        # The runnable module: Spring Boot plugin, then a configured main class, then Boot starters
+        def rank(pom_path: str) -> Tuple:
+            pom = poms[pom_path]
+            return (pom['packaging'] in ('jar', 'war'),
+                    'org.springframework.boot:spring-boot-maven-plugin' in pom['plugins'],
+                    'mainClass' in pom,
+                    any(key.startswith('org.springframework.boot:spring-boot-starter') for key in pom['dependencies']),
+                    -pom_path.count('/'))
+        
+        pom_path = max(poms, key=rank)
+        pom, model = poms[pom_path], resolve(pom_path)
+        module = posixpath.dirname(pom_path)
+        properties = model['properties']
+        
+        # Spring Boot version: starter parent, imported BOM, then plugin or starter versions
+        boot_version = next((parent.get('version') for parent in model['parents']
+                             if parent.get('groupId') == 'org.springframework.boot'), None)
+        boot_version = boot_version or model['managed'].get('org.springframework.boot:spring-boot-dependencies') \
+            or pom['plugins'].get('org.springframework.boot:spring-boot-maven-plugin') \
+            or model['managed'].get('org.springframework.boot:spring-boot-maven-plugin')
+        
+        # target/<finalName>.<packaging>, globbed when the name is not known statically
+        name = pom.get('finalName') or (f"{model['artifactId']}-{model['version']}"
+                                        if model['artifactId'] and model['version'] else None)
+        name = _resolve_properties(name, properties)
+        prefix = f"{module}/" if module else ''
+        artifact = f"{prefix}target/{name if name and '${' not in name else '*'}.{pom['packaging']}"
+        
+        tool = './mvnw' if repo.isfile('mvnw') else 'mvn'
+        target = f" -pl {shlex.quote(module)} -am" if module else ''
+        return {
+            'build_tool': 'maven',
+            'build_wrapper': tool == './mvnw',
+            'modules': sorted(posixpath.dirname(path) for path in poms),
+            'module': module,
+            'spring_boot': 'org.springframework.boot:spring-boot-maven-plugin' in pom['plugins'],
+            'spring_boot_version': _resolve_properties(boot_version, properties),
+            'dependencies': list(pom['dependencies']),
+            'artifact': artifact,
+            'build_commands': [f"{tool} -B -DskipTests{target} package"],
+            'start_commands': [f"java -jar {_shell_glob(artifact)}"],
+        }
+    
+    def _read_module_pom(self, repo: RepositoryIndex, pom_path: str) -> Optional[Dict]:
+        """Parse one POM of the build; missing or malformed ones are skipped"""
+        if not repo.isfile(pom_path):
+            return None
+        try:
+            with repo.open(pom_path) as f:
+                return _read_pom(f)
+        except ET.ParseError as e:
+            self.logger.warning(f"Skipping unreadable {pom_path}: {e}")
+            return None
+    
+    def _read_gradle_file(self, repo: RepositoryIndex, path: str) -> Optional[str]:
+        """Text of one Gradle build file; missing or undecodable ones are skipped"""
+        if not repo.isfile(path):
+            return None
+        try:
+            return repo.read_text(path)
+        except UnicodeDecodeError as e:
+            self.logger.warning(f"Skipping unreadable {path}: {e}")
+            return None
+    
+    def _gradle_build(self, repo: RepositoryIndex) -> Dict:
+        """Project layout, runnable project and exact build task of a (multi-project) Gradle build"""
+        settings = next((name for name in ('settings.gradle', 'settings.gradle.kts') if repo.isfile(name)), None)
+        settings_text = self._read_gradle_file(repo, settings) if settings else None
+        root_name, projects = _read_gradle_settings(settings_text) if settings_text is not None else (None, [])
+        directories = [''] + [project for project in dict.fromkeys(projects) if repo.isdir(project)]
+        tool = './gradlew' if repo.isfile('gradlew') else 'gradle'
+        
+        def read(directory: str) -> Optional[Dict]:
+            for name in ('build.gradle', 'build.gradle.kts'):
+                text = self._read_gradle_file(repo, f"{directory}/{name}" if directory else name)
+                if text is not None:
+                    return _read_gradle_build(text)
+            return None
+        
+        builds = {directory: build for directory, build in zip(directories, self._parallel_map(read, directories))
+                  if build is not None}
+        if not builds:
+            return {'build_tool': 'gradle', 'build_wrapper': tool == './gradlew',
+                    'build_commands': [f"{tool} build -x test"]}
+        
+        def rank(directory: str) -> Tuple:
+            build = builds[directory]
+            return (build['spring_boot'], build['application'],
+                    any(dep.startswith('org.springframework.boot:spring-boot-starter') for dep in build['dependencies']),
+                    -directory.count('/') - bool(directory))
+        
+        module = max(builds, key=rank)
+        build = builds[module]
+        
+        # The Boot version is often declared once at the root ('apply false') or in gradle.properties
+        boot_version = build['spring_boot_version'] or builds.get('', {}).get('spring_boot_version')
+        properties = self._read_gradle_file(repo, 'gradle.properties') if not boot_version else None
+        if properties:
+            declared = re.search(r'^\s*springBootVersion\s*=\s*(\S+)', properties, re.M)
+            boot_version = declared.group(1) if declared else None
+        
+        task = f":{module.replace('/', ':')}:" if module else ''
+        prefix = f"{module}/" if module else ''
+        name = posixpath.basename(module) if module else root_name
+        if build['spring_boot']:
+            artifact = f"{prefix}build/libs/*.jar"
+            build_command, start_command = f"{tool} {shlex.quote(task + 'bootJar')}", \
+                f"java -jar {_shell_glob(artifact)}"
+        elif build['application'] and name:
+            artifact = f"{prefix}build/install/{name}/bin/{name}"
+            build_command, start_command = f"{tool} {shlex.quote(task + 'installDist')}", shlex.quote(artifact)
+        else:
+            artifact = f"{prefix}build/libs/*.jar"
+            build_command, start_command = f"{tool} {shlex.quote(task + 'build')} -x test", \
+                f"java -jar {_shell_glob(artifact)}"
+        return {
+            'build_tool': 'gradle',
+            'build_wrapper': tool == './gradlew',
+            'modules': sorted(builds),
+            'module': module,
+            'spring_boot': build['spring_boot'],
+            'spring_boot_version': boot_version,
+            'dependencies': build['dependencies'],
+            'artifact': artifact,
+            'build_commands': [build_command],
+            'start_commands': [start_command],
+        }
+    
+    def _parallel_map(self, fn: Callable, items: List) -> List:
+        """fn over items, on the analysis thread pool when there is more than one"""
+        if self.analysis_workers > 1 and len(items) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.analysis_workers, len(items))) as executor:
+                return list(executor.map(fn, items))
+        return [fn(item) for item in items]
+    
+    def _analyze_php_app(self, repo: RepositoryIndex) -> Dict:
         """Analyze PHP application"""
         analysis = {'language': 'php', 'framework': None}
         
-        composer_json = os.path.join(repo_path, 'composer.json')
-        if os.path.exists(composer_json):
-            with open(composer_json, 'r') as f:
+        # Determine framework; WordPress and other composer-less sites only have indicator files
+        rule = None
+        if repo.exists('composer.json'):
+            with repo.open('composer.json') as f:
                 composer_data = json.load(f)
-                
-                # Determine framework
-                if 'laravel/laravel' in composer_data.get('require', {}):
-                    analysis['framework'] = 'laravel'
-                elif 'symfony/symfony' in composer_data.get('require', {}):
-                    analysis['framework'] = 'symfony'
-                
-                analysis['start_commands'] = ['php -S 0.0.0.0:8000']
-                analysis['port'] = 8000
+                rule = self.framework_rules.match_dependencies('php', list(composer_data.get('require', {})))
+        if rule is None:
+            match = self.framework_rules.match_files('php', repo)
+            rule = match[0] if match else None
+        self.framework_rules.apply(analysis, 'php', rule)
         
         return analysis
 
@@ -466,13 +3391,7 @@ resource "aws_security_group" "app_sg" {{
   name        = "app-security-group"
   description = "Security group for application"
 
-  ingress {{
-    from_port   = {analysis.get('port', 80)}
-    to_port     = {analysis.get('port', 80)}
-    protocol    = "tcp"
-    cidr_blocks = ["0.0.0.0/0"]
-  }}
-
+{self._generate_app_ingress(analysis)}
   ingress {{
     from_port   = 22
     to_port     = 22
@@ -580,7 +3499,7 @@ resource "google_compute_firewall" "app_firewall" {{
 
   allow {{
     protocol = "tcp"
-    ports    = ["{analysis.get('port', 80)}", "22"]
+    ports    = [{', '.join(f'"{port}"' for port in self._service_ports(analysis))}, "22"]
   }}
 
   source_ranges = ["0.0.0.0/0"]
@@ -663,10 +3582,71 @@ output "instance_id" {
 }
 """
     
+    @staticmethod
+    def _major_version(version: Optional[str]) -> int:
+        """Leading number of a version string such as '3.2.1' (0 when unknown or unresolved)"""
+        match = re.match(r'\s*(\d+)', version or '')
+        return int(match.group(1)) if match else 0
+    
+    @staticmethod
+    def _services(analysis: Dict) -> List[Dict]:
+        """Every service to deploy; analyses without a services list describe a single service"""
+        return analysis.get('services') or [analysis]
+    
+    def _service_ports(self, analysis: Dict) -> List[int]:
+        """Distinct ports the services listen on, in service order"""
+        ports = []
+        for service in self._services(analysis):
+            port = service.get('port') or 80
+            if port not in ports:
+                ports.append(port)
+        return ports
+    
+    def _generate_app_ingress(self, analysis: Dict) -> str:
+        """One security group ingress rule per service port"""
+        return ''.join(f"""
+  ingress {{
+    from_port   = {port}
+    to_port     = {port}
+    protocol    = "tcp"
+    cidr_blocks = ["0.0.0.0/0"]
+  }}
+""" for port in self._service_ports(analysis))
+    
     def _generate_user_data(self, analysis: Dict) -> str:
         """Generate user data script for application setup"""
-        language = analysis.get('language')
+        services = self._services(analysis)
+        scripts = []
+        for language in dict.fromkeys(service.get('language') for service in services):
+            scripts.append(self._generate_language_setup(
+                language, [service for service in services if service.get('language') == language]))
+        
+        # Production servers picked by entrypoint discovery
+        servers = sorted({service['server'] for service in services if service.get('entrypoint')})
+        if servers:
+            scripts.append(f"\npip3 install {' '.join(servers)}\n")
         
+        # Services outside the repository root install their own dependencies
+        for service in services:
+            path = service.get('path')
+            if path and service.get('language') == 'python':
+                requirements = shlex.quote(f"{path}/requirements.txt")
+                scripts.append(f"""
+if [ -f {requirements} ]; then
+    pip3 install -r {requirements}
+fi
+""")
+            elif path and service.get('language') == 'nodejs':
+                package_json = shlex.quote(f"{path}/package.json")
+                scripts.append(f"""
+if [ -f {package_json} ]; then
+    (cd {shlex.quote(path)} && npm install)
+fi
+""")
+        return ''.join(scripts)
+    
+    def _generate_language_setup(self, language: Optional[str], services: List[Dict] = ()) -> str:
+        """Runtime installation for one language, sized to the services written in it"""
         if language == 'python':
             return """
 # Install Python
@@ -693,24 +3673,47 @@ if [ -f package.json ]; then
 fi
 """
         elif language == 'java':
-            return """
+            # Spring Boot 3 needs Java 17; build tools are only installed where no wrapper ships
+            jdk = 17 if any(self._major_version(service.get('spring_boot_version')) >= 3
+                            for service in services) else 11
+            script = f"""
 # Install Java
-yum install -y java-11-openjdk
-
+yum install -y {JDK_PACKAGE.format(version=jdk)}
+"""
+            if any(service.get('build_tool', 'maven') == 'maven' and not service.get('build_wrapper')
+                   for service in services) or not services:
+                script += f"""
 # Install Maven
-yum install -y maven
+curl -fsSL {MAVEN_DISTRIBUTION_URL} -o /tmp/maven.tar.gz
+mkdir -p /opt/maven
+tar -xzf /tmp/maven.tar.gz -C /opt/maven
+ln -sf /opt/maven/apache-maven-*/bin/mvn /usr/local/bin/mvn
 """
+            if any(service.get('build_tool') == 'gradle' and not service.get('build_wrapper')
+                   for service in services):
+                script += f"""
+# Install Gradle
+curl -fsSL {GRADLE_DISTRIBUTION_URL} -o /tmp/gradle.zip
+unzip -q -o /tmp/gradle.zip -d /opt/gradle
+ln -sf /opt/gradle/gradle-*/bin/gradle /usr/local/bin/gradle
+"""
+            return script
         else:
             return "# Default setup"
     
     def _generate_start_script(self, analysis: Dict) -> str:
         """Generate start script for the application"""
-        start_commands = analysis.get('start_commands', [])
-        if start_commands:
+        # The first start command is the one to run; the rest are fallbacks for humans. Services
+        # with a build step (Java) are built first
+        lines = [f"({service['build_commands'][0]}) && {service['start_commands'][0]} &"
+                 if service.get('build_commands') else f"{service['start_commands'][0]} &"
+                 for service in self._services(analysis) if service.get('start_commands')]
+        if lines:
+            commands = '\n'.join(lines)
             return f"""
 # Start application
 cd /home/ec2-user
-{' '.join(start_commands)} &
+{commands}
 """
         return "# No start commands defined"
     
@@ -756,7 +3759,8 @@ cd /home/ec2-user
 class CodeModifier:
     """Modifies application code for cloud deployment"""
     
-    def __init__(self):
+    def __init__(self, prune_dirs: Optional[List[str]] = None):
+        self.prune_dir = _dir_pruner(DEFAULT_PRUNE_DIRS if prune_dirs is None else prune_dirs)
         self.localhost_patterns = [
             r'localhost:\d+',
             r'127\.0\.0\.1:\d+',
@@ -770,6 +3774,8 @@ class CodeModifier:
         
         # Find and modify files with localhost references
         for root, dirs, files in os.walk(repo_path):
+            # Never rewrite vendored dependencies or build output
+            dirs[:] = [d for d in dirs if not self.prune_dir(d)]
             for file in files:
                 if file.endswith(('.py', '.js', '.json', '.env', '.yml', '.yaml')):
                     file_path = os.path.join(root, file)
@@ -809,13 +3815,14 @@ class CodeModifier:
 class ArvoAI:
     """Main ArvoAI autodeployment system"""
     
-    def __init__(self):
+    def __init__(self, config: Optional[Dict] = None):
         self.name = "ArvoAI"
         self.version = "1.0.0"
-        self.analyzer = RepositoryAnalyzer()
+        self.config = load_config() if config is None else config
+        self.analyzer = RepositoryAnalyzer(self.config.get('repository'))
         self.decision_engine = InfrastructureDecisionEngine()
         self.terraform_manager = TerraformManager()
-        self.code_modifier = CodeModifier()
+        self.code_modifier = CodeModifier(self.analyzer.prune_dirs)
         self.conversation_history = []
         
         # Setup logging
@@ -823,7 +3830,7 @@ class ArvoAI:
             level=logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s',
             handlers=[
-                logging.FileHandler('arvo_deployment.log'),
+                logging.FileHandler(self.config.get('logging', {}).get('file', 'arvo_deployment.log')),
                 logging.StreamHandler()
             ]
         )
@@ -887,14 +3894,20 @@ class ArvoAI:
         return requirements
     
     def deploy_application(self, repo_url: str, requirements: Dict) -> Dict:
-        """Main deployment orchestration method"""
+        """Main deployment orchestration method
+        
+        On success the modified working copy is kept at result['repo_path'];
+        free it with self.analyzer.release_repository(result['repo_path']).
+        """
+        workspace = self.analyzer.workspaces.acquire()
         try:
             self.logger.info("Starting deployment process...")
             
-            # Step 1: Download and analyze repository
+            # Step 1: Download and analyze repository (straight from the archive)
             self.logger.info("Downloading and analyzing repository...")
-            repo_path = self.analyzer.download_repository(repo_url)
-            analysis = self.analyzer.analyze_repository(repo_path)
+            archive_path = self.analyzer.fetch_repository(repo_url, workspace)
+            with self.analyzer.open_repository(archive_path) as repo:
+                analysis = self.analyzer.analyze_repository(repo, source=repo_url)
             
             self.logger.info(f"Analysis complete: {analysis}")
             
@@ -929,14 +3942,19 @@ class ArvoAI:
             else:
                 self.logger.info(f"Infrastructure deployed successfully. Public IP: {public_ip}")
             
-            # Step 5: Modify code for deployment
+            # Step 5: Modify code for deployment (first stage that needs files on disk)
             self.logger.info("Modifying code for cloud deployment...")
+            repo_path = self.analyzer.extract_repository(archive_path, workspace)
             modified_files = self.code_modifier.modify_code_for_deployment(
                 repo_path, public_ip, analysis
             )
             
             self.logger.info(f"Modified {len(modified_files)} files for deployment")
             
+            # The modified working copy outlives this call; the analyzer holds its workspace
+            self.analyzer.keep_workspace(repo_path, workspace)
+            workspace = None
+            
             # Step 6: Return deployment information
             return {
                 'success': True,
@@ -944,6 +3962,7 @@ class ArvoAI:
                 'instance_id': deployment_result['instance_id'],
                 'analysis': analysis,
                 'strategy': strategy,
+                'repo_path': repo_path,
                 'modified_files': modified_files,
                 'application_url': f"http://{public_ip}:{analysis.get('port', 80)}"
             }
@@ -954,6 +3973,10 @@ class ArvoAI:
                 'success': False,
                 'error': str(e)
             }
+        finally:
+            # Downloaded archives (and, on failure, working copies) are not needed once we're done
+            if workspace:
+                workspace.release()
     
     def print_welcome(self):
         """Display welcome message"""
@@ -983,14 +4006,16 @@ class ArvoAI:
         """Process deployment request from user input"""
         # Extract repository URL from input
         repo_url = None
-        words = user_input.split()
-        for i, word in enumerate(words):
-            if 'github.com' in word or word.endswith('.zip'):
-                repo_url = word
-                break
+        references = [word for word in user_input.split() if RepositoryAnalyzer.is_repository_reference(word)]
+        # Remote repositories win over local paths mentioned in the same request
+        remote = [word for word in references if not RepositoryAnalyzer.is_local_path_reference(word)]
+        if remote:
+            repo_url = remote[0]
+        elif references:
+            repo_url = os.path.expanduser(references[0])
         
         if not repo_url:
-            return "Please provide a GitHub repository URL or zip file path. For example:\n" \
+            return "Please provide a GitHub repository URL, git remote, archive or directory path. For example:\n" \
                    "'Deploy this flask app on AWS: https://github.com/user/repo'"
         
         # Parse natural language requirements
@@ -1005,7 +4030,7 @@ class ArvoAI:
                    f"📊 Analysis: {deployment_result['analysis']['framework']} application\n" \
                    f"🌐 Public IP: {deployment_result['public_ip']}\n" \
                    f"🔗 Application URL: {deployment_result['application_url']}\n" \
-                   f"📝 Modified {len(deployment_result['modified_files'])} files\n" \
+                   f"📝 Modified {len(deployment_result['modified_files'])} files in {deployment_result['repo_path']}\n" \
                    f"📋 Instance ID: {deployment_result['instance_id']}\n\n" \
                    f"Your application is now live! 🚀"
         else:
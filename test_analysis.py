@@ -0,0 +1,862 @@
+#!/usr/bin/env python3
+"""
+Tests for repository analysis
+Builds small repositories on disk and checks what the analyzer reports
+"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+import zipfile
+
+import pytest
+
+from arvo import (ANALYZER_VERSION, AnalysisBudget, AnalysisBudgetExceeded, AnalysisCache, CodeModifier,
+                  LocalFileSystem, RepositoryAnalyzer, RepositoryIndex, TerraformManager, ZipFileSystem,
+                  _json_events, _package_lock_closure, _yarn_lock_closure)
+
+
+def write_tree(root, files):
+    """Create {relative path: content} under root"""
+    for name, content in files.items():
+        path = os.path.join(root, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+
+def make_analyzer(temp_dir, **config):
+    """Analyzer with caches, workspaces and git mirrors kept inside temp_dir"""
+    config.setdefault('archive_cache', {'enabled': False})
+    config.setdefault('workspace', {'root': os.path.join(temp_dir, 'workspaces')})
+    config.setdefault('git', {'mirror_dir': os.path.join(temp_dir, 'git-mirrors')})
+    analysis = config['analysis'] = dict(config.get('analysis', {}))
+    analysis.setdefault('cache', {'enabled': False, 'dir': os.path.join(temp_dir, 'analysis-cache')})
+    return RepositoryAnalyzer(config)
+
+
+def test_repository_index():
+    """One traversal answers existence, listing, size and extension queries from memory"""
+    temp_dir = tempfile.mkdtemp()
+    files = {
+        'README.md': '# Hello\n',
+        'app/app.py': 'print(1)\n',
+        'app/templates/index.html': '<html></html>\n',
+        'lib/util.PY': 'x = 1\n',
+        'docs/api/v1/index.md': '',
+    }
+
+    try:
+        repo_dir = os.path.join(temp_dir, 'repo')
+        write_tree(repo_dir, files)
+        zip_path = os.path.join(temp_dir, 'repo.zip')
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            for name, content in files.items():
+                zf.writestr(name, content)
+
+        with ZipFileSystem(zip_path) as zip_fs:
+            for fs in (LocalFileSystem(repo_dir), zip_fs):
+                index = RepositoryIndex.build(fs)
+                assert len(index) == 5
+                assert index.isdir('app/templates') and not index.isdir('app/app.py')
+                assert index.exists('app/app.py') and not index.exists('app/main.py')
+                assert index.listdir() == ['README.md', 'app', 'docs', 'lib']
+                assert index.listdir('docs/api') == ['v1']
+                assert index.listdir('app') == ['app.py', 'templates']
+                assert index.size('app/app.py') == len(files['app/app.py'])
+                assert sorted(index.files_with_extension('.py')) == ['app/app.py', 'lib/util.PY']
+                assert index.read_text('README.md') == files['README.md']
+                assert [rel_dir for rel_dir, _, _ in index.walk()] == \
+                    ['', 'app', 'app/templates', 'docs', 'docs/api', 'docs/api/v1', 'lib']
+                assert index.subtree('docs').listdir('api/v1') == ['index.md']
+                with pytest.raises(FileNotFoundError):
+                    index.listdir('missing')
+
+        # Later changes on disk do not leak into an index that was already built
+        index = RepositoryIndex.build(LocalFileSystem(repo_dir))
+        write_tree(repo_dir, {'app/main.py': ''})
+        assert not index.exists('app/main.py')
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_prune_vendored_directories():
+    """node_modules, .git and build output are neither indexed nor rewritten"""
+    temp_dir = tempfile.mkdtemp()
+    files = {
+        'package.json': '{"dependencies": {"express": "^4.0.0"}, "scripts": {"start": "server.js"}}',
+        'server.js': "fetch('http://localhost:3000/api')\n",
+        'node_modules/express/index.js': "fetch('http://localhost:3000/x')\n",
+        'node_modules/express/lib/router.js': '',
+        'web/node_modules/react/index.js': '',
+        '.git/HEAD': 'ref: refs/heads/main\n',
+        'dist/bundle.js': "fetch('http://localhost:3000/api')\n",
+        'tools/gen.egg-info/PKG-INFO': '',
+    }
+
+    try:
+        repo_dir = os.path.join(temp_dir, 'repo')
+        write_tree(repo_dir, files)
+        zip_path = os.path.join(temp_dir, 'repo.zip')
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            for name, content in files.items():
+                zf.writestr(name, content)
+
+        analyzer = make_analyzer(temp_dir)
+        with ZipFileSystem(zip_path) as zip_fs:
+            for fs in (LocalFileSystem(repo_dir), zip_fs):
+                index = RepositoryIndex.build(fs, analyzer.prune_dir)
+                assert sorted(index.files()) == ['package.json', 'server.js']
+                assert index.pruned == ('.git', 'dist', 'node_modules', 'tools/gen.egg-info',
+                                        'web/node_modules')
+
+                analysis = analyzer.analyze_repository(fs)
+                assert analysis['framework'] == 'express'
+                assert analysis['pruned_dirs'] == 5
+
+        # An explicit prune list replaces the defaults
+        analyzer = make_analyzer(temp_dir, analysis={'prune_dirs': ['node_*']})
+        assert analyzer.analyze_repository(repo_dir)['pruned_dirs'] == 2
+
+        modified = CodeModifier(analyzer.prune_dirs).modify_code_for_deployment(repo_dir, '203.0.113.7', {})
+        assert sorted(os.path.relpath(path, repo_dir) for path in modified) == \
+            [os.path.join('dist', 'bundle.js'), 'server.js']
+        with open(os.path.join(repo_dir, 'node_modules', 'express', 'index.js')) as f:
+            assert 'localhost' in f.read()
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+MONOREPO = {
+    'README.md': '# Shop\n',
+    'services/api/requirements.txt': 'fastapi\nuvicorn\n',
+    'services/api/main.py': 'from fastapi import FastAPI\napp = FastAPI()\n',
+    'services/api/tests/requirements.txt': 'pytest\n',
+    'web/package.json': '{"dependencies": {"express": "^4.0.0"}, "scripts": {"start": "server.js"}}',
+    'web/server.js': '',
+    'web/scripts/seed.py': '',
+}
+
+
+def test_monorepo_services():
+    """Every service root is analyzed on its own and deployed side by side"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        repo_dir = os.path.join(temp_dir, 'repo')
+        write_tree(repo_dir, MONOREPO)
+
+        for workers in (1, 4):
+            analysis = make_analyzer(temp_dir, analysis={'workers': workers}).analyze_repository(repo_dir)
+            services = {service['path']: service for service in analysis['services']}
+            # The nested tests/requirements.txt belongs to the API service
+            assert sorted(services) == ['services/api', 'web']
+            assert (services['services/api']['name'], services['services/api']['framework']) == \
+                ('services-api', 'fastapi')
+            assert services['services/api']['start_commands'] == \
+                ['cd services/api && uvicorn main:app --host 0.0.0.0 --port 8000']
+            assert (services['web']['language'], services['web']['port']) == ('nodejs', 3000)
+
+            # The shallowest service is the primary one and fills the top-level fields
+            assert (analysis['language'], analysis['framework'], analysis['port']) == ('nodejs', 'express', 3000)
+
+        terraform = TerraformManager()
+        main_tf = terraform._generate_aws_main_tf('simple', analysis)
+        assert 'from_port   = 8000' in main_tf and 'from_port   = 3000' in main_tf
+        assert 'cd web && npm start' in main_tf
+        assert 'pip3 install -r services/api/requirements.txt' in main_tf
+        assert 'ports    = ["3000", "8000", "22"]' in terraform._generate_gcp_main_tf('simple', analysis)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_root_service_outranks_nested_helpers():
+    """A Node app at the root stays primary over Python helper manifests nested below it"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        repo_dir = os.path.join(temp_dir, 'repo')
+        write_tree(repo_dir, {
+            'package.json': '{"dependencies": {"express": "^4.0.0"}, "scripts": {"start": "node server.js"}}',
+            'server.js': '',
+            'docs/requirements.txt': 'mkdocs\n',
+            'scripts/requirements.txt': 'requests\n',
+            'scripts/seed.py': '',
+        })
+
+        analysis = make_analyzer(temp_dir).analyze_repository(repo_dir)
+        assert analysis['services'][0]['path'] == ''
+        assert (analysis['language'], analysis['framework'], analysis['port']) == ('nodejs', 'express', 3000)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_service_paths_are_shell_quoted():
+    """Service directories with spaces or shell metacharacters stay single words in commands"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        repo_dir = os.path.join(temp_dir, 'repo')
+        write_tree(repo_dir, {
+            'README.md': '# Shop\n',
+            'my api/requirements.txt': 'fastapi\nuvicorn\n',
+            'my api/main.py': 'from fastapi import FastAPI\napp = FastAPI()\n',
+            'web;x/package.json': '{"dependencies": {"express": "^4.0.0"}, "scripts": {"start": "server.js"}}',
+        })
+        analysis = make_analyzer(temp_dir).analyze_repository(repo_dir)
+        services = {service['path']: service for service in analysis['services']}
+        assert services['my api']['start_commands'][0].startswith("cd 'my api' && ")
+        assert services['web;x']['start_commands'][0].startswith("cd 'web;x' && ")
+
+        user_data = TerraformManager()._generate_user_data(analysis)
+        assert "pip3 install -r 'my api/requirements.txt'" in user_data
+        assert "(cd 'web;x' && npm install)" in user_data
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_repository_without_services():
+    """A repository with nothing deployable reports no language instead of failing"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        repo_dir = os.path.join(temp_dir, 'repo')
+        write_tree(repo_dir, {'README.md': '# Notes\n'})
+        analysis = make_analyzer(temp_dir).analyze_repository(repo_dir)
+        assert (analysis['language'], analysis['services']) == (None, [])
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_analysis_cache_by_fingerprint():
+    """A byte-identical tree is answered from the analysis cache; any content change misses"""
+    temp_dir = tempfile.mkdtemp()
+    cache_dir = os.path.join(temp_dir, 'analysis-cache')
+
+    try:
+        repo_dir = os.path.join(temp_dir, 'repo')
+        write_tree(repo_dir, MONOREPO)
+        copy_dir = os.path.join(temp_dir, 'copy')
+        shutil.copytree(repo_dir, copy_dir)
+
+        # The fingerprint depends on content and paths only, not on where the tree lives
+        first = RepositoryIndex.build(LocalFileSystem(repo_dir)).fingerprint(workers=4)
+        assert RepositoryIndex.build(LocalFileSystem(copy_dir)).fingerprint() == first
+
+        os.makedirs(os.path.join(cache_dir, 'v0'))
+        analyzer = make_analyzer(temp_dir, analysis={'cache': {'enabled': True, 'dir': cache_dir}})
+        assert os.listdir(cache_dir) == [f"v{ANALYZER_VERSION}"]
+
+        analysis = analyzer.analyze_repository(repo_dir)
+        assert analyzer.analyze_repository(copy_dir) == analysis
+        stats = analyzer.analysis_cache.stats()
+        assert (stats['hits'], stats['misses'], stats['entries'], stats['hit_rate']) == (1, 1, 1, 0.5)
+
+        # One changed byte is a different tree
+        write_tree(copy_dir, {'web/server.js': ' '})
+        assert RepositoryIndex.build(LocalFileSystem(copy_dir)).fingerprint() != first
+        analyzer.analyze_repository(copy_dir)
+        assert analyzer.analysis_cache.stats()['misses'] == 2
+
+        # Settings that shape the result are part of the key
+        other = make_analyzer(temp_dir, analysis={'cache': {'enabled': True, 'dir': cache_dir},
+                                                  'prune_dirs': ['scripts']})
+        assert other.analyze_repository(repo_dir)['pruned_dirs'] == 1
+        assert other.analysis_cache.stats()['hits'] == 0
+
+        # Least recently used results go first once max_entries is reached
+        small = AnalysisCache(os.path.join(temp_dir, 'small'), ANALYZER_VERSION, max_entries=2)
+        for age, key in enumerate(('a', 'b')):
+            small.put(key, {'analysis': {}})
+            os.utime(small._path(key), (age + 1, age + 1))
+        small.put('c', {'analysis': {}})
+        assert small.get('a') is None and small.get('b') == small.get('c') == {'analysis': {}}
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_incremental_reanalysis():
+    """Only services whose declared detector inputs changed are analyzed again"""
+    temp_dir = tempfile.mkdtemp()
+    source = 'https://github.com/example/shop'
+
+    try:
+        repo_dir = os.path.join(temp_dir, 'repo')
+        write_tree(repo_dir, MONOREPO)
+        analyzer = make_analyzer(temp_dir, analysis={'cache': {'enabled': True,
+                                                               'dir': os.path.join(temp_dir, 'cache')}})
+
+        first = analyzer.analyze_repository(repo_dir, source=source)
+        assert analyzer.detector_stats == {'run': 2, 'reused': 0}
+
+        # Files no detector reads leave every service untouched
+        write_tree(repo_dir, {'web/README.md': '# Web\n', 'services/api/static/style.css': 'body {}\n'})
+        assert analyzer.analyze_repository(repo_dir, source=source) == first
+        assert analyzer.detector_stats == {'run': 2, 'reused': 2}
+
+        # Editing one manifest re-runs that service's detector only
+        write_tree(repo_dir, {'web/package.json': '{"dependencies": {"next": "^14.0.0"}}'})
+        analysis = analyzer.analyze_repository(repo_dir, source=source)
+        assert analyzer.detector_stats == {'run': 3, 'reused': 3}
+        services = {service['path']: service for service in analysis['services']}
+        assert services['web']['framework'] == 'nextjs'
+        assert services['services/api'] == {service['path']: service for service in first['services']}['services/api']
+
+        # A detector input appearing is a change too
+        write_tree(repo_dir, {'services/api/wsgi.py': ''})
+        analyzer.analyze_repository(repo_dir, source=source)
+        assert analyzer.detector_stats == {'run': 4, 'reused': 4}
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_framework_rules_from_config():
+    """Frameworks declared in config are detected without code changes and can override built-ins"""
+    temp_dir = tempfile.mkdtemp()
+    quart = {'name': 'quart', 'language': 'python', 'dependencies': ['Quart'], 'files': ['asgi.py'],
+             'start_commands': ['hypercorn asgi:app --bind 0.0.0.0:8000'], 'port': 8000}
+
+    try:
+        repo_dir = os.path.join(temp_dir, 'repo')
+        write_tree(repo_dir, {'requirements.txt': 'quart==0.19\n', 'asgi.py': ''})
+        analyzer = make_analyzer(temp_dir, analysis={'frameworks': [quart, {'name': 'flask', 'language': 'python',
+                                                                            'dependencies': ['flask'], 'port': 8080}]})
+
+        analysis = analyzer.analyze_repository(repo_dir)
+        assert (analysis['framework'], analysis['port']) == ('quart', 8000)
+        assert analysis['start_commands'] == ['hypercorn asgi:app --bind 0.0.0.0:8000']
+
+        # Indicator files are matched per search directory, preferring the earlier rule, then directory
+        os.remove(os.path.join(repo_dir, 'asgi.py'))
+        write_tree(repo_dir, {'requirements.txt': '', 'app/main.py': '', 'backend/manage.py': ''})
+        assert analyzer.analyze_repository(repo_dir)['start_commands'] == \
+            ['cd backend && python manage.py runserver 0.0.0.0:8000']
+
+        # The replaced flask rule keeps only what the override declares
+        write_tree(repo_dir, {'requirements.txt': 'Flask\n'})
+        analysis = analyzer.analyze_repository(repo_dir)
+        assert (analysis['framework'], analysis['port'], analysis['start_commands']) == \
+            ('flask', 8080, ['python app.py'])
+
+        with pytest.raises(Exception, match='unknown language'):
+            make_analyzer(temp_dir, analysis={'frameworks': [{'name': 'rails', 'language': 'ruby'}]})
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_php_framework_from_indicator_files():
+    """PHP projects fall back to indicator files when composer.json names no framework"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        analyzer = make_analyzer(temp_dir)
+        for files, framework in (({'artisan': ''}, 'laravel'),
+                                 ({'wp-config.php': ''}, 'wordpress'),
+                                 ({'artisan': '', 'composer.json': '{"require": {"symfony/symfony": "^6"}}'},
+                                  'symfony'),
+                                 ({}, None)):
+            repo_dir = tempfile.mkdtemp(dir=temp_dir)
+            write_tree(repo_dir, dict({'composer.json': '{"require": {"php": ">=8.1"}}'}, **files))
+            analysis = analyzer.analyze_repository(repo_dir)
+            assert (analysis['language'], analysis['framework']) == ('php', framework)
+            assert analysis['start_commands'] == ['php -S 0.0.0.0:8000']
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_wordpress_without_composer():
+    """wp-config.php marks a PHP service root, even beside a package.json that only builds theme assets"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        repo_dir = os.path.join(temp_dir, 'repo')
+        write_tree(repo_dir, {
+            'wp-config.php': '<?php\n',
+            'index.php': '<?php\n',
+            'package.json': '{"devDependencies": {"webpack": "^5.0.0"}, "scripts": {"build": "webpack"}}',
+            'wp-content/themes/site/style.css': '',
+        })
+
+        analysis = make_analyzer(temp_dir).analyze_repository(repo_dir)
+        assert sorted(service['language'] for service in analysis['services']) == ['nodejs', 'php']
+        assert (analysis['language'], analysis['framework'], analysis['port']) == ('php', 'wordpress', 8000)
+        assert analysis['start_commands'] == ['php -S 0.0.0.0:8000']
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+class CountingFileSystem(LocalFileSystem):
+    """LocalFileSystem that records which files were opened"""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.opened = []
+
+    def open(self, rel_path):
+        self.opened.append(rel_path)
+        return super().open(rel_path)
+
+
+def test_source_signature_scan():
+    """Imports and app construction in the sources decide the framework when manifests do not"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        # main.py alone would be taken for Flask; its imports say FastAPI
+        repo_dir = os.path.join(temp_dir, 'api')
+        write_tree(repo_dir, {
+            'app/main.py': 'import os\nfrom fastapi import FastAPI\n\napi = FastAPI()\n',
+            'app/util.py': '# Flask( in a comment is not an import\n',
+        })
+        analysis = make_analyzer(temp_dir).analyze_repository(repo_dir)
+        assert analysis['framework'] == 'fastapi'
+        assert analysis['start_commands'][0] == 'cd app && uvicorn main:api --host 0.0.0.0 --port 8000'
+
+        web_dir = os.path.join(temp_dir, 'web')
+        write_tree(web_dir, {'package.json': '{"name": "web"}',
+                             'src/server.ts': "import express from 'express'\nconst app = express()\n"})
+        assert make_analyzer(temp_dir).analyze_repository(web_dir)['framework'] == 'express'
+
+        # Scanning reads a bounded prefix of each file and stops once the winner is clear
+        many_dir = os.path.join(temp_dir, 'many')
+        write_tree(many_dir, {f"pkg/mod_{i:02d}.py": 'import django\n' for i in range(40)})
+        write_tree(many_dir, {'late.py': '#' * 5000 + '\nimport bottle\n'})
+        analyzer = make_analyzer(temp_dir)
+        fs = CountingFileSystem(many_dir)
+        rule, directory = analyzer.framework_rules.match_sources('python', RepositoryIndex.build(fs),
+                                                                 max_bytes=4096, confidence=2)
+        assert (rule['name'], directory) == ('django', 'pkg')
+        assert fs.opened == ['late.py', 'pkg/mod_00.py', 'pkg/mod_01.py']
+
+        rule, _ = analyzer.framework_rules.match_sources('python', RepositoryIndex.build(fs), workers=4,
+                                                         confidence=100)
+        assert rule['name'] == 'django'
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_entrypoint_discovery():
+    """The application object is found by parsing sources and served by gunicorn or uvicorn"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        # A Flask object in a non-standard module, next to a test fixture building another one
+        repo_dir = os.path.join(temp_dir, 'flask')
+        write_tree(repo_dir, {
+            'README.md': '# Flask\n',
+            'app/requirements.txt': 'flask\n',
+            'app/web/__init__.py': '',
+            'app/web/server.py': 'from flask import Flask\n\napplication = Flask(__name__)\n',
+            'app/tests/conftest.py': 'from flask import Flask\napp = Flask("test")\n',
+            'app/broken.py': 'def Flask(:\n',
+        })
+        analyzer = make_analyzer(temp_dir)
+        analysis = analyzer.analyze_repository(repo_dir)
+        assert analysis['entrypoint'] == 'web.server:application'
+        assert analysis['start_commands'][0] == 'cd app && gunicorn --bind 0.0.0.0:5000 web.server:application'
+
+        # Parse results are reused for unchanged content
+        cached = dict(analyzer._entrypoint_cache)
+        assert len(cached) == 3
+        analyzer.analyze_repository(repo_dir)
+        assert analyzer._entrypoint_cache == cached
+
+        # ASGI factories are started with uvicorn --factory
+        api_dir = os.path.join(temp_dir, 'api')
+        write_tree(api_dir, {
+            'requirements.txt': 'fastapi\nuvicorn\n',
+            'service/main.py': ('from fastapi import FastAPI\n\n'
+                                'def create_app():\n    api = FastAPI()\n    return api\n'),
+        })
+        analysis = analyzer.analyze_repository(api_dir)
+        assert analysis['entrypoint'] == 'service.main:create_app()'
+        assert analysis['start_commands'][0] == 'uvicorn service.main:create_app --factory --host 0.0.0.0 --port 8000'
+        user_data = TerraformManager()._generate_user_data(analysis)
+        assert 'pip3 install uvicorn' in user_data
+
+        # Many candidates are parsed in worker processes with the same result
+        pool_dir = os.path.join(temp_dir, 'pool')
+        write_tree(pool_dir, {f"pkg/mod_{i:02d}.py": f"# Flask\nvalue = {i}\n" for i in range(12)})
+        write_tree(pool_dir, {'requirements.txt': 'flask\n', 'wsgi.py': 'import flask\napp = flask.Flask(__name__)\n'})
+        analyzer = make_analyzer(temp_dir, analysis={'workers': 2, 'entrypoints': {'process_threshold': 4}})
+        assert analyzer.analyze_repository(pool_dir)['entrypoint'] == 'wsgi:app'
+        assert len(analyzer._entrypoint_cache) == 13
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_entrypoint_discovery_survives_pathological_sources():
+    """Sources that exhaust the parser are skipped instead of failing the analysis"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        repo_dir = os.path.join(temp_dir, 'repo')
+        write_tree(repo_dir, {
+            'requirements.txt': 'flask\n',
+            'app.py': 'from flask import Flask\napp = Flask(__name__)\n',
+            'gen/sum.py': 'Flask\nx = 1' + '+1' * 150000 + '\n',
+            'gen/neg.py': 'Flask\nx = ' + '-' * 100000 + '1\n',
+        })
+        for workers in (1, 4):
+            analyzer = make_analyzer(temp_dir, analysis={'workers': workers, 'entrypoints': {'process_threshold': 1}})
+            assert analyzer.analyze_repository(repo_dir)['entrypoint'] == 'app:app'
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_port_inference():
+    """The port named by listen calls, .env files and Dockerfiles replaces the framework default"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        # A PORT lookup default backed by EXPOSE; gunicorn is bound to it and Terraform opens it
+        repo_dir = os.path.join(temp_dir, 'flask')
+        write_tree(repo_dir, {
+            'requirements.txt': 'flask\n',
+            'app.py': ('import os\nfrom flask import Flask\napp = Flask(__name__)\n\n'
+                       'if __name__ == "__main__":\n'
+                       '    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5050)))\n'),
+            'Dockerfile': 'FROM python:3.11\nEXPOSE 5050\n',
+            'tests/test_app.py': 'app.run(port=9999)\n',
+        })
+        analyzer = make_analyzer(temp_dir)
+        analysis = analyzer.analyze_repository(repo_dir)
+        assert (analysis['port'], analysis['port_source']) == (5050, 'app.py')
+        assert analysis['start_commands'][0] == 'gunicorn --bind 0.0.0.0:5050 app:app'
+        assert 'from_port   = 5050' in TerraformManager()._generate_app_ingress(analysis)
+
+        # An explicit listen call beats .env, and .env beats EXPOSE
+        web_dir = os.path.join(temp_dir, 'web')
+        write_tree(web_dir, {
+            'package.json': '{"name": "web", "dependencies": {"express": "^4"}}',
+            'server.js': "const app = require('express')()\napp.listen(4000)\n",
+            '.env': 'PORT=4100\n',
+            'Dockerfile': 'EXPOSE 4200\n',
+        })
+        fs = CountingFileSystem(web_dir)
+        analysis = analyzer.analyze_repository(fs)
+        assert (analysis['port'], analysis['port_source']) == (4000, 'server.js')
+        os.remove(os.path.join(web_dir, 'server.js'))
+        assert analyzer.analyze_repository(web_dir)['port'] == 4100
+
+        # Unchanged files are not read again
+        fs.opened.clear()
+        analyzer.analyze_repository(fs)
+        assert '.env' not in fs.opened and 'Dockerfile' not in fs.opened
+
+        # Spring Boot's server.port, with nothing to go on falling back to the default
+        java_dir = os.path.join(temp_dir, 'java')
+        write_tree(java_dir, {'pom.xml': '<project></project>',
+                              'src/main/resources/application.properties': 'server.port=9090\n'})
+        assert analyzer.analyze_repository(java_dir)['port'] == 9090
+        os.remove(os.path.join(java_dir, 'src/main/resources/application.properties'))
+        assert analyzer.analyze_repository(java_dir)['port'] == 8080
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_lockfile_dependency_closure():
+    """Lockfiles are streamed into the production dependency closure without loading them whole"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        # Events match the document however it is chunked; marked paths come back decoded whole
+        document = {'a': [1, 2.5, -3e2, {'b': 'x"y\u00e9', 'c': [True, None, []]}], 'd': {}}
+        events = [(list(path), event, value) for path, event, value
+                  in _json_events(io.StringIO(json.dumps(document)), chunk_size=1,
+                                  whole=lambda path: path == ['a', 'item'])]
+        assert events[:3] == [([], 'start_map', None), (['a'], 'map_key', 'a'), (['a'], 'start_array', None)]
+        assert [value for path, event, value in events if event == 'value'] == document['a']
+        assert events[-3:] == [(['d'], 'start_map', None), (['d'], 'end_map', None), ([], 'end_map', None)]
+
+        package = {'name': 'web', 'dependencies': {'express': '^4.18.0'}, 'devDependencies': {'jest': '^29.0.0'}}
+        lock = {'name': 'web', 'lockfileVersion': 3, 'packages': {
+            '': {'dependencies': {'express': '^4.18.0'}},
+            'node_modules/express': {'version': '4.18.2', 'dependencies': {'accepts': '~1.3.8'}},
+            'node_modules/accepts': {'version': '1.3.8'},
+            'node_modules/express/node_modules/debug': {'version': '2.6.9'},
+            'node_modules/jest': {'version': '29.7.0', 'dev': True},
+            'node_modules/fsevents': {'version': '2.3.3', 'devOptional': True, 'optional': True},
+            'node_modules/local': {'resolved': 'packages/local', 'link': True},
+        }}
+        repo_dir = os.path.join(temp_dir, 'npm')
+        write_tree(repo_dir, {'package.json': json.dumps(package), 'package-lock.json': json.dumps(lock, indent=2)})
+        analysis = make_analyzer(temp_dir).analyze_repository(repo_dir)
+        assert analysis['lockfile'] == 'package-lock.json'
+        assert analysis['dependency_closure'] == ['accepts@1.3.8', 'debug@2.6.9', 'express@4.18.2']
+
+        # Lockfile v1 nests dependencies
+        legacy = {'lockfileVersion': 1, 'dependencies': {
+            'express': {'version': '4.18.2', 'dependencies': {'debug': {'version': '2.6.9'}}},
+            'jest': {'version': '29.7.0', 'dev': True, 'dependencies': {'chalk': {'version': '4.1.2', 'dev': True}}},
+        }}
+        assert _package_lock_closure(io.StringIO(json.dumps(legacy))) == ['debug@2.6.9', 'express@4.18.2']
+
+        # yarn.lock has no dev flags: the closure is walked from the production dependencies
+        yarn_dir = os.path.join(temp_dir, 'yarn')
+        write_tree(yarn_dir, {'package.json': json.dumps(package), 'yarn.lock': (
+            '# yarn lockfile v1\n\n\n'
+            'accepts@~1.3.8:\n  version "1.3.8"\n\n'
+            '"@types/node@*", "@types/node@^20":\n  version "20.1.0"\n\n'
+            'express@^4.18.0:\n  version "4.18.2"\n  resolved "https://registry.yarnpkg.com/e.tgz"\n'
+            '  dependencies:\n    accepts "~1.3.8"\n    "@types/node" "*"\n\n'
+            'jest@^29.0.0:\n  version "29.7.0"\n')})
+        analysis = make_analyzer(temp_dir).analyze_repository(yarn_dir)
+        assert analysis['dependency_closure'] == ['@types/node@20.1.0', 'accepts@1.3.8', 'express@4.18.2']
+
+        berry = ('__metadata:\n  version: 6\n\n'
+                 '"express@npm:^4.18.0":\n  version: 4.18.2\n  dependencies:\n    accepts: ~1.3.8\n\n'
+                 '"accepts@npm:~1.3.8":\n  version: 1.3.8\n')
+        assert _yarn_lock_closure(io.StringIO(berry), {'express': '^4.18.0'}) == ['accepts@1.3.8', 'express@4.18.2']
+
+        # Memory stays far below what loading the lockfile takes
+        lock['packages'].update({f"node_modules/pkg-{i}": {'version': '1.0.0', 'integrity': 'sha512-' + 'a' * 88,
+                                                          'dependencies': {f"pkg-{i + 1}": '^1.0.0'}}
+                                 for i in range(3000)})
+        write_tree(repo_dir, {'package-lock.json': json.dumps(lock, indent=2)})
+        lock_path = os.path.join(repo_dir, 'package-lock.json')
+        peaks = []
+        for parse in (json.load, _package_lock_closure):
+            tracemalloc.start()
+            try:
+                with open(lock_path) as f:
+                    closure = parse(f)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+        assert len(closure) == 3003
+        assert peaks[1] < peaks[0] / 3
+
+        # Broken lockfiles only cost the closure; framework and port are still reported
+        conflicted = json.dumps(lock, indent=2).replace('"lockfileVersion": 3,',
+                                                         '<<<<<<< HEAD\n"lockfileVersion": 3,\n=======\n>>>>>>> main', 1)
+        for content in (conflicted.encode('utf-8'), json.dumps(lock).encode('utf-8')[:-1],
+                        json.dumps(lock).encode('utf-8').replace(b'"web"', b'"w\xe9b"')):
+            with open(lock_path, 'wb') as f:
+                f.write(content)
+            analysis = make_analyzer(temp_dir).analyze_repository(repo_dir)
+            assert (analysis['framework'], analysis['port']) == ('express', 3000)
+            assert 'dependency_closure' not in analysis and 'lockfile' not in analysis
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_java_multi_module_builds():
+    """Maven modules and Gradle projects are resolved to the module that ships and its exact build target"""
+    temp_dir = tempfile.mkdtemp()
+    pom = ('<?xml version="1.0"?>\n<project xmlns="http://maven.apache.org/POM/4.0.0">\n'
+           '  <modelVersion>4.0.0</modelVersion>\n{}\n</project>\n')
+
+    try:
+        maven_dir = os.path.join(temp_dir, 'maven')
+        write_tree(maven_dir, {
+            'pom.xml': pom.format(
+                '<parent><groupId>org.springframework.boot</groupId><artifactId>spring-boot-starter-parent</artifactId>'
+                '<version>${boot.version}</version></parent>'
+                '<groupId>com.example</groupId><artifactId>shop</artifactId><version>1.0.0</version>'
+                '<packaging>pom</packaging><properties><boot.version>3.2.1</boot.version></properties>'
+                '<modules><module>core</module><module>app</module><module>missing</module></modules>'),
+            'core/pom.xml': pom.format(
+                '<parent><groupId>com.example</groupId><artifactId>shop</artifactId><version>1.0.0</version></parent>'
+                '<artifactId>core</artifactId>'),
+            'app/pom.xml': pom.format(
+                '<parent><groupId>com.example</groupId><artifactId>shop</artifactId><version>1.0.0</version></parent>'
+                '<artifactId>app</artifactId><dependencies>'
+                '<dependency><groupId>com.example</groupId><artifactId>core</artifactId></dependency>'
+                '<dependency><groupId>org.springframework.boot</groupId><artifactId>spring-boot-starter-web</artifactId>'
+                '</dependency><dependency><groupId>junit</groupId><artifactId>junit</artifactId><scope>test</scope>'
+                '</dependency></dependencies><build><finalName>${project.artifactId}-server</finalName><plugins>'
+                '<plugin><groupId>org.springframework.boot</groupId><artifactId>spring-boot-maven-plugin</artifactId>'
+                '<dependencies><dependency><groupId>x</groupId><artifactId>y</artifactId></dependency></dependencies>'
+                '</plugin></plugins></build>'),
+        })
+        analyzer = make_analyzer(temp_dir, analysis={'workers': 4})
+        analysis = analyzer.analyze_repository(maven_dir)
+        assert (analysis['framework'], analysis['build_tool'], analysis['port']) == ('spring', 'maven', 8080)
+        assert (analysis['modules'], analysis['module']) == (['', 'app', 'core'], 'app')
+        assert analysis['spring_boot_version'] == '3.2.1'
+        assert analysis['dependencies'] == ['com.example:core', 'org.springframework.boot:spring-boot-starter-web']
+        assert analysis['build_commands'] == ['mvn -B -DskipTests -pl app -am package']
+        assert analysis['start_commands'] == ['java -jar app/target/app-server.jar']
+        assert '(mvn -B -DskipTests -pl app -am package) && java -jar app/target/app-server.jar &' in \
+            TerraformManager()._generate_start_script(analysis)
+
+        # A single POM importing the Boot BOM, built with the Maven wrapper
+        bom_dir = os.path.join(temp_dir, 'bom')
+        write_tree(bom_dir, {'mvnw': '', 'pom.xml': pom.format(
+            '<groupId>com.example</groupId><artifactId>demo</artifactId><version>0.1</version>'
+            '<properties><spring-boot.version>2.7.18</spring-boot.version></properties>'
+            '<dependencyManagement><dependencies><dependency><groupId>org.springframework.boot</groupId>'
+            '<artifactId>spring-boot-dependencies</artifactId><version>${spring-boot.version}</version>'
+            '<type>pom</type><scope>import</scope></dependency></dependencies></dependencyManagement>')})
+        analysis = analyzer.analyze_repository(bom_dir)
+        assert (analysis['framework'], analysis['spring_boot_version']) == ('maven', '2.7.18')
+        assert analysis['build_commands'] == ['./mvnw -B -DskipTests package']
+        assert analysis['start_commands'] == ['java -jar target/demo-0.1.jar']
+
+        # Gradle: the Boot plugin is declared at the root and applied in one subproject
+        gradle_dir = os.path.join(temp_dir, 'gradle')
+        write_tree(gradle_dir, {
+            'gradlew': '',
+            'settings.gradle': "rootProject.name = 'shop'\ninclude 'lib', 'services:api'\n",
+            'build.gradle': "plugins {\n    id 'org.springframework.boot' version '3.1.5' apply false\n}\n",
+            'lib/build.gradle': "plugins { id 'java-library' }\n",
+            'services/api/build.gradle.kts': ('plugins {\n    id("org.springframework.boot")\n}\n'
+                                              'dependencies {\n    implementation(project(":lib"))\n'
+                                              '    implementation("org.springframework.boot:spring-boot-starter-web")\n}\n'),
+        })
+        analysis = analyzer.analyze_repository(gradle_dir)
+        assert (analysis['framework'], analysis['build_tool']) == ('spring', 'gradle')
+        assert (analysis['modules'], analysis['module']) == (['', 'lib', 'services/api'], 'services/api')
+        assert analysis['spring_boot_version'] == '3.1.5'
+        assert analysis['build_commands'] == ['./gradlew :services:api:bootJar']
+        assert analysis['start_commands'] == ['java -jar services/api/build/libs/*.jar']
+
+        # The application plugin is run from its installed distribution
+        cli_dir = os.path.join(temp_dir, 'cli')
+        write_tree(cli_dir, {'settings.gradle.kts': 'rootProject.name = "tool"\n',
+                             'build.gradle.kts': 'plugins {\n    application\n}\napplication {\n}\n'})
+        analysis = analyzer.analyze_repository(cli_dir)
+        assert (analysis['framework'], analysis['module']) == ('gradle', '')
+        assert analysis['build_commands'] == ['gradle installDist']
+        assert analysis['start_commands'] == ['build/install/tool/bin/tool']
+
+        # Boot 3 gets a Java 17 JDK; Gradle is installed only when no wrapper ships
+        terraform = TerraformManager()
+        setup = terraform._generate_user_data(analysis)
+        assert 'java-11-amazon-corretto-devel' in setup and 'gradle.zip' in setup and 'maven' not in setup
+        setup = terraform._generate_user_data(analyzer.analyze_repository(gradle_dir))
+        assert 'java-17-amazon-corretto-devel' in setup and 'gradle.zip' not in setup
+
+        # An undecodable build file is skipped like a malformed POM
+        with open(os.path.join(cli_dir, 'build.gradle.kts'), 'wb') as f:
+            f.write(b'plugins {\n    application\n}\n// \xff\xfe\n')
+        analysis = analyzer.analyze_repository(cli_dir)
+        assert (analysis['language'], analysis['framework']) == ('java', 'gradle')
+        assert analysis['build_commands'] == ['gradle build -x test']
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_java_build_values_are_shell_quoted():
+    """Module paths and artifact names from build files stay single words; artifact globs still expand"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        repo_dir = os.path.join(temp_dir, 'repo')
+        write_tree(repo_dir, {
+            'pom.xml': ('<project><groupId>com.example</groupId><artifactId>shop</artifactId><version>1</version>'
+                        '<packaging>pom</packaging><modules><module>my app</module></modules></project>'),
+            'my app/pom.xml': ('<project><parent><groupId>com.example</groupId><artifactId>shop</artifactId>'
+                               '<version>1</version></parent><artifactId>app</artifactId><build>'
+                               '<finalName>app;reboot</finalName><plugins><plugin>'
+                               '<groupId>org.springframework.boot</groupId>'
+                               '<artifactId>spring-boot-maven-plugin</artifactId></plugin></plugins></build></project>'),
+        })
+        analysis = make_analyzer(temp_dir).analyze_repository(repo_dir)
+        assert analysis['build_commands'] == ["mvn -B -DskipTests -pl 'my app' -am package"]
+        assert analysis['start_commands'] == ["java -jar 'my app/target/app;reboot.jar'"]
+
+        gradle_dir = os.path.join(temp_dir, 'gradle')
+        write_tree(gradle_dir, {
+            'settings.gradle': "rootProject.name = 'my tool'\n",
+            'build.gradle': "plugins {\n    id 'application'\n}\n",
+        })
+        analysis = make_analyzer(temp_dir).analyze_repository(gradle_dir)
+        assert analysis['build_commands'] == ['gradle installDist']
+        assert analysis['start_commands'] == ["'build/install/my tool/bin/my tool'"]
+
+        # Maven comes from the Apache distribution: the Amazon Linux 2 package is too old for Boot
+        setup = TerraformManager()._generate_user_data(make_analyzer(temp_dir).analyze_repository(repo_dir))
+        assert 'java-11-amazon-corretto-devel' in setup and 'apache-maven' in setup
+        assert 'yum install -y maven' not in setup
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_analysis_budget():
+    """Past its time, file or byte budget the analyzer returns a partial result flagged truncated"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        repo_dir = os.path.join(temp_dir, 'repo')
+        write_tree(repo_dir, {
+            'requirements.txt': 'flask\n',
+            'app.py': 'from flask import Flask\napp = Flask(__name__)\n' + '# generated\n' * 20000,
+        })
+        write_tree(repo_dir, {f"static/asset_{i:03d}.css": 'body {}\n' for i in range(100)})
+
+        # Within budget: nothing truncated, stats kept on the analyzer
+        cache = {'enabled': True, 'dir': os.path.join(temp_dir, 'analysis-cache')}
+        analyzer = make_analyzer(temp_dir)
+        analysis = analyzer.analyze_repository(repo_dir)
+        assert analysis['truncated'] is False and 'analysis_stats' not in analysis
+        assert analyzer.last_analysis_stats['files'] == 102
+        assert analyzer.last_analysis_stats['exceeded'] is None
+
+        # Reading the large source trips the byte budget; the framework found before that is kept
+        analyzer = make_analyzer(temp_dir, analysis={'cache': cache, 'budget': {'max_bytes': 4096}})
+        analysis = analyzer.analyze_repository(repo_dir)
+        assert analysis['truncated'] is True
+        assert analysis['analysis_stats']['exceeded'] == 'max_bytes'
+        assert (analysis['language'], analysis['framework'], analysis['port']) == ('python', 'flask', 5000)
+        assert analysis['start_commands'] == ['python app.py', 'flask run'] and 'entrypoint' not in analysis
+
+        # A lockfile over the budget costs only the dependency closure
+        express_dir = os.path.join(temp_dir, 'express')
+        lock = {'lockfileVersion': 3, 'packages': {f"node_modules/pkg-{i}": {'version': '1.0.0'} for i in range(1500)}}
+        write_tree(express_dir, {'package.json': '{"dependencies": {"express": "^4.18.0"}}',
+                                 'package-lock.json': json.dumps(lock)})
+        assert os.path.getsize(os.path.join(express_dir, 'package-lock.json')) > 60000
+        analysis = make_analyzer(temp_dir, analysis={'budget': {'max_bytes': 1000}}).analyze_repository(express_dir)
+        assert (analysis['truncated'], analysis['framework'], analysis['port']) == (True, 'express', 3000)
+        assert 'dependency_closure' not in analysis
+
+        # Service discovery stops walking once the budget is gone, keeping what it found
+        index = RepositoryIndex.build(LocalFileSystem(repo_dir), budget=AnalysisBudget(max_seconds=0))
+        with pytest.raises(AnalysisBudgetExceeded):
+            next(index.walk())
+
+        # Indexing stops after max_files entries; detectors still run over what was indexed
+        analyzer = make_analyzer(temp_dir, analysis={'cache': cache, 'budget': {'max_files': 10}})
+        analysis = analyzer.analyze_repository(repo_dir)
+        assert analysis['truncated'] is True
+        assert analysis['analysis_stats']['exceeded'] == 'max_files'
+        assert analysis['analysis_stats']['files'] == 10
+
+        # Out of time: stop at once
+        analyzer = make_analyzer(temp_dir, analysis={'cache': cache, 'budget': {'max_seconds': 0}})
+        analysis = analyzer.analyze_repository(repo_dir)
+        assert analysis['truncated'] is True and analysis['analysis_stats']['exceeded'] == 'max_seconds'
+
+        # None of the partial results was cached
+        analyzer = make_analyzer(temp_dir, analysis={'cache': cache})
+        assert analyzer.analyze_repository(repo_dir)['framework'] == 'flask'
+        assert analyzer.analysis_cache.stats()['hits'] == 0
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    test_repository_index()
+    test_prune_vendored_directories()
+    test_monorepo_services()
+    test_root_service_outranks_nested_helpers()
+    test_service_paths_are_shell_quoted()
+    test_repository_without_services()
+    test_analysis_cache_by_fingerprint()
+    test_incremental_reanalysis()
+    test_framework_rules_from_config()
+    test_php_framework_from_indicator_files()
+    test_wordpress_without_composer()
+    test_source_signature_scan()
+    test_entrypoint_discovery()
+    test_entrypoint_discovery_survives_pathological_sources()
+    test_port_inference()
+    test_lockfile_dependency_closure()
+    test_java_multi_module_builds()
+    test_java_build_values_are_shell_quoted()
+    test_analysis_budget()
@@ -0,0 +1,882 @@
+#!/usr/bin/env python3
+"""
+Tests for repository downloading and extraction
+Uses a local HTTP server as a stand-in for GitHub
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from arvo import (ArchiveCache, ArchiveLimitError, ArvoAI, HttpClient, RepositoryAnalyzer,
+                  WorkspaceManager, _file_lock)
+
+
+def make_zip(files, prefix='hello_world-main/'):
+    """Build an in-memory zip archive shaped like a GitHub download"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, content in files.items():
+            zf.writestr(prefix + name, content)
+    return buffer.getvalue()
+
+
+def analyzer_config(temp_dir, config=None):
+    """Analyzer settings that keep workspaces, caches and git mirrors inside temp_dir"""
+    config = dict(config or {})
+    config['archive_cache'] = dict(config.get('archive_cache', {}))
+    config['archive_cache'].setdefault('dir', os.path.join(temp_dir, 'archives'))
+    config.setdefault('workspace', {'root': os.path.join(temp_dir, 'workspaces')})
+    config.setdefault('git', {'mirror_dir': os.path.join(temp_dir, 'git-mirrors')})
+    analysis = config['analysis'] = dict(config.get('analysis', {}))
+    analysis.setdefault('cache', {'enabled': False, 'dir': os.path.join(temp_dir, 'analysis')})
+    return config
+
+
+def make_analyzer(temp_dir, config=None):
+    return RepositoryAnalyzer(analyzer_config(temp_dir, config))
+
+
+def make_arvo(temp_dir, config=None):
+    """ArvoAI whose analyzer state and log file live inside temp_dir"""
+    return ArvoAI({'repository': analyzer_config(temp_dir, config),
+                   'logging': {'file': os.path.join(temp_dir, 'arvo_deployment.log')}})
+
+
+FLASK_REPO = {
+    'README.md': '# Hello\n',
+    'app/requirements.txt': 'flask==2.0.1\n',
+    'app/app.py': 'from flask import Flask\napp = Flask(__name__)\n',
+}
+
+
+@contextmanager
+def serve(routes):
+    """Serve {path: (status, headers, body)} on localhost, yielding the base URL and request log"""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _respond(self, send_body):
+            requests_seen.append((self.command, self.path, dict(self.headers), self.client_address))
+            route = routes.get(self.path, (404, {}, b''))
+            if callable(route):
+                route = route(self)
+            status, headers, body = route
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            if 'Content-Length' not in headers:
+                self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+
+        def do_GET(self):
+            self._respond(True)
+
+        def do_HEAD(self):
+            self._respond(False)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}", requests_seen
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_stream_download():
+    """Archives are written to disk in chunks and the byte count is reported"""
+    archive = make_zip(FLASK_REPO)
+    temp_dir = tempfile.mkdtemp()
+    analyzer = make_analyzer(temp_dir, {'download_chunk_size': 64, 'archive_cache': {'enabled': False}})
+
+    try:
+        with serve({'/repo.zip': (200, {}, archive)}) as (base_url, _):
+            dest = os.path.join(temp_dir, 'repo.zip')
+            download = analyzer._stream_download(base_url + '/repo.zip', dest)
+
+        assert download['bytes'] == len(archive)
+        assert download['sha256'] == hashlib.sha256(archive).hexdigest()
+        with open(dest, 'rb') as f:
+            assert f.read() == archive
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_stream_download_size_cap():
+    """Downloads over max_archive_size are aborted and the partial file removed"""
+    archive = make_zip(FLASK_REPO)
+    temp_dir = tempfile.mkdtemp()
+    analyzer = make_analyzer(temp_dir, {'max_archive_size': 100, 'archive_cache': {'enabled': False}})
+
+    try:
+        with serve({'/repo.zip': (200, {}, archive)}) as (base_url, _):
+            dest = os.path.join(temp_dir, 'repo.zip')
+            with pytest.raises(Exception, match='too large|size limit'):
+                analyzer._stream_download(base_url + '/repo.zip', dest)
+
+        assert not os.path.exists(dest)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_archive_cache_warm_redeploy():
+    """A second download of the same archive is served from the cache"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        zip_path = os.path.join(temp_dir, 'repo.zip')
+        with open(zip_path, 'wb') as f:
+            f.write(make_zip(FLASK_REPO))
+
+        analyzer = make_analyzer(temp_dir, {'archive_cache': {'dir': os.path.join(temp_dir, 'cache')},
+                                       'workspace': {'root': os.path.join(temp_dir, 'workspaces')}})
+        first = analyzer.download_repository(zip_path)
+        second = analyzer.download_repository(zip_path)
+
+        stats = analyzer.archive_cache.stats()
+        assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+        assert os.path.exists(os.path.join(second, 'hello_world-main', 'app', 'app.py'))
+        assert analyzer.analyze_repository(second) == analyzer.analyze_repository(first)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_archive_cache_integrity_and_eviction():
+    """Corrupted entries are dropped on read and old entries are evicted by size"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        archive = make_zip(FLASK_REPO)
+        zip_path = os.path.join(temp_dir, 'repo.zip')
+        with open(zip_path, 'wb') as f:
+            f.write(archive)
+
+        cache = ArchiveCache(os.path.join(temp_dir, 'cache'), max_size=10 * 1024 * 1024)
+        analyzer = make_analyzer(temp_dir, {'archive_cache': {'enabled': False}})
+        tree = cache.extract(cache.put('a', zip_path), analyzer._extract_archive)
+        os.remove(os.path.join(tree, 'hello_world-main', 'README.md'))
+        assert cache.get('a') is None
+        assert cache.stats()['entries'] == 0
+
+        # Room for one archive: storing a second evicts the least recently used
+        cache.max_size = len(archive) * 3 // 2
+        cache.put('a', zip_path)
+        cache.put('b', zip_path)
+        assert cache.get('a') is None
+        assert cache.get('b') is not None
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_archive_cache_oversized_entry():
+    """Archives larger than the cache are not stored and the newest entry is never evicted"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        archive = make_zip(FLASK_REPO)
+        zip_path = os.path.join(temp_dir, 'repo.zip')
+        with open(zip_path, 'wb') as f:
+            f.write(archive)
+
+        cache = ArchiveCache(os.path.join(temp_dir, 'cache'), max_size=len(archive) - 1)
+        assert cache.put('a', zip_path) is None
+        assert cache.stats()['entries'] == 0
+
+        # The archive fits but archive plus tree does not: the tree is still handed out
+        cache.max_size = len(archive)
+        analyzer = make_analyzer(temp_dir, {'archive_cache': {'enabled': False}})
+        tree = cache.extract(cache.put('a', zip_path), analyzer._extract_archive)
+        assert os.path.exists(os.path.join(tree, 'hello_world-main', 'app', 'app.py'))
+
+        analyzer = make_analyzer(temp_dir, {'archive_cache': {'dir': os.path.join(temp_dir, 'small'),
+                                                         'max_size': 1},
+                                       'workspace': {'root': os.path.join(temp_dir, 'workspaces')}})
+        extracted = analyzer.download_repository(zip_path)
+        assert os.path.exists(os.path.join(extracted, 'hello_world-main', 'app', 'app.py'))
+        assert analyzer.archive_cache.stats()['entries'] == 0
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_default_branch_probe():
+    """Candidate branches are probed with HEAD requests and the result is cached per repo"""
+    routes = {'/owner/repo/archive/develop.zip': (200, {}, b'')}
+
+    with tempfile.TemporaryDirectory() as temp_dir, serve(routes) as (base_url, requests_seen):
+        analyzer = make_analyzer(temp_dir, {'archive_cache': {'enabled': False}})
+        repo_url = base_url + '/owner/repo'
+        assert analyzer._resolve_default_branch(repo_url) == 'develop'
+        assert {method for method, _, _, _ in requests_seen} == {'HEAD'}
+        probes = len(requests_seen)
+
+        assert analyzer._resolve_default_branch(repo_url) == 'develop'
+        assert len(requests_seen) == probes
+
+
+def test_default_branch_probe_without_candidates():
+    """An empty candidate list fails with the usual error instead of crashing the probe"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        with serve({}) as (base_url, requests_seen):
+            analyzer = make_analyzer(temp_dir, {'github_api_url': base_url, 'candidate_branches': [],
+                                           'archive_cache': {'enabled': False},
+                                           'workspace': {'root': temp_dir}})
+            assert analyzer._probe_branches(base_url + '/owner/repo') is None
+            with pytest.raises(Exception, match='any branch'):
+                analyzer.download_repository('https://github.com/owner/repo')
+            assert requests_seen
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_default_branch_from_api():
+    """The GitHub API's default_branch is used without probing archives"""
+    body = json.dumps({'default_branch': 'trunk'}).encode()
+
+    with tempfile.TemporaryDirectory() as temp_dir, \
+            serve({'/repos/owner/repo': (200, {}, body)}) as (base_url, requests_seen):
+        analyzer = make_analyzer(temp_dir, {'github_api_url': base_url, 'archive_cache': {'enabled': False}})
+        assert analyzer._resolve_default_branch('https://github.com/owner/repo') == 'trunk'
+        assert [path for _, path, _, _ in requests_seen] == ['/repos/owner/repo']
+
+
+def test_default_branch_commit_in_one_request():
+    """A cold fetch asks the API once, for the default branch's commit, and downloads that commit"""
+    sha = 'a' * 40
+    routes = {'/repos/owner/repo/commits/HEAD': (200, {}, sha.encode())}
+
+    with tempfile.TemporaryDirectory() as temp_dir, serve(routes) as (base_url, requests_seen):
+        downloads = []
+        analyzer = make_analyzer(temp_dir, {'github_api_url': base_url})
+        analyzer._download_archive = lambda zip_url, repo_url, ref, workspace, sha=None: \
+            downloads.append((zip_url, ref, sha)) or zip_url
+        analyzer.fetch_repository('https://github.com/owner/repo')
+        assert [path for _, path, _, _ in requests_seen] == ['/repos/owner/repo/commits/HEAD']
+        assert downloads == [(f"https://github.com/owner/repo/archive/{sha}.zip", 'HEAD', sha)]
+
+        # Without an archive cache the commit is not needed: only the default branch is asked for
+        requests_seen.clear()
+        downloads.clear()
+        uncached = make_analyzer(temp_dir, {'github_api_url': base_url, 'archive_cache': {'enabled': False}})
+        uncached._download_archive = analyzer._download_archive
+        uncached._default_branches['https://github.com/owner/repo'] = 'main'
+        uncached.fetch_repository('https://github.com/owner/repo')
+        assert requests_seen == []
+        assert downloads == [('https://github.com/owner/repo/archive/main.zip', 'main', None)]
+
+
+def test_http_client_retries_and_reuses_connections():
+    """5xx responses are retried with backoff over a single pooled connection"""
+    statuses = [503, 429, 200]
+    routes = {'/flaky': lambda handler: (statuses.pop(0), {}, b'ok')}
+    client = HttpClient({'backoff_factor': 0.01})
+
+    try:
+        with serve(routes) as (base_url, requests_seen):
+            response = client.get(base_url + '/flaky')
+            assert response.status_code == 200 and response.text == 'ok'
+            assert len(requests_seen) == 3
+            assert len({address for _, _, _, address in requests_seen}) == 1
+    finally:
+        client.close()
+
+
+def test_http_client_gives_up_after_max_retries():
+    """Persistent 5xx responses are returned once retries are exhausted"""
+    client = HttpClient({'max_retries': 2, 'backoff_factor': 0.01})
+
+    try:
+        with serve({'/down': (500, {}, b'')}) as (base_url, requests_seen):
+            assert client.get(base_url + '/down').status_code == 500
+            assert len(requests_seen) == 3
+    finally:
+        client.close()
+
+
+def test_analyze_archive_without_extracting():
+    """Archives are analyzed through the zip-backed filesystem and extracted only on demand"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        zip_path = os.path.join(temp_dir, 'repo.zip')
+        with open(zip_path, 'wb') as f:
+            f.write(make_zip(FLASK_REPO))
+
+        analyzer = make_analyzer(temp_dir, {'archive_cache': {'dir': os.path.join(temp_dir, 'cache')},
+                                       'workspace': {'root': os.path.join(temp_dir, 'workspaces')}})
+        archive_path = analyzer.fetch_repository(zip_path)
+        with analyzer.open_repository(archive_path) as repo:
+            analysis = analyzer.analyze_repository(repo)
+
+        assert analysis['framework'] == 'flask'
+        assert analysis['dependencies'] == ['flask']
+        assert analysis['start_commands'][0] == 'cd app && gunicorn --bind 0.0.0.0:5000 app:app'
+        assert analyzer.archive_cache.stats()['entries'] == 0
+
+        repo_path = analyzer.extract_repository(archive_path)
+        assert analyzer.analyze_repository(repo_path) == analysis
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_selective_extraction():
+    """Excluded globs and oversized members are not written to disk"""
+    temp_dir = tempfile.mkdtemp()
+    files = dict(FLASK_REPO)
+    files['web/node_modules/react/index.js'] = 'module.exports = {}\n'
+    files['static/video.mp4'] = 'x' * 10
+    files['data/huge.csv'] = 'x' * 5000
+
+    try:
+        zip_path = os.path.join(temp_dir, 'repo.zip')
+        with open(zip_path, 'wb') as f:
+            f.write(make_zip(files))
+
+        analyzer = make_analyzer(temp_dir, {
+            'archive_cache': {'enabled': False},
+            'workspace': {'root': os.path.join(temp_dir, 'workspaces')},
+            'extraction': {'exclude': ['node_modules/*', '*.mp4'], 'max_file_size': 1000}
+        })
+        repo_path = os.path.join(analyzer.extract_repository(zip_path), 'hello_world-main')
+
+        assert os.path.exists(os.path.join(repo_path, 'app', 'app.py'))
+        assert not os.path.exists(os.path.join(repo_path, 'web', 'node_modules'))
+        assert not os.path.exists(os.path.join(repo_path, 'static', 'video.mp4'))
+        assert not os.path.exists(os.path.join(repo_path, 'data', 'huge.csv'))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_parallel_extraction_matches_serial():
+    """Extracting with a worker pool produces the same tree as serial extraction"""
+    temp_dir = tempfile.mkdtemp()
+    files = {f"pkg{i % 7}/module_{i}.py": f"VALUE = {i}\n" * (i + 1) for i in range(300)}
+
+    try:
+        zip_path = os.path.join(temp_dir, 'repo.zip')
+        with open(zip_path, 'wb') as f:
+            f.write(make_zip(files))
+
+        trees = []
+        for workers in (1, 4):
+            analyzer = make_analyzer(temp_dir, {'archive_cache': {'enabled': False},
+                                           'extraction': {'workers': workers, 'parallel_threshold': 1}})
+            dest = os.path.join(temp_dir, f"workers_{workers}")
+            os.makedirs(dest)
+            assert analyzer._extract_archive(zip_path, dest)['extracted'] == len(files)
+
+            tree = {}
+            for root, dirs, names in os.walk(dest):
+                for name in names:
+                    with open(os.path.join(root, name)) as f:
+                        tree[os.path.relpath(os.path.join(root, name), dest)] = f.read()
+            trees.append(tree)
+
+        assert len(trees[0]) == len(files)
+        assert trees[0] == trees[1]
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def _git(cwd, *args):
+    subprocess.run(['git', '-c', 'user.email=ci@example.com', '-c', 'user.name=CI', *args],
+                   cwd=cwd, check=True, capture_output=True)
+
+
+def test_git_fetch_through_mirror():
+    """file:// remotes are shallow-cloned through a reusable bare mirror"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        work = os.path.join(temp_dir, 'work')
+        os.makedirs(os.path.join(work, 'app'))
+        for name, content in FLASK_REPO.items():
+            with open(os.path.join(work, *name.split('/')), 'w') as f:
+                f.write(content)
+        _git(temp_dir, 'init', '-q', work)
+        _git(work, 'add', '.')
+        _git(work, 'commit', '-q', '-m', 'initial')
+        bare = os.path.join(temp_dir, 'remote.git')
+        _git(temp_dir, 'clone', '-q', '--bare', work, bare)
+
+        mirrors = os.path.join(temp_dir, 'mirrors')
+        analyzer = make_analyzer(temp_dir, {'archive_cache': {'enabled': False},
+                                       'workspace': {'root': os.path.join(temp_dir, 'workspaces')},
+                                       'git': {'mirror_dir': mirrors}})
+        remote_url = 'file://' + bare
+        assert RepositoryAnalyzer.is_git_url(remote_url)
+
+        checkout = analyzer.fetch_repository(remote_url)
+        assert analyzer.analyze_repository(checkout)['framework'] == 'flask'
+
+        # A new upstream commit is picked up through the same mirror
+        with open(os.path.join(work, 'app', 'requirements.txt'), 'w') as f:
+            f.write('django==4.2\n')
+        _git(work, 'commit', '-q', '-am', 'switch framework')
+        _git(work, 'push', '-q', bare, 'HEAD')
+
+        checkout = analyzer.fetch_repository(remote_url)
+        assert analyzer.analyze_repository(checkout)['framework'] == 'django'
+        assert len(os.listdir(mirrors)) == 1
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_git_sparse_checkout():
+    """Only the configured sparse paths are checked out"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        work = os.path.join(temp_dir, 'work')
+        os.makedirs(os.path.join(work, 'app'))
+        os.makedirs(os.path.join(work, 'assets'))
+        with open(os.path.join(work, 'app', 'app.py'), 'w') as f:
+            f.write('print("hi")\n')
+        with open(os.path.join(work, 'assets', 'logo.svg'), 'w') as f:
+            f.write('<svg/>\n')
+        _git(temp_dir, 'init', '-q', work)
+        _git(work, 'add', '.')
+        _git(work, 'commit', '-q', '-m', 'initial')
+
+        analyzer = make_analyzer(temp_dir, {
+            'archive_cache': {'enabled': False},
+            'workspace': {'root': os.path.join(temp_dir, 'workspaces')},
+            'git': {'mirror_dir': os.path.join(temp_dir, 'mirrors'), 'sparse_paths': ['/app/']}
+        })
+        checkout = analyzer.fetch_repository('git+file://' + work)
+
+        assert os.path.exists(os.path.join(checkout, 'app', 'app.py'))
+        assert not os.path.exists(os.path.join(checkout, 'assets'))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_workspace_lifecycle():
+    """Workspaces are reference counted, removed on release and garbage collected by age"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        manager = WorkspaceManager(os.path.join(temp_dir, 'workspaces'))
+
+        with manager.acquire('deploy-1') as workspace:
+            shared = manager.acquire('deploy-1')
+            scratch = workspace.mkdtemp()
+            assert os.path.isdir(scratch)
+        # The second reference keeps the directory alive
+        assert os.path.isdir(workspace.path)
+        shared.release()
+        assert not os.path.exists(workspace.path)
+
+        # Abandoned directories (e.g. from a crashed process) are collected once old enough
+        abandoned = os.path.join(manager.root, 'abandoned')
+        os.makedirs(abandoned)
+        held = manager.acquire('held')
+        assert manager.gc(max_age=3600) == 0
+        assert manager.gc(max_age=0) == 1
+        assert not os.path.exists(abandoned) and os.path.isdir(held.path)
+        held.release()
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_owned_workspaces_released():
+    """Workspaces created for calls without one are dropped on failure and freed on release"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        zip_path = os.path.join(temp_dir, 'repo.zip')
+        with open(zip_path, 'wb') as f:
+            f.write(make_zip(FLASK_REPO))
+
+        root = os.path.join(temp_dir, 'workspaces')
+        analyzer = make_analyzer(temp_dir, {'archive_cache': {'enabled': False}, 'workspace': {'root': root}})
+        with pytest.raises(Exception):
+            analyzer.download_repository('ftp://example.com/repo')
+        assert os.listdir(root) == []
+
+        first = analyzer.download_repository(zip_path)
+        second = analyzer.extract_repository(zip_path)
+        assert len(os.listdir(root)) == 2
+        analyzer.release_repository(first)
+        assert not os.path.exists(first) and os.path.isdir(second)
+        analyzer.close()
+        assert os.listdir(root) == []
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_workspace_quota():
+    """New workspaces are refused once the root exceeds its quota"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        manager = WorkspaceManager(os.path.join(temp_dir, 'workspaces'), max_size=100)
+        workspace = manager.acquire()
+        with open(os.path.join(workspace.path, 'big.bin'), 'wb') as f:
+            f.write(b'x' * 200)
+
+        with pytest.raises(Exception, match='quota'):
+            manager.acquire()
+
+        workspace.release()
+        manager.acquire().release()
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_deploy_releases_workspace():
+    """deploy_application keeps the modified working copy until it is released, then leaves nothing behind"""
+    temp_dir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+
+    try:
+        zip_path = os.path.join(temp_dir, 'repo.zip')
+        with open(zip_path, 'wb') as f:
+            f.write(make_zip(dict(FLASK_REPO, **{'app/config.py': 'API_URL = "http://localhost:5000"\n'})))
+
+        # Terraform files are written relative to the working directory
+        os.chdir(temp_dir)
+        arvo = make_arvo(temp_dir, {'archive_cache': {'enabled': False}})
+        result = arvo.deploy_application(zip_path, {'provider': 'aws'})
+
+        assert result['success'], result.get('error')
+        assert [os.path.basename(path) for path in result['modified_files']] == ['config.py']
+        with open(result['modified_files'][0]) as f:
+            assert 'localhost' not in f.read()
+
+        arvo.analyzer.release_repository(result['repo_path'])
+        assert not os.path.exists(result['repo_path'])
+        assert os.listdir(os.path.join(temp_dir, 'workspaces')) == []
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(temp_dir)
+
+
+def test_conditional_refetch_with_etag():
+    """An unchanged archive is revalidated with If-None-Match and reused on 304"""
+    temp_dir = tempfile.mkdtemp()
+    archive = make_zip(FLASK_REPO)
+
+    def archive_route(handler):
+        if handler.headers.get('If-None-Match') == '"v1"':
+            return 304, {'ETag': '"v1"'}, b''
+        return 200, {'ETag': '"v1"'}, archive
+
+    try:
+        analyzer = make_analyzer(temp_dir, {'archive_cache': {'dir': os.path.join(temp_dir, 'cache')},
+                                       'workspace': {'root': os.path.join(temp_dir, 'workspaces')}})
+
+        with serve({'/repo/archive/main.zip': archive_route}) as (base_url, requests_seen):
+            zip_url = base_url + '/repo/archive/main.zip'
+            with analyzer.workspaces.acquire() as workspace:
+                first = analyzer._download_archive(zip_url, base_url + '/repo', 'main', workspace)
+                second = analyzer._download_archive(zip_url, base_url + '/repo', 'main', workspace)
+
+            assert first == second
+            assert 'If-None-Match' not in requests_seen[0][2]
+            assert requests_seen[1][2]['If-None-Match'] == '"v1"'
+
+        with analyzer.open_repository(second) as repo:
+            assert analyzer.analyze_repository(repo)['framework'] == 'flask'
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def make_tarball(files, compression='gz', prefix='hello_world-main/'):
+    """Build an in-memory tarball shaped like a CI source bundle"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=f"w:{compression}" if compression else 'w') as tar:
+        for name, content in files.items():
+            data = content.encode('utf-8')
+            info = tarfile.TarInfo(prefix + name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def test_tarball_inputs():
+    """Local and remote .tar.gz inputs are unpacked as streams and analyzed"""
+    temp_dir = tempfile.mkdtemp()
+    tarball = make_tarball(FLASK_REPO)
+
+    try:
+        analyzer = make_analyzer(temp_dir, {'archive_cache': {'enabled': False},
+                                       'workspace': {'root': os.path.join(temp_dir, 'workspaces')}})
+        tar_path = os.path.join(temp_dir, 'bundle.tar.gz')
+        with open(tar_path, 'wb') as f:
+            f.write(tarball)
+
+        with serve({'/bundle.tgz': (200, {}, tarball)}) as (base_url, _):
+            for source in (tar_path, base_url + '/bundle.tgz'):
+                assert RepositoryAnalyzer.is_repository_reference(source)
+                with analyzer.workspaces.acquire() as workspace:
+                    repo_dir = analyzer.fetch_repository(source, workspace)
+                    assert analyzer.analyze_repository(repo_dir)['framework'] == 'flask'
+                    # The unpacked tree already belongs to this deployment
+                    assert analyzer.extract_repository(repo_dir, workspace) == repo_dir
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_tar_zst_input():
+    """.tar.zst bundles are decompressed as a stream when zstandard is installed"""
+    zstandard = pytest.importorskip('zstandard')
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        tar_path = os.path.join(temp_dir, 'bundle.tar.zst')
+        with open(tar_path, 'wb') as f:
+            f.write(zstandard.ZstdCompressor().compress(make_tarball(FLASK_REPO, compression=None)))
+
+        analyzer = make_analyzer(temp_dir, {'archive_cache': {'enabled': False},
+                                       'workspace': {'root': os.path.join(temp_dir, 'workspaces')}})
+        with analyzer.workspaces.acquire() as workspace:
+            repo_dir = analyzer.fetch_repository(tar_path, workspace)
+            assert analyzer.analyze_repository(repo_dir)['framework'] == 'flask'
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_local_directory_and_bare_repo_in_place():
+    """Directories and bare git repositories are analyzed without copying them"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        work = os.path.join(temp_dir, 'work')
+        os.makedirs(os.path.join(work, 'app'))
+        for name, content in FLASK_REPO.items():
+            with open(os.path.join(work, *name.split('/')), 'w') as f:
+                f.write(content)
+        _git(temp_dir, 'init', '-q', work)
+        _git(work, 'add', '.')
+        _git(work, 'commit', '-q', '-m', 'initial')
+        bare = os.path.join(temp_dir, 'bare.git')
+        _git(temp_dir, 'clone', '-q', '--bare', work, bare)
+
+        analyzer = make_analyzer(temp_dir, {'archive_cache': {'enabled': False},
+                                       'workspace': {'root': os.path.join(temp_dir, 'workspaces')}})
+        for source in (work, bare):
+            assert analyzer.fetch_repository(source) == source
+            with analyzer.open_repository(source) as repo:
+                analysis = analyzer.analyze_repository(repo)
+            assert analysis['framework'] == 'flask'
+            assert analysis['start_commands'][0] == 'cd app && gunicorn --bind 0.0.0.0:5000 app:app'
+
+        with analyzer.workspaces.acquire() as workspace:
+            repo_path = analyzer.extract_repository(bare, workspace)
+            assert os.path.exists(os.path.join(repo_path, 'app', 'app.py'))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_repository_reference_detection():
+    """Only words written as paths count as local directories, and remotes win over them"""
+    cwd = os.getcwd()
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        os.chdir(temp_dir)
+        os.makedirs('app')
+        assert not RepositoryAnalyzer.is_repository_reference('app')
+        assert RepositoryAnalyzer.is_repository_reference('./app')
+        assert RepositoryAnalyzer.is_repository_reference(os.path.join(temp_dir, 'app'))
+
+        arvo = make_arvo(temp_dir)
+        requested = []
+        arvo.deploy_application = lambda repo_url, requirements: requested.append(repo_url) or \
+            {'success': False, 'error': 'stopped'}
+        arvo.process_deployment_request('deploy ./app from git@example.com:team/app.git')
+        arvo.process_deployment_request('deploy app now')
+        assert requested == ['git@example.com:team/app.git']
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(temp_dir)
+
+
+def test_extraction_guard_stops_bombs():
+    """Highly compressed members and oversized archives abort extraction and name the culprit"""
+    temp_dir = tempfile.mkdtemp()
+    files = dict(FLASK_REPO)
+    files['data/bomb.txt'] = '0' * (8 * 1024 * 1024)
+
+    try:
+        analyzer = make_analyzer(temp_dir, {'archive_cache': {'enabled': False},
+                                       'extraction': {'max_compression_ratio': 100}})
+        for name, archive in (('repo.zip', make_zip(files)), ('repo.tar.gz', make_tarball(files))):
+            archive_path = os.path.join(temp_dir, name)
+            with open(archive_path, 'wb') as f:
+                f.write(archive)
+            dest = os.path.join(temp_dir, f"{name}.out")
+            os.makedirs(dest)
+
+            with pytest.raises(ArchiveLimitError) as excinfo:
+                with open(archive_path, 'rb') as stream:
+                    if name.endswith('.zip'):
+                        analyzer._extract_archive(archive_path, dest)
+                    else:
+                        analyzer._extract_tar_stream(stream, 'tar.gz', dest)
+            assert excinfo.value.member == 'hello_world-main/data/bomb.txt'
+            # The partially written member is not left behind
+            assert not os.path.exists(os.path.join(dest, 'hello_world-main', 'data', 'bomb.txt'))
+
+        # Entry and total size limits are enforced from the zip central directory up front
+        zip_path = os.path.join(temp_dir, 'repo.zip')
+        for limits in ({'max_entries': 2}, {'max_total_size': 1024 * 1024}):
+            analyzer = make_analyzer(temp_dir, {'archive_cache': {'enabled': False}, 'extraction': limits})
+            dest = tempfile.mkdtemp(dir=temp_dir)
+            with pytest.raises(ArchiveLimitError):
+                analyzer._extract_archive(zip_path, dest)
+            assert os.listdir(dest) == []
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_partial_download_lock():
+    """The partial-file lock is an flock, so it excludes other processes as well as threads"""
+    temp_dir = tempfile.mkdtemp()
+    lock_path = os.path.join(temp_dir, 'download.partial.lock')
+    probe = ("import fcntl, os, sys\n"
+             "fd = os.open(sys.argv[1], os.O_RDWR | os.O_CREAT)\n"
+             "try:\n    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)\nexcept OSError:\n    sys.exit(3)\n")
+
+    try:
+        with _file_lock(lock_path):
+            held = subprocess.run([sys.executable, '-c', probe, lock_path])
+            assert held.returncode == 3
+        assert not os.path.exists(lock_path)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_gc_spares_locked_partials():
+    """Workspace GC leaves lock files and partial downloads whose lock is held alone"""
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        manager = WorkspaceManager(os.path.join(temp_dir, 'workspaces'))
+        partial_path = manager.partial_path('download')
+        stale = time.time() - 7200
+
+        with _file_lock(partial_path + '.lock'):
+            for path in (partial_path, partial_path + '.json'):
+                with open(path, 'w') as f:
+                    f.write('partial')
+            for path in (partial_path, partial_path + '.json', partial_path + '.lock'):
+                os.utime(path, (stale, stale))
+
+            manager.gc(max_age=3600)
+            assert sorted(os.listdir(os.path.dirname(partial_path))) == \
+                ['download', 'download.json', 'download.lock']
+
+        manager.gc(max_age=3600)
+        assert os.listdir(os.path.dirname(partial_path)) == []
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_resume_interrupted_download():
+    """A dropped connection resumes with a Range request; a changed upstream restarts from zero"""
+    temp_dir = tempfile.mkdtemp()
+    versions = {'"v1"': make_zip(FLASK_REPO), '"v2"': make_zip(dict(FLASK_REPO, **{'README.md': '# v2\n'}))}
+    state = {'etag': '"v1"', 'drop': True}
+
+    def archive_route(handler):
+        etag = state['etag']
+        archive = versions[etag]
+        range_header = handler.headers.get('Range')
+        if range_header and handler.headers.get('If-Range') == etag:
+            start = int(range_header[len('bytes='):-1])
+            return 206, {'ETag': etag, 'Content-Range': f"bytes {start}-{len(archive) - 1}/{len(archive)}"}, \
+                archive[start:]
+        if state['drop']:
+            # Promise the whole archive, send half of it and hang up
+            state['drop'] = False
+            handler.close_connection = True
+            return 200, {'ETag': etag, 'Content-Length': str(len(archive))}, archive[:len(archive) // 2]
+        return 200, {'ETag': etag}, archive
+
+    try:
+        config = {'archive_cache': {'enabled': False}, 'download_chunk_size': 64,
+                  'workspace': {'root': os.path.join(temp_dir, 'workspaces')}}
+        analyzer = make_analyzer(temp_dir, config)
+        with serve({'/repo.zip': archive_route}) as (base_url, requests_seen):
+            dest = os.path.join(temp_dir, 'repo.zip')
+            download = analyzer._stream_download(base_url + '/repo.zip', dest)
+
+            archive = versions['"v1"']
+            assert download['sha256'] == hashlib.sha256(archive).hexdigest()
+            assert 0 < download['resumed_from'] <= len(archive) // 2
+            assert requests_seen[1][2]['Range'] == f"bytes={download['resumed_from']}-"
+            with open(dest, 'rb') as f:
+                assert f.read() == archive
+
+            # Give up mid-download, then publish a new archive before trying again
+            state['drop'] = True
+            impatient = make_analyzer(temp_dir, dict(config, download_resume_attempts=0))
+            with pytest.raises(Exception):
+                impatient._stream_download(base_url + '/repo.zip', dest)
+            state['etag'] = '"v2"'
+
+            download = analyzer._stream_download(base_url + '/repo.zip', dest)
+            assert requests_seen[-1][2]['If-Range'] == '"v1"'
+            assert download['resumed_from'] == 0
+            assert download['sha256'] == hashlib.sha256(versions['"v2"']).hexdigest()
+            assert os.listdir(os.path.join(temp_dir, 'workspaces', '.partial')) == []
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    test_stream_download()
+    test_stream_download_size_cap()
+    test_archive_cache_warm_redeploy()
+    test_archive_cache_integrity_and_eviction()
+    test_archive_cache_oversized_entry()
+    test_default_branch_probe()
+    test_default_branch_probe_without_candidates()
+    test_default_branch_from_api()
+    test_default_branch_commit_in_one_request()
+    test_http_client_retries_and_reuses_connections()
+    test_http_client_gives_up_after_max_retries()
+    test_analyze_archive_without_extracting()
+    test_selective_extraction()
+    test_parallel_extraction_matches_serial()
+    test_git_fetch_through_mirror()
+    test_git_sparse_checkout()
+    test_workspace_lifecycle()
+    test_owned_workspaces_released()
+    test_workspace_quota()
+    test_deploy_releases_workspace()
+    test_conditional_refetch_with_etag()
+    test_tarball_inputs()
+    test_tar_zst_input()
+    test_local_directory_and_bare_repo_in_place()
+    test_repository_reference_detection()
+    test_extraction_guard_stops_bombs()
+    test_partial_download_lock()
+    test_gc_spares_locked_partials()
+    test_resume_interrupted_download()
+    print("✅ Download tests PASSED")